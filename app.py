@@ -13,8 +13,15 @@ from utils.data_generator import VitalsGenerator
 from models.enhanced_anomaly_detector import EnhancedAnomalyDetector as AnomalyDetector
 from models.lstm_predictor import LSTMPredictor
 from models.risk_calculator import RiskCalculator
+from models.clinical_rules import get_rule_engine
 from models.ecg_analyzer import ECGAnalyzer
+from models.latent_index import LatentCaseIndex
+from models.early_warning import EarlyWarningScorer
+from models.risk_attribution import RiskAttributor
 from utils.helpers import make_json_serializable
+from utils.training_service import TrainingService
+from utils.history_rescoring import HistoryRescorer
+from utils.waveform_store import WaveformStore
 
 # Import the simulator and explainable AI routes
 from routes.simulator_routes import simulator_bp
@@ -47,30 +54,65 @@ app.register_blueprint(disease_prediction_bp)  # Register the disease prediction
 # Register socketio handlers for explainable AI
 register_socketio_handlers(socketio)
 
-# Create directories for brain tumor samples (if they don't exist already)
-os.makedirs('static/samples/mri/glioma', exist_ok=True)
-os.makedirs('static/samples/mri/meningioma', exist_ok=True)
-os.makedirs('static/samples/mri/notumor', exist_ok=True)
-os.makedirs('static/samples/mri/pituitary', exist_ok=True)
-
-# Create directories for kidney stone samples (if they don't exist already)
-os.makedirs('static/samples/ct/normal', exist_ok=True)
-os.makedirs('static/samples/ct/stone', exist_ok=True)
-
-# Create directories for model and dataset
-os.makedirs('model', exist_ok=True)
-os.makedirs('kaggle_dataset', exist_ok=True)
-
 # Register socketio handlers for multimodal monitoring
 from routes.multimodal_routes import register_socketio_handlers as register_multimodal_socketio_handlers
 register_multimodal_socketio_handlers(socketio)
 
-# Initialize our patient data and models
-vitals_generator = VitalsGenerator()
-anomaly_detector = AnomalyDetector()
-lstm_predictor = LSTMPredictor()
-risk_calculator = RiskCalculator()
-ecg_analyzer = ECGAnalyzer()
+# Models and services are created by init_services(). Training workers are
+# spawned processes that re-import this module, so nothing heavy may run at
+# import time.
+vitals_generator = None
+training_service = None
+anomaly_detector = None
+lstm_predictor = None
+clinical_rules = None
+risk_calculator = None
+risk_attributor = None
+ecg_analyzer = None
+history_lock = threading.Lock()  # Held while the monitoring loop appends to or trims the history
+history_rescorer = None
+latent_case_index = None
+ecg_store = None
+early_warning_scorer = None
+
+def init_services():
+    """Create the sample directories, models and services used by the routes."""
+    global vitals_generator, training_service, anomaly_detector, lstm_predictor
+    global clinical_rules, risk_calculator, risk_attributor, ecg_analyzer
+    global history_rescorer, latent_case_index, ecg_store, early_warning_scorer
+
+    # Create directories for brain tumor samples (if they don't exist already)
+    os.makedirs('static/samples/mri/glioma', exist_ok=True)
+    os.makedirs('static/samples/mri/meningioma', exist_ok=True)
+    os.makedirs('static/samples/mri/notumor', exist_ok=True)
+    os.makedirs('static/samples/mri/pituitary', exist_ok=True)
+
+    # Create directories for kidney stone samples (if they don't exist already)
+    os.makedirs('static/samples/ct/normal', exist_ok=True)
+    os.makedirs('static/samples/ct/stone', exist_ok=True)
+
+    # Create directories for model and dataset
+    os.makedirs('model', exist_ok=True)
+    os.makedirs('kaggle_dataset', exist_ok=True)
+
+    # Initialize our patient data and models
+    vitals_generator = VitalsGenerator()
+    training_service = TrainingService()  # Trains models in a background process
+    anomaly_detector = AnomalyDetector(training_service=training_service)
+    lstm_predictor = LSTMPredictor(training_service=training_service)
+    clinical_rules = get_rule_engine()  # Threshold rules shared by the risk scores and routes
+    risk_calculator = RiskCalculator(clinical_rules)
+    risk_attributor = RiskAttributor(risk_calculator)  # Shapley attribution of the risk score, cached
+    ecg_analyzer = ECGAnalyzer()
+    history_rescorer = HistoryRescorer(anomaly_detector, history_lock=history_lock)
+    latent_case_index = LatentCaseIndex()
+    ecg_store = WaveformStore()  # Full-resolution ECG; the history keeps a short preview
+    early_warning_scorer = EarlyWarningScorer()  # NEWS2/MEWS per reading and the ward table
+
+    # Give the explainable AI routes access to real similar cases
+    explainable_ai_bp.case_index = latent_case_index
+    explainable_ai_bp.anomaly_detector = anomaly_detector
+    explainable_ai_bp.risk_attributor = risk_attributor
 
 # Store some recent data for initial display and analysis
 patient_data_history = {
@@ -81,9 +123,15 @@ patient_data_history = {
     'respiratory_rate': [],
     'oxygen_saturation': [],
     'temperature': [],
-    'ecg_data': []
+    'ecg_data': [],
+    'news2': [],
+    'mews': []
 }
 
+# Number of readings ever appended to each patient's history (used to reuse
+# predictions and to find the readings a model has not seen yet)
+history_versions = {'default': 0}
+
 # Alerts storage
 alerts = []
 
@@ -107,41 +155,112 @@ def generate_initial_data():
         
         # Store simplified ECG data (just a few sample points)
         patient_data_history['ecg_data'].append(data['ecg_data'][:20])  # Store only first 20 points for history
+        ecg_store.append('default', data['ecg_data'], timestamp)
+        
+        # Early-warning scores alongside the vitals
+        early_warning = early_warning_scorer.update('default', data, patient_data_history['timestamps'][-1])
+        patient_data_history['news2'].append(early_warning['news2'])
+        patient_data_history['mews'].append(early_warning['mews'])
+    
+    history_versions['default'] += 288
+
+def update_latent_case_index(current_data, timestamp, risk_score, risk_factors):
+    """Add the latest reading to the similar-case index, backfilling history on first use"""
+    if latent_case_index.encoder_version != anomaly_detector.latent_version:
+        # The autoencoder changed: vectors of the old encoder are not comparable, so re-encode
+        cases = latent_case_index.metadata
+        latent_history = anomaly_detector.get_latent_history({
+            'timestamps': [case['timestamp'] for case in cases],
+            'heart_rate': [case['vitals']['heart_rate'] for case in cases],
+            'blood_pressure_systolic': [case['vitals']['blood_pressure'][0] for case in cases],
+            'blood_pressure_diastolic': [case['vitals']['blood_pressure'][1] for case in cases],
+            'respiratory_rate': [case['vitals']['respiratory_rate'] for case in cases],
+            'oxygen_saturation': [case['vitals']['oxygen_saturation'] for case in cases],
+            'temperature': [case['vitals']['temperature'] for case in cases]
+        }) if cases else np.empty((0, latent_case_index.config['dim']))
+        if latent_history is None:
+            return
+        latent_case_index.reencode(latent_history, anomaly_detector.latent_version)
+    
+    if len(latent_case_index) == 0:
+        # Encode all stored readings (except the current one) in a single batch
+        past = {key: values[:-1] for key, values in patient_data_history.items()}
+        latent_history = anomaly_detector.get_latent_history(past)
+        if latent_history is None:
+            return
+        latent_case_index.add_many(latent_history, [
+            {
+                'timestamp': past['timestamps'][i],
+                'vitals': {
+                    'heart_rate': past['heart_rate'][i],
+                    'blood_pressure': [past['blood_pressure_systolic'][i], past['blood_pressure_diastolic'][i]],
+                    'respiratory_rate': past['respiratory_rate'][i],
+                    'oxygen_saturation': past['oxygen_saturation'][i],
+                    'temperature': past['temperature'][i]
+                }
+            }
+            for i in range(len(latent_history))
+        ])
+    
+    latent = anomaly_detector.get_latent_representation(current_data)
+    if latent is not None:
+        latent_case_index.add(latent, {
+            'timestamp': timestamp,
+            'vitals': {key: current_data[key] for key in ('heart_rate', 'blood_pressure', 'respiratory_rate',
+                                                            'oxygen_saturation', 'temperature')},
+            'risk_score': risk_score,
+            'risk_factors': risk_factors
+        })
 
 # Continuous data generation and analysis
 def background_monitoring():
     while True:
         # Generate new vitals data
-        current_data = vitals_generator.generate_vitals()
+        current_data = vitals_generator.generate_vitals(ecg_stream='default')
         
         # Update history
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        patient_data_history['timestamps'].append(current_time)
-        patient_data_history['heart_rate'].append(current_data['heart_rate'])
-        patient_data_history['blood_pressure_systolic'].append(current_data['blood_pressure'][0])
-        patient_data_history['blood_pressure_diastolic'].append(current_data['blood_pressure'][1])
-        patient_data_history['respiratory_rate'].append(current_data['respiratory_rate'])
-        patient_data_history['oxygen_saturation'].append(current_data['oxygen_saturation'])
-        patient_data_history['temperature'].append(current_data['temperature'])
-        patient_data_history['ecg_data'].append(current_data['ecg_data'][:20])
+        with history_lock:
+            patient_data_history['timestamps'].append(current_time)
+            patient_data_history['heart_rate'].append(current_data['heart_rate'])
+            patient_data_history['blood_pressure_systolic'].append(current_data['blood_pressure'][0])
+            patient_data_history['blood_pressure_diastolic'].append(current_data['blood_pressure'][1])
+            patient_data_history['respiratory_rate'].append(current_data['respiratory_rate'])
+            patient_data_history['oxygen_saturation'].append(current_data['oxygen_saturation'])
+            patient_data_history['temperature'].append(current_data['temperature'])
+            patient_data_history['ecg_data'].append(current_data['ecg_data'][:20])
+            ecg_store.append('default', current_data['ecg_data'], current_time)
+            early_warning = early_warning_scorer.update('default', current_data, current_time)
+            patient_data_history['news2'].append(early_warning['news2'])
+            patient_data_history['mews'].append(early_warning['mews'])
         
-        # Keep only last 24 hours of data
-        if len(patient_data_history['timestamps']) > 288:
-            for key in patient_data_history:
-                patient_data_history[key] = patient_data_history[key][-288:]
+            # Keep only last 24 hours of data
+            if len(patient_data_history['timestamps']) > 288:
+                for key in patient_data_history:
+                    patient_data_history[key] = patient_data_history[key][-288:]
+            history_versions['default'] += 1
         
         # Run AI analysis
         # 1. Anomaly detection
         anomaly_results = anomaly_detector.detect(current_data, patient_data_history)
         
         # 2. LSTM prediction for next hour
-        predictions = lstm_predictor.predict(patient_data_history)
+        predictions = lstm_predictor.predict(patient_data_history, history_version=history_versions['default'])
         
         # 3. Risk calculation
         risk_score, risk_factors = risk_calculator.calculate_risk(current_data, predictions, anomaly_results)
         
         # 4. ECG analysis
-        ecg_analysis = ecg_analyzer.analyze(current_data['ecg_data'])
+        ecg_analysis = ecg_analyzer.analyze_stream('default', current_data['ecg_data'], timestamp=current_time)
+        
+        # Attribution of the risk score to the vital signs (cached per quantized reading)
+        feature_attribution = risk_attributor.attribute(current_data)
+        
+        # 5. Index the reading for similar-case retrieval
+        try:
+            update_latent_case_index(current_data, current_time, risk_score, risk_factors)
+        except Exception as e:
+            print(f"Error updating latent case index: {e}")
         
         # Modified alert check with minimum risk threshold
         if risk_score > 0.15 or (risk_score > 0.05 and any(val for key, val in anomaly_results.items() if isinstance(val, bool) and val)):
@@ -165,6 +284,8 @@ def background_monitoring():
             'risk_score': risk_score,
             'risk_factors': risk_factors,
             'ecg_analysis': make_json_serializable(ecg_analysis),
+            'early_warning': make_json_serializable(early_warning),
+            'feature_attribution': make_json_serializable(feature_attribution),
             'alerts': make_json_serializable(alerts)
         }
         
@@ -221,82 +342,129 @@ def get_alerts():
 def get_risk_history():
     """Generate and return historical risk score data"""
     # This would normally come from a database, but we'll generate it for the demo
-    risk_history = []
-    
     timestamps = patient_data_history['timestamps']
-    heart_rate = patient_data_history['heart_rate']
-    systolic = patient_data_history['blood_pressure_systolic']
-    diastolic = patient_data_history['blood_pressure_diastolic']
-    oxygen = patient_data_history['oxygen_saturation']
-    respiratory = patient_data_history['respiratory_rate']
+    values = {
+        feature: np.asarray(patient_data_history[feature], dtype=float)
+        for feature in ('heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+                        'oxygen_saturation', 'respiratory_rate')
+    }
     
-    # Generate synthetic risk scores based on the vital signs
-    for i in range(len(timestamps)):
-        # Simple algorithm to calculate risk from vital signs
-        hr_risk = 0
-        if heart_rate[i] < 60 or heart_rate[i] > 100:
-            hr_risk = min(1, abs(heart_rate[i] - 80) / 40) * 0.2
-            
-        bp_risk = 0
-        if systolic[i] < 90 or systolic[i] > 140 or diastolic[i] < 60 or diastolic[i] > 90:
-            systolic_risk = min(1, abs(systolic[i] - 120) / 50)
-            diastolic_risk = min(1, abs(diastolic[i] - 80) / 30)
-            bp_risk = max(systolic_risk, diastolic_risk) * 0.2
-        
-        oxygen_risk = 0
-        if oxygen[i] < 95:
-            oxygen_risk = min(1, (95 - oxygen[i]) / 10) * 0.3
-            
-        resp_risk = 0
-        if respiratory[i] < 12 or respiratory[i] > 20:
-            resp_risk = min(1, abs(respiratory[i] - 16) / 8) * 0.2
-            
-        # Add some randomness for visual interest
-        random_factor = np.random.random() * 0.1
-        total_risk = min(0.95, max(0.05, hr_risk + bp_risk + oxygen_risk + resp_risk + random_factor))
-        
-        risk_history.append({
-            'timestamp': timestamps[i],
-            'risk_score': total_risk
-        })
+    # Synthetic risk scores from the vital signs ('history' ramps of the
+    # clinical rule table), for the whole history at once
+    vital_risk = clinical_rules.ramp_risk('history', values)
+    
+    # Add some randomness for visual interest
+    random_factor = np.random.random(len(timestamps)) * 0.1
+    total_risk = np.minimum(0.95, np.maximum(0.05, vital_risk + random_factor))
+    
+    risk_history = [
+        {'timestamp': timestamp, 'risk_score': risk}
+        for timestamp, risk in zip(timestamps, total_risk.tolist())
+    ]
     
     return jsonify(make_json_serializable(risk_history))
 
+@app.route('/api/history/rescore', methods=['POST'])
+def rescore_history():
+    """Re-evaluate stored history with the current anomaly models"""
+    try:
+        report = history_rescorer.rescore(patient_data_history)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    return jsonify(make_json_serializable(report))
+
+@app.route('/api/predictions/cache')
+def get_prediction_cache_stats():
+    """Hit and miss counters of the prediction cache"""
+    return jsonify(lstm_predictor.get_cache_stats())
+
+@app.route('/api/attribution/cache')
+def get_attribution_cache_stats():
+    """Hit and miss counters of the feature attribution cache"""
+    return jsonify(risk_attributor.get_cache_stats())
+
+@app.route('/api/ecg/waveform')
+def get_ecg_waveform():
+    """Full-resolution ECG from the waveform store (default: the last minute)"""
+    end = request.args.get('end')
+    start = request.args.get('start')
+    try:
+        if start is None:
+            end_time = datetime.strptime(end, "%Y-%m-%d %H:%M:%S") if end else datetime.now()
+            start = end_time - timedelta(seconds=int(request.args.get('seconds', 60)))
+        times, samples = ecg_store.read('default', start, end)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Use YYYY-MM-DD HH:MM:SS timestamps and whole seconds'}), 400
+    return jsonify({
+        'sampling_rate': ecg_store.config['sampling_rate'],
+        'times': times.tolist(),
+        'samples': samples.tolist()
+    })
+
+@app.route('/api/early-warning')
+def get_early_warning_scores():
+    """Current NEWS2/MEWS scores of the ward (or of one patient with ?patient_id=)"""
+    patient_id = request.args.get('patient_id')
+    if patient_id is None:
+        return jsonify(make_json_serializable({'patients': early_warning_scorer.current()}))
+    row = early_warning_scorer.current(patient_id)
+    if row is None:
+        return jsonify({'status': 'error', 'message': f'No scores for patient {patient_id}'}), 404
+    return jsonify(make_json_serializable(row))
+
+@app.route('/api/ecg/hrv')
+def get_hrv():
+    """Heart rate variability over the 5 minute, 1 hour and 24 hour windows"""
+    return jsonify(make_json_serializable(ecg_analyzer.hrv.get_metrics('default')))
+
+# Settings other than the alert thresholds, which live in the clinical rule table
+system_settings = {
+    'aiModelSettings': {
+        'anomalySensitivity': 0.05,
+        'predictionHorizon': 12,
+        'usePatientBaseline': True,
+        'enableAdvancedECG': True
+    },
+    'displaySettings': {
+        'updateFrequency': 3,
+        'showPredictions': True,
+        'enableSoundAlerts': True,
+        'chartPoints': 20
+    }
+}
+
 @app.route('/api/settings', methods=['GET', 'POST'])
 def handle_settings():
-    """Get or update system settings"""
+    """
+    Get or update system settings
+    
+    POST accepts any of 'alertThresholds' (normal ranges, in the GET format),
+    'clinicalRules' (rule table overrides, see models/clinical_rules.py),
+    'reloadRules' (re-read the rule file) and the other settings groups.
+    Rule changes take effect for every risk calculation at once.
+    """
     if request.method == 'POST':
-        # In a real application, this would update settings in a database
-        # For this demo, we'll just return success
-        settings = request.json
+        settings = request.json or {}
+        try:
+            if settings.get('reloadRules'):
+                clinical_rules.reload()
+            if 'clinicalRules' in settings:
+                clinical_rules.update(settings['clinicalRules'])
+            if 'alertThresholds' in settings:
+                clinical_rules.update_alert_thresholds(settings['alertThresholds'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        # In a real application, the other settings would be stored in a database
+        for group in system_settings:
+            if isinstance(settings.get(group), dict):
+                system_settings[group].update(settings[group])
         return jsonify({'status': 'success', 'message': 'Settings updated successfully'})
     else:
-        # Return default settings
-        default_settings = {
-            'alertThresholds': {
-                'heartRate': {'min': 60, 'max': 100},
-                'bloodPressure': {
-                    'systolicMin': 90, 'systolicMax': 140,
-                    'diastolicMin': 60, 'diastolicMax': 90
-                },
-                'oxygenSaturation': {'min': 95},
-                'respiratoryRate': {'min': 12, 'max': 20},
-                'temperature': {'min': 97, 'max': 99}
-            },
-            'aiModelSettings': {
-                'anomalySensitivity': 0.05,
-                'predictionHorizon': 12,
-                'usePatientBaseline': True,
-                'enableAdvancedECG': True
-            },
-            'displaySettings': {
-                'updateFrequency': 3,
-                'showPredictions': True,
-                'enableSoundAlerts': True,
-                'chartPoints': 20
-            }
-        }
-        return jsonify(default_settings)
+        return jsonify({
+            'alertThresholds': clinical_rules.alert_thresholds(),
+            **system_settings
+        })
 
 @socketio.on('connect')
 def handle_connect():
@@ -324,9 +492,12 @@ def handle_simulated_vitals(data):
     
     # Run AI analysis on simulated data
     anomaly_results = anomaly_detector.detect(current_data, patient_data_history)
-    predictions = lstm_predictor.predict(patient_data_history)
+    # The simulator does not change the history, so the last forecast is reused
+    predictions = lstm_predictor.predict(patient_data_history, history_version=history_versions['default'])
     risk_score, risk_factors = risk_calculator.calculate_risk(current_data, predictions, anomaly_results)
     ecg_analysis = ecg_analyzer.analyze(current_data['ecg_data'])
+    early_warning = early_warning_scorer.score(current_data)  # Not added to the ward table
+    feature_attribution = risk_attributor.attribute(current_data)
     
     # Return analysis results to the simulator
     emit('simulation_analysis', {
@@ -334,7 +505,9 @@ def handle_simulated_vitals(data):
         'predictions': make_json_serializable(predictions),
         'risk_score': risk_score,
         'risk_factors': risk_factors,
-        'ecg_analysis': make_json_serializable(ecg_analysis)
+        'ecg_analysis': make_json_serializable(ecg_analysis),
+        'early_warning': make_json_serializable(early_warning),
+        'feature_attribution': make_json_serializable(feature_attribution)
     })
     
     # Optionally update the main dashboard for all clients
@@ -348,11 +521,15 @@ def handle_simulated_vitals(data):
             'risk_score': risk_score,
             'risk_factors': risk_factors,
             'ecg_analysis': make_json_serializable(ecg_analysis),
+            'early_warning': make_json_serializable(early_warning),
             'alerts': make_json_serializable(alerts)
         }
         socketio.emit('vitals_update', emit_data)
 
 if __name__ == '__main__':
+    # Create the models and services
+    init_services()
+    
     # Generate initial historical data
     generate_initial_data()
     
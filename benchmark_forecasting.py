@@ -0,0 +1,143 @@
+"""
+Benchmark script for the vital sign forecasting engines.
+
+Compares the classical engines (damped Holt smoothing and ridge AR) with
+a last-value baseline and, optionally, the trained LSTM. Accuracy is the
+mean absolute error over the prediction horizon on held-out synthetic
+readings. Latency is reported per batch and as patients per second.
+"""
+
+import sys
+import os
+import time
+import argparse
+import numpy as np
+from datetime import datetime
+
+# Add parent directory to path to ensure imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.classical_forecaster import ClassicalForecaster
+
+FEATURE_COLUMNS = [
+    'heart_rate',
+    'blood_pressure_systolic',
+    'blood_pressure_diastolic',
+    'respiratory_rate',
+    'oxygen_saturation',
+    'temperature'
+]
+
+# Column labels for the results table
+SHORT_NAMES = ['HR', 'SBP', 'DBP', 'RR', 'SpO2', 'Temp']
+
+def generate_patients(n_patients, points, seed=42):
+    """
+    Generate synthetic vital sign series for many patients at once.
+
+    Uses the same cyclic pattern and noise levels as the synthetic data of
+    train_lstm_model.py, with a random phase and baseline per patient.
+
+    Args:
+        n_patients (int): Number of patients
+        points (int): Number of readings per patient
+        seed (int): Random seed
+
+    Returns:
+        numpy.ndarray: Array with shape (patients, points, features)
+    """
+    rng = np.random.RandomState(seed)
+    base = np.array([75, 120, 80, 16, 98, 98.6])
+    noise = np.array([0.03, 0.03, 0.03, 0.02, 0.002, 0.001])
+
+    i = np.arange(points)[None, :] + rng.randint(0, 1000, size=(n_patients, 1))
+    cycle = (0.05 * np.sin(i / 20) + 0.02 * np.sin(i / 10))[:, :, None]
+    baseline = base * rng.normal(1, 0.05, size=(n_patients, 1, len(base)))
+
+    # Oxygen and temperature follow the cycle more weakly
+    cycle_weight = np.array([1, 1, 1, 1, 0.3, 0.2])
+    series = baseline * (1 + cycle * cycle_weight + rng.normal(0, 1, size=(n_patients, points, len(base))) * noise)
+    series[:, :, 4] = np.minimum(100, series[:, :, 4])
+    return series
+
+def to_histories(series):
+    """Convert an array of series into patient history dictionaries."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    histories = {}
+    for p in range(len(series)):
+        history = {column: series[p, :, i].tolist() for i, column in enumerate(FEATURE_COLUMNS)}
+        history['timestamps'] = [timestamp] * series.shape[1]
+        histories[f'patient_{p}'] = history
+    return histories
+
+def mean_absolute_errors(forecasts, actual):
+    """Mean absolute error per feature."""
+    errors = np.abs(forecasts - actual).mean(axis=(0, 1))
+    return dict(zip(FEATURE_COLUMNS, errors))
+
+def print_row(name, errors, seconds, n_patients):
+    columns = '  '.join(f"{errors[c]:8.3f}" for c in FEATURE_COLUMNS)
+    print(f"{name:<10}{columns}  {seconds * 1000:10.1f}  {n_patients / seconds:12.0f}")
+
+def main():
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Benchmark forecasting engines for vital signs')
+    parser.add_argument('--patients', type=int, default=5000, help='Number of synthetic patients')
+    parser.add_argument('--context', type=int, default=96, help='Readings used as forecasting context')
+    parser.add_argument('--horizon', type=int, default=12, help='Number of time steps to forecast')
+    parser.add_argument('--include-lstm', action='store_true',
+                        help='Also evaluate the trained LSTM model (requires TensorFlow)')
+    parser.add_argument('--lstm-patients', type=int, default=200,
+                        help='Number of patients evaluated with the LSTM')
+    args = parser.parse_args()
+
+    series = generate_patients(args.patients, args.context + args.horizon)
+    context, actual = series[:, :args.context], series[:, args.context:]
+
+    print(f"Forecasting {args.horizon} steps for {args.patients} patients from {args.context} readings\n")
+    header = '  '.join(f"{name:>8}" for name in SHORT_NAMES)
+    print(f"{'engine':<10}{header}  {'batch (ms)':>10}  {'patients/s':>12}")
+
+    # Last-value baseline
+    start = time.perf_counter()
+    naive = np.repeat(context[:, -1:], args.horizon, axis=1)
+    print_row('naive', mean_absolute_errors(naive, actual), time.perf_counter() - start, args.patients)
+
+    for method in ('holt', 'ar'):
+        forecaster = ClassicalForecaster({
+            'method': method,
+            'prediction_horizon': args.horizon,
+            'context_length': args.context
+        })
+        forecaster.forecast(context[:10])  # warm-up
+        start = time.perf_counter()
+        forecasts = forecaster.forecast(context)
+        print_row(method, mean_absolute_errors(forecasts, actual), time.perf_counter() - start, args.patients)
+
+    if args.include_lstm:
+        from models.lstm_predictor import LSTMPredictor
+
+        predictor = LSTMPredictor({
+            'prediction_horizon': args.horizon,
+            'use_simulated_prediction': False,
+            'micro_batching': False
+        })
+        if not predictor.model_available:
+            print("\nNo trained LSTM model found; train one with train_lstm_model.py first.")
+            return
+
+        n_lstm = min(args.lstm_patients, args.patients)
+        histories = to_histories(context[:n_lstm])
+
+        start = time.perf_counter()
+        predictions = [predictor.predict(histories[p], p) for p in histories]
+        seconds = time.perf_counter() - start
+
+        # The LSTM forecasts temperature with a simple trend rule
+        forecasts = np.stack([
+            np.column_stack([prediction[c] for c in FEATURE_COLUMNS]) for prediction in predictions
+        ])
+        print_row('lstm', mean_absolute_errors(forecasts, actual[:n_lstm]), seconds, n_lstm)
+
+if __name__ == "__main__":
+    main()
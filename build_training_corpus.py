@@ -0,0 +1,63 @@
+"""
+Build a sharded training corpus from patient history files.
+
+Converts patient history JSON files (as written by save_patient_data in the
+training scripts, or files holding a {patient_id: history} mapping) into
+memory-mappable columnar shards with a manifest. The corpus can then be
+streamed by train_lstm_model.py and train_autoencoder.py with --corpus.
+"""
+
+import sys
+import os
+import glob
+import time
+import argparse
+
+# Add parent directory to path to ensure imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.training_corpus import build_corpus
+
+def collect_sources(inputs):
+    """
+    Expand input files, directories and glob patterns into JSON file paths.
+
+    Args:
+        inputs (list): Paths or patterns given on the command line
+
+    Returns:
+        list: Sorted, de-duplicated JSON file paths
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, '**', '*.json'), recursive=True))
+        else:
+            paths.update(glob.glob(item))
+    return sorted(paths)
+
+def main():
+    """Main function to build the corpus."""
+    parser = argparse.ArgumentParser(description='Build a sharded training corpus from patient history files')
+    parser.add_argument('inputs', nargs='+', help='JSON files, directories or glob patterns')
+    parser.add_argument('--output', type=str, required=True, help='Corpus output directory')
+    parser.add_argument('--files-per-shard', type=int, default=64, help='Source files per shard')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Parallel worker processes')
+
+    args = parser.parse_args()
+
+    sources = collect_sources(args.inputs)
+    if not sources:
+        print("Error: No patient history files found.")
+        sys.exit(1)
+
+    print(f"Building corpus from {len(sources)} files with {args.workers} workers")
+    start = time.perf_counter()
+    manifest = build_corpus(sources, args.output, args.files_per_shard, args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"Corpus written to {args.output}: {manifest['patients']} patients, "
+          f"{manifest['rows']} readings in {len(manifest['shards'])} shards ({elapsed:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Distillation script for the compact serving forecaster.
+
+Trains a small student model (GRU or dilated 1D convolutions) on the
+predictions of the trained LSTM teacher, then reports the accuracy and
+latency of teacher and student side by side. The student is saved with the
+teacher's scalers and can be served by LSTMPredictor with
+{'serving_model': 'student'}.
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+from datetime import datetime
+
+# Add parent directory to path to ensure imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.lstm_model import HealthcareLSTM
+from models.student_forecaster import StudentForecaster, teacher_targets, distillation_dataset
+from utils.data_preprocessing import HealthcareDataPreprocessor, scaler_path
+from utils.model_training import ModelTrainer
+from utils.training_corpus import TrainingCorpus
+from train_lstm_model import load_patient_data, generate_synthetic_data
+
+def measure_latency(model, X, repeats=200):
+    """
+    Measure single-window and batch latency of a model.
+
+    Args:
+        model: HealthcareLSTM or StudentForecaster
+        X (numpy.ndarray): Input windows
+        repeats (int): Number of single-window calls to time
+
+    Returns:
+        dict: Median single-window latency (ms) and batch throughput (windows/s)
+    """
+    single = X[:1]
+    model.predict(single)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(single)
+        timings.append(time.perf_counter() - start)
+
+    batch = X[:min(len(X), 1024)]
+    model.predict(batch)
+    start = time.perf_counter()
+    model.predict(batch)
+    seconds = time.perf_counter() - start
+
+    return {
+        'single_ms': float(np.median(timings) * 1000),
+        'windows_per_second': float(len(batch) / seconds)
+    }
+
+def error_metrics(model, X, y, feature_columns):
+    """Test MSE overall and per feature, in normalized units."""
+    y_pred = model.predict(X)
+    squared_error = (y.reshape(y_pred.shape) - y_pred) ** 2
+    metrics = {'mse': float(squared_error.mean())}
+    for i, feature in enumerate(feature_columns):
+        metrics[feature] = float(squared_error[:, :, i].mean())
+    return metrics
+
+def main():
+    """Main function to run the distillation."""
+    parser = argparse.ArgumentParser(description='Distill the healthcare LSTM into a compact serving model')
+    parser.add_argument('--data', type=str, help='Path to patient data JSON file')
+    parser.add_argument('--corpus', type=str, help='Path to a sharded training corpus (see build_training_corpus.py)')
+    parser.add_argument('--synthetic', action='store_true', help='Generate synthetic data for distillation')
+    parser.add_argument('--synthetic-hours', type=int, default=72, help='Hours of synthetic data to generate')
+    parser.add_argument('--teacher-path', type=str, default='models/saved_lstm_model.keras',
+                        help='Path of the trained teacher LSTM')
+    parser.add_argument('--student-path', type=str, default='models/saved_student_model.keras',
+                        help='Path to save the student model')
+    parser.add_argument('--architecture', type=str, choices=['gru', 'conv'], default='gru',
+                        help='Student architecture')
+    parser.add_argument('--units', type=int, default=16, help='GRU units of the student')
+    parser.add_argument('--filters', type=int, default=16, help='Convolution filters of the student')
+    parser.add_argument('--alpha', type=float, default=0.8,
+                        help='Weight of the teacher predictions in the targets (rest: ground truth)')
+    parser.add_argument('--epochs', type=int, default=50, help='Number of training epochs')
+    parser.add_argument('--batch-size', type=int, default=64, help='Batch size for training')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.teacher_path) or not os.path.exists(scaler_path(args.teacher_path)):
+        print(f"Error: No trained teacher found at {args.teacher_path}. Train one with train_lstm_model.py.")
+        sys.exit(1)
+
+    # The student sees exactly the inputs the teacher was trained on
+    data_preprocessor = HealthcareDataPreprocessor(sequence_length=24, prediction_horizon=12)
+    data_preprocessor.load_scalers(scaler_path(args.teacher_path))
+    feature_columns = data_preprocessor.feature_columns
+
+    model_config = {
+        'sequence_length': 24,
+        'prediction_horizon': 12,
+        'feature_count': len(feature_columns)
+    }
+    teacher = HealthcareLSTM({**model_config, 'model_path': args.teacher_path})
+    student = StudentForecaster({
+        **model_config,
+        'architecture': args.architecture,
+        'units': args.units,
+        'filters': args.filters,
+        'model_path': args.student_path
+    })
+
+    trainer = ModelTrainer(teacher, data_preprocessor)
+
+    if args.corpus:
+        corpus = TrainingCorpus(args.corpus)
+        print(f"Distilling over corpus: {corpus.manifest['patients']} patients, {len(corpus)} time points")
+        train_shards, validation_shards = corpus.split_shards(validation_fraction=0.1)
+
+        def dataset(shards, shuffle):
+            return distillation_dataset(
+                teacher, lambda: corpus.window_batches(data_preprocessor, args.batch_size, shards, shuffle),
+                model_config['sequence_length'], model_config['prediction_horizon'], model_config['feature_count'],
+                args.alpha
+            )
+
+        student.train(dataset(train_shards, True), None,
+                      dataset(validation_shards, False) if validation_shards else None, None, args.epochs)
+
+        # Accuracy and latency are measured on (at most) one validation shard
+        X_test, y_test = next(iter(corpus.window_batches(
+            data_preprocessor, 4096, validation_shards[:1] or train_shards[-1:]
+        )))
+    else:
+        if args.synthetic:
+            patient_data = generate_synthetic_data(hours=args.synthetic_hours)
+        elif args.data:
+            print(f"Loading patient data from {args.data}")
+            patient_data = load_patient_data(args.data)
+        else:
+            print("Error: No data source specified. Use --data, --corpus or --synthetic option.")
+            sys.exit(1)
+
+        X_train, y_train, X_val, y_val, X_test, y_test = trainer.prepare_data(
+            patient_data, test_size=0.15, validation_size=0.15, fit_scalers=False
+        )
+
+        print("Labelling windows with the teacher")
+        train_targets = teacher_targets(teacher, X_train, y_train, args.alpha)
+        val_targets = teacher_targets(teacher, X_val, y_val, args.alpha)
+
+        print(f"Training student with {args.epochs} epochs and batch size {args.batch_size}")
+        student.train(X_train, train_targets, X_val, val_targets, args.epochs, args.batch_size)
+
+    # Serve the student with the teacher's scalers
+    shutil.copyfile(scaler_path(args.teacher_path), scaler_path(args.student_path))
+
+    report = {}
+    for name, model in (('teacher', teacher), ('student', student)):
+        report[name] = {
+            'parameters': int(model.model.count_params()),
+            'test_errors': error_metrics(model, X_test, y_test, feature_columns),
+            'latency': measure_latency(model, X_test)
+        }
+
+    print(f"\n{'model':<10}{'params':>10}{'test MSE':>12}{'single (ms)':>14}{'windows/s':>12}")
+    for name, entry in report.items():
+        print(f"{name:<10}{entry['parameters']:>10}{entry['test_errors']['mse']:>12.6f}"
+              f"{entry['latency']['single_ms']:>14.2f}{entry['latency']['windows_per_second']:>12.0f}")
+
+    speedup = report['teacher']['latency']['single_ms'] / report['student']['latency']['single_ms']
+    error_change = report['student']['test_errors']['mse'] / report['teacher']['test_errors']['mse'] - 1
+    print(f"\nStudent latency: {speedup:.1f}x faster; test MSE {error_change * 100:+.1f}% vs teacher")
+
+    report['architecture'] = args.architecture
+    report['alpha'] = args.alpha
+    report['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    os.makedirs('logs', exist_ok=True)
+    with open('logs/student_metrics.json', 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Student saved to {args.student_path}; metrics written to logs/student_metrics.json")
+    print("Serve it with LSTMPredictor({'serving_model': 'student'})")
+
+if __name__ == "__main__":
+    main()
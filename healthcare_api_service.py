@@ -20,7 +20,9 @@ from models.enhanced_anomaly_detector import EnhancedAnomalyDetector as AnomalyD
 from models.lstm_predictor import LSTMPredictor
 from models.risk_calculator import RiskCalculator
 from models.ecg_analyzer import ECGAnalyzer
+from models.early_warning import EarlyWarningScorer
 from utils.helpers import make_json_serializable
+from utils.waveform_store import WaveformStore
 
 # Disease prediction components
 from routes.disease_prediction_routes import (
@@ -76,6 +78,8 @@ anomaly_detector = AnomalyDetector()
 lstm_predictor = LSTMPredictor()
 risk_calculator = RiskCalculator()
 ecg_analyzer = ECGAnalyzer()
+early_warning_scorer = EarlyWarningScorer()  # NEWS2/MEWS per reading and the ward table
+ecg_store = WaveformStore()  # Full-resolution ECG; the histories keep a short preview
 
 # Multimodal components
 image_analyzer = MedicalImageAnalyzer()
@@ -95,6 +99,10 @@ print("All components initialized successfully")
 patient_data_history = {}
 alerts = {}
 
+# Number of readings ever appended to each patient's history (used to reuse
+# predictions and to find the readings a model has not seen yet)
+history_versions = {}
+
 # Helper function to get or create patient history
 def get_or_create_patient_history(patient_id):
     if patient_id not in patient_data_history:
@@ -106,11 +114,19 @@ def get_or_create_patient_history(patient_id):
             'respiratory_rate': [],
             'oxygen_saturation': [],
             'temperature': [],
-            'ecg_data': []
+            'ecg_data': [],
+            'news2': [],
+            'mews': []
         }
         alerts[patient_id] = []
+        history_versions[patient_id] = 0
     return patient_data_history[patient_id]
 
+def mark_history_updated(patient_id, count=1):
+    """Advance a patient's history version by the number of readings added"""
+    history_versions[patient_id] += count
+    return history_versions[patient_id]
+
 # Helper function to check allowed files
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -139,6 +155,14 @@ def generate_initial_data(patient_id):
         patient_history['oxygen_saturation'].append(data['oxygen_saturation'])
         patient_history['temperature'].append(data['temperature'])
         patient_history['ecg_data'].append(data['ecg_data'][:20])
+        ecg_store.append(patient_id, data['ecg_data'], timestamp)
+        
+        # Early-warning scores alongside the vitals
+        early_warning = early_warning_scorer.update(patient_id, data, patient_history['timestamps'][-1])
+        patient_history['news2'].append(early_warning['news2'])
+        patient_history['mews'].append(early_warning['mews'])
+    
+    mark_history_updated(patient_id, 288)
 
 # API ROUTES
 
@@ -153,7 +177,7 @@ def home():
         "status": "online",
         "endpoints": {
             "info": "/api/status",
-            "vitals": "/api/vitals/simulate, /api/vitals/submit, /api/vitals/history, /api/vitals/alerts",
+            "vitals": "/api/vitals/simulate, /api/vitals/submit, /api/vitals/history, /api/vitals/early-warning, /api/vitals/alerts",
             "disease_prediction": "/api/disease-prediction/symptoms, /api/disease-prediction/predict",
             "image_analysis": "/api/image-analysis/pneumonia, /api/image-analysis/brain-tumor, /api/image-analysis/kidney-stone",
             "audio_analysis": "/api/audio-analysis",
@@ -173,7 +197,9 @@ def api_status():
     return jsonify({
         "status": "online",
         "service": "Healthcare Monitoring API",
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "prediction_cache": lstm_predictor.get_cache_stats(),
+        "ecg_storage": ecg_store.memory_usage()
     })
 
 # ===== VITALS MONITORING ROUTES =====
@@ -184,8 +210,8 @@ def simulate_vitals():
     try:
         patient_id = request.args.get('patient_id', 'demo_patient')
         
-        # Generate vitals
-        current_data = vitals_generator.generate_vitals()
+        # Generate vitals (the ECG strip continues the patient's signal)
+        current_data = vitals_generator.generate_vitals(ecg_stream=patient_id)
         
         # Get patient history
         patient_history = get_or_create_patient_history(patient_id)
@@ -200,6 +226,10 @@ def simulate_vitals():
         patient_history['oxygen_saturation'].append(current_data['oxygen_saturation'])
         patient_history['temperature'].append(current_data['temperature'])
         patient_history['ecg_data'].append(current_data['ecg_data'][:20])  # Store a sample of ECG
+        ecg_store.append(patient_id, current_data['ecg_data'], current_time)
+        early_warning = early_warning_scorer.update(patient_id, current_data, current_time)
+        patient_history['news2'].append(early_warning['news2'])
+        patient_history['mews'].append(early_warning['mews'])
         
         # Limit history length
         max_history = 288  # 24 hours at 5-min intervals
@@ -207,11 +237,13 @@ def simulate_vitals():
             for key in patient_history:
                 patient_history[key] = patient_history[key][-max_history:]
         
+        mark_history_updated(patient_id)
+        
         # Run AI analysis
         anomaly_results = anomaly_detector.detect(current_data, patient_history)
-        predictions = lstm_predictor.predict(patient_history)
+        predictions = lstm_predictor.predict(patient_history, patient_id, history_versions[patient_id])
         risk_score, risk_factors = risk_calculator.calculate_risk(current_data, predictions, anomaly_results)
-        ecg_analysis = ecg_analyzer.analyze(current_data['ecg_data'])
+        ecg_analysis = ecg_analyzer.analyze_stream(patient_id, current_data['ecg_data'], timestamp=current_time)
         
         # Check for alert conditions
         if risk_score > 0.15 or (risk_score > 0.05 and any(val for key, val in anomaly_results.items() if isinstance(val, bool) and val)):
@@ -239,6 +271,7 @@ def simulate_vitals():
             'risk_score': risk_score,
             'risk_factors': risk_factors,
             'ecg_analysis': make_json_serializable(ecg_analysis),
+            'early_warning': make_json_serializable(early_warning),
             'alerts': make_json_serializable(alerts.get(patient_id, []))
         }
         
@@ -273,6 +306,15 @@ def submit_vitals():
             'temperature': data['temperature'],
             'ecg_data': data.get('ecg_data', [0] * 250)  # Default to empty ECG if not provided
         }
+        for field in ['consciousness', 'supplemental_oxygen']:
+            if field in data:
+                current_data[field] = data[field]
+        
+        # Score before touching the history, so a bad reading leaves no trace
+        try:
+            early_warning = early_warning_scorer.score(current_data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Get patient history
         patient_history = get_or_create_patient_history(patient_id)
@@ -287,11 +329,18 @@ def submit_vitals():
         patient_history['oxygen_saturation'].append(current_data['oxygen_saturation'])
         patient_history['temperature'].append(current_data['temperature'])
         patient_history['ecg_data'].append(current_data['ecg_data'][:20])
+        ecg_store.append(patient_id, current_data['ecg_data'], current_time)
+        early_warning = early_warning_scorer.update(patient_id, current_data, current_time)
+        patient_history['news2'].append(early_warning['news2'])
+        patient_history['mews'].append(early_warning['mews'])
+        
+        mark_history_updated(patient_id)
         
         # Run AI analysis
         anomaly_results = anomaly_detector.detect(current_data, patient_history)
-        predictions = lstm_predictor.predict(patient_history)
+        predictions = lstm_predictor.predict(patient_history, patient_id, history_versions[patient_id])
         risk_score, risk_factors = risk_calculator.calculate_risk(current_data, predictions, anomaly_results)
+        # Submitted strips are not known to be contiguous, so each is analyzed on its own
         ecg_analysis = ecg_analyzer.analyze(current_data['ecg_data'])
         
         # Prepare response
@@ -302,7 +351,8 @@ def submit_vitals():
             'predictions': make_json_serializable(predictions),
             'risk_score': risk_score,
             'risk_factors': risk_factors,
-            'ecg_analysis': make_json_serializable(ecg_analysis)
+            'ecg_analysis': make_json_serializable(ecg_analysis),
+            'early_warning': make_json_serializable(early_warning)
         }
         
         return jsonify(response)
@@ -332,6 +382,48 @@ def get_vitals_history():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/vitals/ecg')
+def get_vitals_ecg():
+    """Get the full-resolution ECG of a patient (default: the last minute)"""
+    try:
+        patient_id = request.args.get('patient_id', 'default_patient')
+        start = request.args.get('start')
+        end = request.args.get('end')
+        if start is None:
+            end_time = datetime.strptime(end, "%Y-%m-%d %H:%M:%S") if end else datetime.now()
+            start = end_time - timedelta(seconds=int(request.args.get('seconds', 60)))
+        
+        times, samples = ecg_store.read(patient_id, start, end)
+        return jsonify({
+            'patient_id': patient_id,
+            'sampling_rate': ecg_store.config['sampling_rate'],
+            'times': times.tolist(),
+            'samples': samples.tolist()
+        })
+        
+    except ValueError:
+        return jsonify({'error': 'Use YYYY-MM-DD HH:MM:SS timestamps and whole seconds'}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/vitals/early-warning')
+def get_vitals_early_warning():
+    """Get current NEWS2/MEWS scores of all patients (or of one with ?patient_id=)"""
+    try:
+        patient_id = request.args.get('patient_id')
+        if patient_id is None:
+            return jsonify(make_json_serializable({'patients': early_warning_scorer.current()}))
+        
+        row = early_warning_scorer.current(patient_id)
+        if row is None:
+            return jsonify({'error': f'No scores for patient {patient_id}'}), 404
+        return jsonify(make_json_serializable(row))
+        
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/vitals/alerts')
 def get_vitals_alerts():
     """Get alerts for a patient"""
@@ -881,10 +973,11 @@ def background_monitoring():
     print("Starting background monitoring thread...")
     while True:
         # Generate new data for each patient
+        updated = {}
         for patient_id in list(patient_data_history.keys()):
             try:
-                # Generate vitals
-                current_data = vitals_generator.generate_vitals()
+                # Generate vitals (the ECG strip continues the patient's signal)
+                current_data = vitals_generator.generate_vitals(ecg_stream=patient_id)
                 
                 # Get patient history
                 patient_history = patient_data_history[patient_id]
@@ -899,6 +992,10 @@ def background_monitoring():
                 patient_history['oxygen_saturation'].append(current_data['oxygen_saturation'])
                 patient_history['temperature'].append(current_data['temperature'])
                 patient_history['ecg_data'].append(current_data['ecg_data'][:20])
+                ecg_store.append(patient_id, current_data['ecg_data'], current_time)
+                early_warning = early_warning_scorer.update(patient_id, current_data, current_time)
+                patient_history['news2'].append(early_warning['news2'])
+                patient_history['mews'].append(early_warning['mews'])
                 
                 # Limit history length
                 max_history = 288  # 24 hours at 5-min intervals
@@ -906,9 +1003,29 @@ def background_monitoring():
                     for key in patient_history:
                         patient_history[key] = patient_history[key][-max_history:]
                 
+                mark_history_updated(patient_id)
+                
                 # Run AI analysis for alerts
                 anomaly_results = anomaly_detector.detect(current_data, patient_history)
-                predictions = lstm_predictor.predict(patient_history)
+                # Feed every strip to the patient's stream so it stays contiguous
+                ecg_analyzer.analyze_stream(patient_id, current_data['ecg_data'], timestamp=current_time)
+                updated[patient_id] = (current_data, current_time, anomaly_results)
+            except Exception as e:
+                print(f"Error in background monitoring for patient {patient_id}: {e}")
+        
+        # Forecast every updated patient together, so the model calls are batched
+        try:
+            all_predictions = lstm_predictor.predict_many(
+                {patient_id: patient_data_history[patient_id] for patient_id in updated},
+                {patient_id: history_versions[patient_id] for patient_id in updated}
+            )
+        except Exception as e:
+            print(f"Error in background predictions: {e}")
+            updated = {}
+        
+        for patient_id, (current_data, current_time, anomaly_results) in updated.items():
+            try:
+                predictions = all_predictions[patient_id]
                 risk_score, risk_factors = risk_calculator.calculate_risk(current_data, predictions, anomaly_results)
                 
                 # Check for alert conditions
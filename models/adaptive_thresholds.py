@@ -0,0 +1,147 @@
+import numpy as np
+from utils.quantile_sketch import KLLSketch
+
+class AdaptiveThresholds:
+    """
+    Per-patient anomaly thresholds learned from reconstruction errors.
+
+    For every patient the overall and per-feature reconstruction errors of
+    the autoencoder are tracked with KLL quantile sketches, and thresholds are
+    read off a chosen quantile instead of the fixed mean + k*std values saved
+    at training time. Raw errors are never stored, and sketches from
+    different shards can be merged to get fleet-level thresholds.
+    """
+
+    def __init__(self, feature_columns, config=None):
+        """
+        Initialize the threshold tracker.
+
+        Args:
+            feature_columns (list): Names of the autoencoder input features
+            config (dict, optional): Configuration parameters:
+                - quantile: Quantile of the error distribution used as threshold
+                - min_samples: Readings needed before a patient's thresholds are used
+                - sketch_size: Accuracy parameter k of each sketch
+        """
+        # Default configuration
+        self.config = {
+            'quantile': 0.99,
+            'min_samples': 200,
+            'sketch_size': 200,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self.feature_columns = list(feature_columns)
+
+        # patient_id -> {'overall': sketch, 'features': [sketch per feature]}
+        self.patients = {}
+
+    def _new_sketches(self):
+        k = self.config['sketch_size']
+        return {
+            'overall': KLLSketch(k),
+            'features': [KLLSketch(k) for _ in self.feature_columns]
+        }
+
+    def update(self, patient_id, overall_scores, feature_scores):
+        """
+        Record reconstruction errors for a patient.
+
+        Args:
+            patient_id (str): Patient identifier
+            overall_scores (numpy.ndarray): Overall errors with shape (samples,)
+            feature_scores (numpy.ndarray): Per-feature errors with shape (samples, features)
+        """
+        sketches = self.patients.get(patient_id)
+        if sketches is None:
+            sketches = self.patients[patient_id] = self._new_sketches()
+
+        feature_scores = np.asarray(feature_scores, dtype=float).reshape(-1, len(self.feature_columns))
+        sketches['overall'].update_many(overall_scores)
+        for i, sketch in enumerate(sketches['features']):
+            sketch.update_many(feature_scores[:, i])
+
+    def _thresholds_from(self, sketches):
+        if sketches is None or sketches['overall'].count < self.config['min_samples']:
+            return None
+        q = self.config['quantile']
+        threshold = sketches['overall'].quantile(q)
+        feature_thresholds = np.array([sketch.quantile(q) for sketch in sketches['features']])
+        return threshold, feature_thresholds
+
+    def get_thresholds(self, patient_id):
+        """
+        Get a patient's current thresholds.
+
+        Args:
+            patient_id (str): Patient identifier
+
+        Returns:
+            tuple: (threshold, feature_thresholds), or None while the patient
+                has fewer than min_samples readings
+        """
+        return self._thresholds_from(self.patients.get(patient_id))
+
+    def fleet_thresholds(self):
+        """
+        Thresholds over every tracked patient combined.
+
+        Returns:
+            tuple: (threshold, feature_thresholds), or None if too little data
+        """
+        fleet = self._new_sketches()
+        for sketches in self.patients.values():
+            fleet['overall'].merge(sketches['overall'])
+            for merged, sketch in zip(fleet['features'], sketches['features']):
+                merged.merge(sketch)
+        return self._thresholds_from(fleet)
+
+    def merge(self, other):
+        """
+        Merge sketches from another shard, patient by patient.
+
+        Args:
+            other (AdaptiveThresholds): Tracker for the same feature columns
+
+        Returns:
+            AdaptiveThresholds: self
+        """
+        if other.feature_columns != self.feature_columns:
+            raise ValueError("Cannot merge thresholds for different feature columns")
+
+        for patient_id, other_sketches in other.patients.items():
+            sketches = self.patients.get(patient_id)
+            if sketches is None:
+                sketches = self.patients[patient_id] = self._new_sketches()
+            sketches['overall'].merge(other_sketches['overall'])
+            for sketch, other_sketch in zip(sketches['features'], other_sketches['features']):
+                sketch.merge(other_sketch)
+        return self
+
+    def to_dict(self):
+        """Serialize all sketches, e.g. to ship a shard's state."""
+        return {
+            'feature_columns': self.feature_columns,
+            'config': self.config,
+            'patients': {
+                patient_id: {
+                    'overall': sketches['overall'].to_dict(),
+                    'features': [sketch.to_dict() for sketch in sketches['features']]
+                }
+                for patient_id, sketches in self.patients.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a tracker from to_dict output."""
+        tracker = cls(data['feature_columns'], data['config'])
+        for patient_id, sketches in data['patients'].items():
+            tracker.patients[patient_id] = {
+                'overall': KLLSketch.from_dict(sketches['overall']),
+                'features': [KLLSketch.from_dict(sketch) for sketch in sketches['features']]
+            }
+        return tracker
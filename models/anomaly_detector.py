@@ -1,9 +1,21 @@
 import numpy as np
 from sklearn.ensemble import IsolationForest
+from sklearn.base import clone
 import pandas as pd
+from models.half_space_trees import HalfSpaceTrees
+from utils.training_service import fit_isolation_forests
 
 class AnomalyDetector:
-    def __init__(self):
+    def __init__(self, engine='isolation_forest', training_service=None):
+        # Detection engine: 'isolation_forest' (batch) or 'half_space_trees' (streaming)
+        if engine not in ('isolation_forest', 'half_space_trees'):
+            raise ValueError(f"Unknown anomaly detection engine: {engine}")
+        self.engine = engine
+        
+        # Optional TrainingService used to fit forests off the monitoring thread
+        self.training_service = training_service
+        self._training_key = f'isolation_forest-{id(self)}'
+        
         # Initialize models
         self.isolation_forest = {
             'heart_rate': IsolationForest(contamination=0.05, random_state=42),
@@ -23,30 +35,69 @@ class AnomalyDetector:
             'temperature': (97, 99)  # Fahrenheit
         }
         
+        # Streaming models, scaled with physiologically plausible limits
+        if self.engine == 'half_space_trees':
+            self.half_space_trees = {
+                'heart_rate': HalfSpaceTrees({'limits': [(30, 200)]}),
+                'blood_pressure': HalfSpaceTrees({'limits': [(60, 220), (30, 130)]}),
+                'respiratory_rate': HalfSpaceTrees({'limits': [(4, 40)]}),
+                'oxygen_saturation': HalfSpaceTrees({'limits': [(70, 100)]}),
+                'temperature': HalfSpaceTrees({'limits': [(93, 106)]})
+            }
+        
         # Track if models have been trained
         self.models_trained = False
     
+    def _model_inputs(self, history):
+        """Arrange history columns into the input array of each per-vital model"""
+        return {
+            'heart_rate': np.asarray(history['heart_rate'], dtype=float).reshape(-1, 1),
+            'blood_pressure': np.column_stack((
+                history['blood_pressure_systolic'],
+                history['blood_pressure_diastolic']
+            )).astype(float),
+            'respiratory_rate': np.asarray(history['respiratory_rate'], dtype=float).reshape(-1, 1),
+            'oxygen_saturation': np.asarray(history['oxygen_saturation'], dtype=float).reshape(-1, 1),
+            'temperature': np.asarray(history['temperature'], dtype=float).reshape(-1, 1)
+        }
+    
     def _train_models(self, history):
         """Train anomaly detection models on historical data"""
+        if self.training_service is not None and self.training_service.is_pending(self._training_key):
+            return
+        
         # Prepare data for training
-        heart_rate_data = np.array(history['heart_rate']).reshape(-1, 1)
-        blood_pressure_data = np.column_stack((
-            history['blood_pressure_systolic'],
-            history['blood_pressure_diastolic']
-        ))
-        respiratory_rate_data = np.array(history['respiratory_rate']).reshape(-1, 1)
-        oxygen_saturation_data = np.array(history['oxygen_saturation']).reshape(-1, 1)
-        temperature_data = np.array(history['temperature']).reshape(-1, 1)
+        training_data = self._model_inputs(history)
+        
+        # Streaming engine only needs its reference window bootstrapped
+        if self.engine == 'half_space_trees':
+            for name, model in self.half_space_trees.items():
+                model.fit(training_data[name])
+            self.models_trained = True
+            return
+        
+        # Fit in a worker process when a training service is available;
+        # range checks stay in use until the fitted forests are swapped in
+        if self.training_service is not None:
+            unfitted = {name: clone(forest) for name, forest in self.isolation_forest.items()}
+            self.training_service.submit(
+                self._training_key, fit_isolation_forests, unfitted, training_data,
+                on_complete=self._publish_forests
+            )
+            return
         
         # Train models
-        self.isolation_forest['heart_rate'].fit(heart_rate_data)
-        self.isolation_forest['blood_pressure'].fit(blood_pressure_data)
-        self.isolation_forest['respiratory_rate'].fit(respiratory_rate_data)
-        self.isolation_forest['oxygen_saturation'].fit(oxygen_saturation_data)
-        self.isolation_forest['temperature'].fit(temperature_data)
+        for name, forest in self.isolation_forest.items():
+            forest.fit(training_data[name])
         
         self.models_trained = True
     
+    def _publish_forests(self, forests):
+        """Swap in forests fitted by the training service"""
+        # Single reference assignment, so detection never sees a partial set
+        self.isolation_forest = forests
+        self.models_trained = True
+    
     def _check_range_anomalies(self, current_data):
         """Simple check if values are outside normal ranges"""
         anomalies = {}
@@ -77,8 +128,39 @@ class AnomalyDetector:
         
         return anomalies
     
+    def _check_streaming_anomalies(self, current_data):
+        """Score the current reading with the half-space trees, then learn from it"""
+        anomalies = {}
+        
+        points = {
+            'heart_rate': [current_data['heart_rate']],
+            'blood_pressure': [current_data['blood_pressure'][0], current_data['blood_pressure'][1]],
+            'respiratory_rate': [current_data['respiratory_rate']],
+            'oxygen_saturation': [current_data['oxygen_saturation']],
+            'temperature': [current_data['temperature']]
+        }
+        
+        for name, point in points.items():
+            model = self.half_space_trees[name]
+            
+            # Same convention as IsolationForest: negative score means anomaly
+            score = model.decision_function(point)
+            anomaly_score = model.threshold - score
+            anomalies[name] = {
+                'is_anomaly': score < 0,
+                'score': score
+            }
+            
+            # Continuous learning keeps the reference window tracking the baseline
+            model.learn_one(point, score=anomaly_score)
+        
+        return anomalies
+    
     def _check_model_anomalies(self, current_data):
         """Use trained models to detect anomalies"""
+        if self.engine == 'half_space_trees':
+            return self._check_streaming_anomalies(current_data)
+        
         anomalies = {}
         
         # Prepare current data points
@@ -133,6 +215,41 @@ class AnomalyDetector:
         
         return anomalies
     
+    def score_history(self, history):
+        """
+        Score a block of history with the trained models in one batch per model.
+        
+        Unlike detect, this never updates streaming models, so it can be used to
+        re-evaluate stored readings after the models change.
+        
+        Args:
+            history (dict): History columns (heart_rate, blood_pressure_systolic, ...)
+            
+        Returns:
+            dict: Per-model 'is_anomaly' and 'score' arrays (negative score is anomalous)
+        """
+        if not self.models_trained:
+            raise ValueError("Anomaly detection models have not been trained")
+        
+        inputs = self._model_inputs(history)
+        anomalies = {}
+        
+        for name, data in inputs.items():
+            if self.engine == 'half_space_trees':
+                scores = self.half_space_trees[name].decision_function_many(data)
+                is_anomaly = scores < 0
+            else:
+                forest = self.isolation_forest[name]
+                scores = forest.decision_function(data)
+                is_anomaly = forest.predict(data) == -1
+            
+            anomalies[name] = {
+                'is_anomaly': is_anomaly,
+                'score': scores
+            }
+        
+        return anomalies
+    
     def detect(self, current_data, history):
         """Detect anomalies in the current vital signs"""
         # Train models if not already trained
@@ -3,6 +3,29 @@ import pandas as pd
 import os
 from sklearn.preprocessing import MinMaxScaler
 from models.deep_autoencoder import DeepAutoencoder
+from models.adaptive_thresholds import AdaptiveThresholds
+from utils.training_service import train_autoencoder
+
+# Order of values in a flattened reading; the blood pressure pair is unpacked
+READING_LAYOUT = (
+    'heart_rate',
+    'blood_pressure_systolic',
+    'blood_pressure_diastolic',
+    'respiratory_rate',
+    'oxygen_saturation',
+    'temperature'
+)
+
+def flatten_reading(current_data):
+    """Flatten a current_data dictionary into a vector ordered as READING_LAYOUT"""
+    return np.array([
+        current_data['heart_rate'],
+        current_data['blood_pressure'][0],
+        current_data['blood_pressure'][1],
+        current_data['respiratory_rate'],
+        current_data['oxygen_saturation'],
+        current_data['temperature']
+    ], dtype=float)
 
 class AutoencoderAnomalyDetector:
     """
@@ -14,12 +37,14 @@ class AutoencoderAnomalyDetector:
     and accurate detection capabilities.
     """
     
-    def __init__(self, config=None):
+    def __init__(self, config=None, training_service=None):
         """
         Initialize the autoencoder anomaly detector.
         
         Args:
             config (dict, optional): Configuration parameters
+            training_service (TrainingService, optional): Service used to train
+                the autoencoder in a background process
         """
         # Default configuration
         self.config = {
@@ -40,6 +65,9 @@ class AutoencoderAnomalyDetector:
                 'oxygen_saturation': (95, 100),
                 'temperature': (97, 99)  # Fahrenheit
             },
+            'adaptive_thresholds': True,  # Per-patient thresholds from streaming error quantiles
+            'threshold_quantile': 0.99,
+            'adaptive_min_samples': 200,  # Use the trained thresholds until a patient has this many readings
         }
         
         # Update config if provided
@@ -47,20 +75,58 @@ class AutoencoderAnomalyDetector:
             self.config.update(config)
             
         # Initialize autoencoder model
-        self.autoencoder = DeepAutoencoder({
+        self.autoencoder_config = {
             'input_dim': len(self.config['feature_columns']),
             'encoding_dims': [32, 16, 8],
             'model_path': self.config['model_path']
-        })
+        }
+        self.autoencoder = DeepAutoencoder(self.autoencoder_config)
+        
+        # Background training
+        self.training_service = training_service
+        self._training_key = f'autoencoder-{id(self)}'
         
         # Track model training status
         self.model_trained = os.path.exists(self.config['model_path'])
+        self.model_version = 0  # Incremented whenever the model changes (latent vectors are per version)
         
         # For tracking training data distribution
         self.scalers = {feature: MinMaxScaler() for feature in self.config['feature_columns']}
         
+        # Column mapping between readings/history and the feature matrix
+        self._compile_feature_schema()
+        
+        # Per-patient reconstruction error sketches
+        self.adaptive_thresholds = self._new_adaptive_thresholds()
+        
         print(f"Autoencoder Anomaly Detector initialized. Model trained: {self.model_trained}")
     
+    def _compile_feature_schema(self):
+        """
+        Precompute how feature columns map onto readings and history.
+        
+        History keys share the feature names, so the history mapping is just
+        the column order; readings are flattened with flatten_reading and
+        gathered through a fixed index vector.
+        """
+        feature_columns = self.config['feature_columns']
+        
+        unknown = [feature for feature in feature_columns if feature not in READING_LAYOUT]
+        if unknown:
+            raise ValueError(f"Unsupported autoencoder feature columns: {unknown}")
+        
+        self._reading_index = np.array([READING_LAYOUT.index(feature) for feature in feature_columns])
+        self._feature_index = {feature: i for i, feature in enumerate(feature_columns)}
+    
+    def _new_adaptive_thresholds(self):
+        """Create an empty threshold tracker, or None if the feature is disabled."""
+        if not self.config['adaptive_thresholds']:
+            return None
+        return AdaptiveThresholds(self.config['feature_columns'], {
+            'quantile': self.config['threshold_quantile'],
+            'min_samples': self.config['adaptive_min_samples']
+        })
+    
     def _convert_to_features_array(self, current_data):
         """
         Convert current_data dictionary to features array for the autoencoder.
@@ -71,21 +137,7 @@ class AutoencoderAnomalyDetector:
         Returns:
             numpy.ndarray: Features array with shape (1, n_features)
         """
-        # Extract features in the right order
-        features = []
-        for feature in self.config['feature_columns']:
-            if feature == 'heart_rate':
-                features.append(current_data['heart_rate'])
-            elif feature == 'blood_pressure_systolic':
-                features.append(current_data['blood_pressure'][0])
-            elif feature == 'blood_pressure_diastolic':
-                features.append(current_data['blood_pressure'][1])
-            elif feature == 'respiratory_rate':
-                features.append(current_data['respiratory_rate'])
-            elif feature == 'oxygen_saturation':
-                features.append(current_data['oxygen_saturation'])
-                
-        return np.array([features])
+        return flatten_reading(current_data)[self._reading_index][np.newaxis, :]
     
     def _check_range_anomalies(self, current_data):
         """
@@ -140,27 +192,13 @@ class AutoencoderAnomalyDetector:
         Returns:
             numpy.ndarray: Training data with shape (samples, features)
         """
-        data = []
+        n_samples = len(history['timestamps'])
         
-        # Extract data points
-        for i in range(len(history['timestamps'])):
-            features = []
-            
-            for feature in self.config['feature_columns']:
-                if feature == 'heart_rate':
-                    features.append(history['heart_rate'][i])
-                elif feature == 'blood_pressure_systolic':
-                    features.append(history['blood_pressure_systolic'][i])
-                elif feature == 'blood_pressure_diastolic':
-                    features.append(history['blood_pressure_diastolic'][i])
-                elif feature == 'respiratory_rate':
-                    features.append(history['respiratory_rate'][i])
-                elif feature == 'oxygen_saturation':
-                    features.append(history['oxygen_saturation'][i])
-                    
-            data.append(features)
-            
-        return np.array(data)
+        # One column per feature; history lists or arrays are converted in bulk
+        return np.column_stack([
+            np.asarray(history[feature][:n_samples], dtype=float)
+            for feature in self.config['feature_columns']
+        ])
     
     def train(self, history, validation_split=0.2, epochs=50, batch_size=32):
         """
@@ -173,7 +211,8 @@ class AutoencoderAnomalyDetector:
             batch_size (int): Batch size for training
             
         Returns:
-            bool: True if training was successful
+            bool: True if training was successful, or if it was queued on the
+                training service (the model is swapped in once published)
         """
         try:
             # Prepare training data
@@ -183,6 +222,14 @@ class AutoencoderAnomalyDetector:
                 print("Not enough data for training (need at least 50 samples)")
                 return False
             
+            if self.training_service is not None:
+                self.training_service.submit(
+                    self._training_key, train_autoencoder,
+                    self.autoencoder_config, training_data, epochs, batch_size,
+                    on_complete=self._publish_autoencoder
+                )
+                return True
+            
             print(f"Training autoencoder with {len(training_data)} samples")
             
             # Train the model
@@ -194,6 +241,7 @@ class AutoencoderAnomalyDetector:
             
             # Update trained flag
             self.model_trained = True
+            self.model_version += 1
             
             print("Autoencoder model training completed")
             return True
@@ -202,7 +250,29 @@ class AutoencoderAnomalyDetector:
             print(f"Error training autoencoder: {e}")
             return False
     
-    def detect(self, current_data, history=None):
+    @property
+    def training_pending(self):
+        """Whether a background training job is queued or running."""
+        return self.training_service is not None and self.training_service.is_pending(self._training_key)
+    
+    def _publish_autoencoder(self, model_path):
+        """
+        Load a model published by the training service and swap it in.
+        
+        Args:
+            model_path (str): Path the trained model was published to
+        """
+        autoencoder = DeepAutoencoder(dict(self.autoencoder_config, model_path=model_path))
+        
+        # Swap the reference before flipping the flag so detection never sees a half-loaded model.
+        # Error distributions of the old model no longer apply, so the sketches start over.
+        self.autoencoder = autoencoder
+        self.adaptive_thresholds = self._new_adaptive_thresholds()
+        self.model_version += 1
+        self.model_trained = True
+        print("Autoencoder model published by training service")
+    
+    def detect(self, current_data, history=None, patient_id='default'):
         """
         Detect anomalies in the current vital signs.
         
@@ -210,28 +280,32 @@ class AutoencoderAnomalyDetector:
             current_data (dict): Dictionary with current vital signs
             history (dict, optional): Dictionary with patient history data
                 for training if model not already trained
+            patient_id (str): Patient whose adaptive thresholds are used and updated
                 
         Returns:
             dict: Anomaly detection results
         """
         # Train model if not trained and history is provided
-        if not self.model_trained and history and len(history['timestamps']) > 50:
+        if not self.model_trained and not self.training_pending and history and len(history['timestamps']) > 50:
             print("Model not trained. Training now...")
             self.train(history)
         
         # Use enhanced detection if model is trained and feature is enabled
         if self.model_trained and self.config['use_enhanced_detection']:
-            return self._detect_with_autoencoder(current_data)
+            return self._detect_with_autoencoder(current_data, patient_id, update_thresholds=True)
         else:
             # Fall back to traditional range-based detection
             return self._check_range_anomalies(current_data)
     
-    def _detect_with_autoencoder(self, current_data):
+    def _detect_with_autoencoder(self, current_data, patient_id='default', update_thresholds=False):
         """
         Detect anomalies using the autoencoder model.
         
         Args:
             current_data (dict): Dictionary with current vital signs
+            patient_id (str): Patient whose adaptive thresholds are used
+            update_thresholds (bool): Whether to add this reading's errors to
+                the patient's sketches (only once per reading)
             
         Returns:
             dict: Anomaly detection results
@@ -239,8 +313,21 @@ class AutoencoderAnomalyDetector:
         # Convert to features array
         features = self._convert_to_features_array(current_data)
         
-        # Detect anomalies
-        detection_results = self.autoencoder.detect_anomalies(features)
+        # Patient thresholds once enough errors have been seen, trained ones otherwise
+        thresholds = None
+        if self.adaptive_thresholds is not None:
+            thresholds = self.adaptive_thresholds.get_thresholds(patient_id)
+        if thresholds is not None:
+            detection_results = self.autoencoder.detect_anomalies(
+                features, threshold=thresholds[0], feature_thresholds=thresholds[1]
+            )
+        else:
+            detection_results = self.autoencoder.detect_anomalies(features)
+        
+        if update_thresholds and self.adaptive_thresholds is not None:
+            self.adaptive_thresholds.update(
+                patient_id, detection_results['anomaly_score'], detection_results['feature_scores']
+            )
         
         # Map results to expected output format
         results = {}
@@ -253,17 +340,8 @@ class AutoencoderAnomalyDetector:
         feature_scores = detection_results['feature_scores'][0]
         
         # Map to output format expected by the system
-        for i, feature in enumerate(self.config['feature_columns']):
-            if feature == 'heart_rate':
-                results['heart_rate'] = bool(anomalous_features[i])
-            elif feature == 'blood_pressure_systolic':
-                results['blood_pressure_systolic'] = bool(anomalous_features[i])
-            elif feature == 'blood_pressure_diastolic':
-                results['blood_pressure_diastolic'] = bool(anomalous_features[i])
-            elif feature == 'respiratory_rate':
-                results['respiratory_rate'] = bool(anomalous_features[i])
-            elif feature == 'oxygen_saturation':
-                results['oxygen_saturation'] = bool(anomalous_features[i])
+        for feature, flag in zip(self.config['feature_columns'], anomalous_features.tolist()):
+            results[feature] = bool(flag)
         
         # Add temperature (not processed by autoencoder)
         results['temperature'] = not (self.config['normal_ranges']['temperature'][0] <= 
@@ -271,27 +349,22 @@ class AutoencoderAnomalyDetector:
                                      self.config['normal_ranges']['temperature'][1])
         
         # Add scores for more detailed analysis
+        index = self._feature_index
         results['scores'] = {
-            'heart_rate': float(feature_scores[self.config['feature_columns'].index('heart_rate')]),
+            'heart_rate': float(feature_scores[index['heart_rate']]),
             'blood_pressure': max(
-                float(feature_scores[self.config['feature_columns'].index('blood_pressure_systolic')]),
-                float(feature_scores[self.config['feature_columns'].index('blood_pressure_diastolic')])
+                float(feature_scores[index['blood_pressure_systolic']]),
+                float(feature_scores[index['blood_pressure_diastolic']])
             ),
-            'respiratory_rate': float(feature_scores[self.config['feature_columns'].index('respiratory_rate')]),
-            'oxygen_saturation': float(feature_scores[self.config['feature_columns'].index('oxygen_saturation')]),
+            'respiratory_rate': float(feature_scores[index['respiratory_rate']]),
+            'oxygen_saturation': float(feature_scores[index['oxygen_saturation']]),
             'temperature': 0.0,  # Not processed by autoencoder
             'overall': float(detection_results['anomaly_score'][0])
         }
         
         # Add reconstruction data for visualization
         reconstructed_features = self.autoencoder.reconstruct(features)[0]
-        results['reconstruction'] = {
-            'heart_rate': float(reconstructed_features[self.config['feature_columns'].index('heart_rate')]),
-            'blood_pressure_systolic': float(reconstructed_features[self.config['feature_columns'].index('blood_pressure_systolic')]),
-            'blood_pressure_diastolic': float(reconstructed_features[self.config['feature_columns'].index('blood_pressure_diastolic')]),
-            'respiratory_rate': float(reconstructed_features[self.config['feature_columns'].index('respiratory_rate')]),
-            'oxygen_saturation': float(reconstructed_features[self.config['feature_columns'].index('oxygen_saturation')])
-        }
+        results['reconstruction'] = dict(zip(self.config['feature_columns'], reconstructed_features.tolist()))
         
         return results
     
@@ -314,6 +387,21 @@ class AutoencoderAnomalyDetector:
         # Get latent representation
         return self.autoencoder.encode(features)[0]
     
+    def get_latent_history(self, history):
+        """
+        Get latent space representations of a whole history in one batch.
+        
+        Args:
+            history (dict): Dictionary with patient history data
+            
+        Returns:
+            numpy.ndarray: Latent vectors with shape (samples, latent_dim)
+        """
+        if not self.model_trained:
+            return None
+            
+        return self.autoencoder.encode(self._prepare_training_data(history))
+    
     def visualize_current_data(self, current_data):
         """
         Create visualization of current data vs. reconstruction.
@@ -333,12 +421,13 @@ class AutoencoderAnomalyDetector:
         # Visualize
         return self.autoencoder.visualize_reconstructions(features)
     
-    def explain_anomalies(self, current_data):
+    def explain_anomalies(self, current_data, patient_id='default'):
         """
         Generate human-readable explanation of detected anomalies.
         
         Args:
             current_data (dict): Dictionary with current vital signs
+            patient_id (str): Patient whose adaptive thresholds are used
             
         Returns:
             dict: Explanation of anomalies
@@ -347,7 +436,7 @@ class AutoencoderAnomalyDetector:
             return None
             
         # Get anomaly detection results
-        results = self._detect_with_autoencoder(current_data)
+        results = self._detect_with_autoencoder(current_data, patient_id)
         
         # Initialize explanation
         explanation = {
@@ -0,0 +1,296 @@
+import numpy as np
+from collections import deque
+
+class BeatMorphologyClassifier:
+    """
+    Beat morphology classification for one continuous ECG stream.
+
+    Beats come from StreamingQRSDetector with their raw waveform around the
+    R peak. Similar beats are grouped into template clusters, and each cluster's
+    template is the running median of its latest beats. The cluster that has
+    matched most beats recently is the patient's dominant (normal) morphology.
+
+    All beats of a chunk are matched to all templates at once. The beats and
+    templates are normalized, and their cross-correlations over small lags are
+    computed with one batched FFT, so a beat can be a few samples off the
+    template's alignment. A beat is then flagged as:
+
+    - premature: its RR interval is short against the median recent RR
+    - wide: its QRS complex is wider than wide_qrs
+    - abnormal: it correlates poorly with the dominant template
+
+    A premature beat that is wide or abnormal is labelled 'pvc'. Otherwise a
+    premature beat is 'premature' and a wide or abnormal beat is 'aberrant'.
+    """
+
+    def __init__(self, sampling_rate=125, config=None):
+        """
+        Initialize the classifier.
+
+        Args:
+            sampling_rate (int): ECG sampling rate in Hz
+            config (dict, optional): Configuration parameters (times in seconds):
+                - beat_window: Waveform window relative to the R peak (as in the detector)
+                - template_beats: Latest beats per cluster whose median is its template
+                - max_clusters: Template clusters kept; the least used is replaced
+                - match_threshold: Correlation for a beat to join a cluster
+                - abnormal_threshold: Correlation with the dominant template below which a beat is abnormal
+                - max_lag: Largest alignment shift tried in the cross-correlation
+                - learning_beats: Beats of the dominant cluster before morphology is judged
+                - cluster_decay: Per-beat decay of cluster usage, which picks the dominant cluster
+                - premature_ratio: RR below this fraction of the reference RR is premature
+                - rr_reference_beats: Recent RR intervals whose median is the reference RR
+                - wide_qrs: QRS width above which a beat is wide
+                - qrs_fraction: Fraction of the R amplitude that bounds the QRS
+        """
+        self.sampling_rate = sampling_rate
+
+        # Default configuration
+        self.config = {
+            'beat_window': (-0.2, 0.2),
+            'template_beats': 16,
+            'max_clusters': 8,
+            'match_threshold': 0.9,
+            'abnormal_threshold': 0.8,
+            'max_lag': 0.04,
+            'learning_beats': 8,
+            'cluster_decay': 0.99,
+            'premature_ratio': 0.85,
+            'rr_reference_beats': 9,
+            'wide_qrs': 0.12,
+            'qrs_fraction': 0.3,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        window = self.config['beat_window']
+        self._r_index = -int(round(window[0] * sampling_rate))
+        self._length = int(round(window[1] * sampling_rate)) + self._r_index
+        # Zero padding to twice the beat makes the FFT correlation linear, not circular
+        self._fft_size = 1 << int(np.ceil(np.log2(2 * self._length)))
+        max_lag = int(round(self.config['max_lag'] * sampling_rate))
+        self._lags = np.concatenate((np.arange(max_lag + 1), np.arange(-max_lag, 0)))
+        self._lag_index = self._lags % self._fft_size
+
+        self.reset()
+
+    def reset(self):
+        """Forget all templates and RR history."""
+        self.clusters = []
+        self.weights = np.zeros(0)
+        self._next_cluster_id = 0
+        self._recent_rr = deque(maxlen=self.config['rr_reference_beats'])
+
+    @property
+    def dominant(self):
+        """The cluster of the dominant morphology, or None before it is learned."""
+        if not self.clusters:
+            return None
+        cluster = self.clusters[int(np.argmax(self.weights))]
+        return cluster if cluster['count'] >= self.config['learning_beats'] else None
+
+    def classify(self, beats):
+        """
+        Classify a chunk of beats and update the templates.
+
+        Args:
+            beats (list): Beats in time order from StreamingQRSDetector.process
+
+        Returns:
+            list: The same beats, each with 'morphology' ('normal', 'pvc',
+                  'premature' or 'aberrant'; None without a waveform),
+                  'correlation' (with the dominant template), 'qrs_width'
+                  (seconds), 'premature', 'wide', 'abnormal' and 'template'
+                  (cluster id)
+        """
+        valid = [beat for beat in beats
+                 if beat.get('waveform') is not None and len(beat['waveform']) == self._length]
+        for beat in beats:
+            beat.update({'morphology': None, 'correlation': None, 'qrs_width': None,
+                         'premature': False, 'wide': False, 'abnormal': False, 'template': None})
+        if not valid:
+            return beats
+
+        waveforms = np.array([beat['waveform'] for beat in valid])
+        baselines = np.array([beat['baseline'] if beat.get('baseline') is not None else np.nan for beat in valid])
+        missing = np.isnan(baselines)
+        if missing.any():
+            baselines[missing] = np.median(waveforms[missing], axis=1)
+        centered = waveforms - baselines[:, None]
+        widths = self._qrs_widths(centered)
+        normalized = self._normalize(centered)
+
+        # Correlation of every beat with every current template in one batch
+        dominant = self.dominant
+        dominant_index = int(np.argmax(self.weights)) if dominant is not None else None
+        if self.clusters:
+            spectra = np.fft.rfft(normalized, self._fft_size, axis=1)
+            templates = np.array([cluster['spectrum'] for cluster in self.clusters])
+            correlations, lags = self._correlate(spectra, templates)
+        else:
+            correlations = lags = np.zeros((len(valid), 0))
+        if dominant is not None:
+            dominant_correlations = correlations[:, dominant_index].copy()
+
+        wide_qrs = self.config['wide_qrs']
+        created = []
+        touched = set()
+        for i, beat in enumerate(valid):
+            # Template matching: the best cluster of those at chunk start, else one made in this chunk
+            cluster, lag, correlation = None, 0, -1.0
+            if correlations.shape[1]:
+                best = int(np.argmax(correlations[i]))
+                if correlations[i, best] > correlation:
+                    cluster, lag, correlation = self.clusters[best], int(lags[i, best]), correlations[i, best]
+            for new_cluster in created:
+                if self._index(new_cluster) is None:
+                    continue
+                new_correlation, new_lag = self._correlate_one(normalized[i], new_cluster)
+                if new_correlation > correlation:
+                    cluster, lag, correlation = new_cluster, new_lag, new_correlation
+
+            if cluster is None or correlation < self.config['match_threshold']:
+                cluster, index = self._new_cluster()
+                if index < correlations.shape[1]:
+                    # The replaced cluster's correlations no longer apply
+                    correlations[:, index] = -np.inf
+                created.append(cluster)
+                lag = 0
+            self._add_to_cluster(cluster, np.roll(centered[i], -lag))
+            touched.add(cluster['id'])
+
+            self.weights *= self.config['cluster_decay']
+            self.weights[self._index(cluster)] += 1
+
+            beat['template'] = cluster['id']
+            beat['qrs_width'] = float(widths[i])
+            beat['wide'] = bool(widths[i] > wide_qrs)
+            if dominant is not None:
+                beat['correlation'] = float(dominant_correlations[i])
+                beat['abnormal'] = bool(beat['correlation'] < self.config['abnormal_threshold'])
+
+            # The median ignores the occasional ectopic beat and its pause
+            rr = beat.get('rr')
+            if rr is not None:
+                if self._recent_rr:
+                    reference = np.median(self._recent_rr)
+                    beat['premature'] = bool(rr < self.config['premature_ratio'] * reference)
+                self._recent_rr.append(rr)
+
+            if beat['premature'] and (beat['wide'] or beat['abnormal']):
+                beat['morphology'] = 'pvc'
+            elif beat['premature']:
+                beat['morphology'] = 'premature'
+            elif beat['wide'] or beat['abnormal']:
+                beat['morphology'] = 'aberrant'
+            else:
+                beat['morphology'] = 'normal'
+
+        # Templates only change once per chunk
+        for cluster in self.clusters:
+            if cluster['id'] in touched:
+                self._update_template(cluster)
+        return beats
+
+    def _index(self, cluster):
+        """Position of a cluster in self.clusters, or None once it has been replaced."""
+        for index, candidate in enumerate(self.clusters):
+            if candidate is cluster:
+                return index
+        return None
+
+    def _normalize(self, beats):
+        """Zero-mean, unit-norm rows, so correlations are in [-1, 1]."""
+        beats = beats - beats.mean(axis=-1, keepdims=True)
+        norms = np.linalg.norm(beats, axis=-1, keepdims=True)
+        return beats / np.where(norms > 0, norms, 1.0)
+
+    def _correlate(self, spectra, templates):
+        """
+        Best normalized cross-correlation of beats against templates over the allowed lags.
+
+        Args:
+            spectra (numpy.ndarray): rfft of the normalized beats [beats, frequencies]
+            templates (numpy.ndarray): rfft of the normalized templates [templates, frequencies]
+
+        Returns:
+            tuple: (correlations, lags), each [beats, templates]
+        """
+        products = spectra[:, None, :] * np.conj(templates)[None, :, :]
+        correlations = np.fft.irfft(products, self._fft_size, axis=-1)[..., self._lag_index]
+        best = np.argmax(correlations, axis=-1)
+        return np.take_along_axis(correlations, best[..., None], axis=-1)[..., 0], self._lags[best]
+
+    def _correlate_one(self, normalized, cluster):
+        """Best correlation and lag of one normalized beat against one cluster."""
+        spectrum = np.fft.rfft(normalized, self._fft_size)
+        correlations, lags = self._correlate(spectrum[None], cluster['spectrum'][None])
+        return correlations[0, 0], int(lags[0, 0])
+
+    def _qrs_widths(self, centered):
+        """
+        QRS width of each beat in seconds.
+
+        The QRS is the run of samples around the R peak whose deflection from
+        the baseline stays above qrs_fraction of the R amplitude.
+        """
+        amplitude = np.abs(centered[:, self._r_index])
+        above = np.abs(centered) >= self.config['qrs_fraction'] * amplitude[:, None]
+        # Run lengths on each side of the R peak: products stay 1 until the first gap
+        right = np.cumprod(above[:, self._r_index:], axis=1).sum(axis=1)
+        left = np.cumprod(above[:, self._r_index::-1], axis=1).sum(axis=1)
+        return (left + right - 1) / self.sampling_rate
+
+    def _new_cluster(self):
+        """Start a cluster, replacing the least used one when all slots are taken; returns it and its index."""
+        cluster = {
+            'id': self._next_cluster_id,
+            'beats': np.zeros((self.config['template_beats'], self._length)),
+            'count': 0,
+            'position': 0,
+            'template': None,
+            'spectrum': None
+        }
+        self._next_cluster_id += 1
+
+        if len(self.clusters) >= self.config['max_clusters']:
+            replaced = int(np.argmin(self.weights))
+            self.clusters[replaced] = cluster
+            self.weights[replaced] = 0.0
+            return cluster, replaced
+
+        self.clusters.append(cluster)
+        self.weights = np.append(self.weights, 0.0)
+        return cluster, len(self.clusters) - 1
+
+    def _add_to_cluster(self, cluster, beat):
+        """Store a beat in the cluster's ring of latest beats."""
+        cluster['beats'][cluster['position']] = beat
+        cluster['position'] = (cluster['position'] + 1) % len(cluster['beats'])
+        cluster['count'] += 1
+        if cluster['template'] is None:
+            self._update_template(cluster)
+
+    def _update_template(self, cluster):
+        """Recompute the median template of a cluster and its spectrum."""
+        stored = min(cluster['count'], len(cluster['beats']))
+        cluster['template'] = np.median(cluster['beats'][:stored], axis=0)
+        cluster['spectrum'] = np.fft.rfft(self._normalize(cluster['template']), self._fft_size)
+
+    def templates(self):
+        """
+        Current templates, dominant first.
+
+        Returns:
+            list: Dicts with 'id', 'beats' (matched so far), 'weight' and
+                  'template' (baseline-subtracted median waveform)
+        """
+        order = np.argsort(-self.weights)
+        return [{
+            'id': self.clusters[i]['id'],
+            'beats': self.clusters[i]['count'],
+            'weight': float(self.weights[i]),
+            'template': self.clusters[i]['template']
+        } for i in order]
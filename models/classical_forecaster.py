@@ -0,0 +1,161 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+class ClassicalForecaster:
+    """
+    Vectorized statistical forecaster for vital signs.
+
+    Every (patient, vital) pair is treated as an independent series and all
+    series are fitted and forecast together with array operations, so the
+    cost grows with the number of readings rather than with Python loops
+    over patients. Two methods are available:
+
+    - 'holt': damped-trend exponential smoothing. Smoothing parameters are
+      chosen per series from a small grid by one-step-ahead squared error.
+    - 'ar': ridge-regularised autoregression on the standardized changes
+      between readings, forecast recursively. Strong regularisation tends
+      to the last-value forecast.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the forecaster.
+
+        Args:
+            config (dict, optional): Configuration parameters:
+                - method: 'holt' or 'ar'
+                - prediction_horizon: Number of time steps to forecast
+                - context_length: Number of most recent readings used per series
+                - damping: Trend damping factor phi for 'holt'
+                - alpha_grid: Candidate level smoothing factors for 'holt'
+                - beta_grid: Candidate trend smoothing factors for 'holt'
+                - ar_order: Number of lags for 'ar'
+                - ridge: L2 penalty for 'ar', in units of the standardized changes
+        """
+        # Default configuration
+        self.config = {
+            'method': 'holt',
+            'prediction_horizon': 12,
+            'context_length': 96,
+            'damping': 0.9,
+            'alpha_grid': [0.1, 0.3, 0.5, 0.7, 0.9],
+            'beta_grid': [0.01, 0.05, 0.1, 0.3],
+            'ar_order': 6,
+            'ridge': 10.0,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        if self.config['method'] not in ('holt', 'ar'):
+            raise ValueError(f"Unknown forecasting method: {self.config['method']}")
+
+        alphas, betas = np.meshgrid(self.config['alpha_grid'], self.config['beta_grid'], indexing='ij')
+        self._alphas = alphas.reshape(-1, 1)
+        self._betas = betas.reshape(-1, 1)
+
+    def history_array(self, histories, feature_columns):
+        """
+        Stack the recent history of many patients into one array.
+
+        Patients with fewer than context_length readings are padded at the
+        front with their first reading.
+
+        Args:
+            histories (list): Patient history dictionaries
+            feature_columns (list): History keys to forecast
+
+        Returns:
+            numpy.ndarray: Array with shape (patients, context_length, features)
+        """
+        context_length = self.config['context_length']
+        series = np.empty((len(histories), context_length, len(feature_columns)))
+        for p, history in enumerate(histories):
+            recent = np.column_stack([history[feature][-context_length:] for feature in feature_columns])
+            pad = context_length - len(recent)
+            series[p, pad:] = recent
+            series[p, :pad] = recent[0]
+        return series
+
+    def forecast(self, series):
+        """
+        Forecast every series in a batch.
+
+        Args:
+            series (numpy.ndarray): History with shape (patients, time, features)
+
+        Returns:
+            numpy.ndarray: Forecasts with shape (patients, prediction_horizon, features)
+        """
+        series = np.asarray(series, dtype=float)
+        n_patients, n_steps, n_features = series.shape
+
+        # One column per (patient, feature) series
+        y = series.transpose(1, 0, 2).reshape(n_steps, -1)
+
+        if self.config['method'] == 'holt':
+            forecasts = self._holt(y)
+        else:
+            forecasts = self._ar(y)
+
+        return forecasts.reshape(-1, n_patients, n_features).transpose(1, 0, 2)
+
+    def _holt(self, y):
+        """Damped-trend Holt smoothing for series in the columns of y."""
+        phi = self.config['damping']
+        alphas, betas = self._alphas, self._betas
+        n_series = y.shape[1]
+
+        # Evaluate every grid point for every series at once: shape (grid, series)
+        level = np.repeat(y[:1], len(alphas), axis=0)
+        trend = np.zeros_like(level)
+        sse = np.zeros_like(level)
+
+        for t in range(1, len(y)):
+            predicted = level + phi * trend
+            error = y[t] - predicted
+            sse += error ** 2
+            new_level = predicted + alphas * error
+            trend = betas * (new_level - level) + (1 - betas) * phi * trend
+            level = new_level
+
+        best = np.argmin(sse, axis=0)
+        columns = np.arange(n_series)
+        level, trend = level[best, columns], trend[best, columns]
+
+        # Sum of phi^k for k = 1..h
+        steps = np.cumsum(phi ** np.arange(1, self.config['prediction_horizon'] + 1))
+        return level + steps[:, None] * trend
+
+    def _ar(self, y):
+        """Ridge autoregression on the differenced series in the columns of y."""
+        order = self.config['ar_order']
+
+        # Model the changes between readings, standardized per series so one
+        # penalty suits every vital's scale. The penalty shrinks the weights
+        # towards zero change, i.e. towards repeating the last reading.
+        changes = np.diff(y, axis=0)
+        scale = changes.std(axis=0)
+        scale[scale == 0] = 1.0
+        z = changes / scale
+
+        # windows[n, s] = z[n:n + order + 1, s]; last entry is the target
+        windows = sliding_window_view(z, order + 1, axis=0)
+        lags, targets = windows[..., :-1], windows[..., -1]
+
+        # Per-series normal equations, solved as one batch
+        gram = np.einsum('nsp,nsq->spq', lags, lags) + self.config['ridge'] * np.eye(order)
+        rhs = np.einsum('nsp,ns->sp', lags, targets)
+        weights = np.linalg.solve(gram, rhs[..., None])[..., 0]
+
+        recent = z[-order:].T.copy()
+        forecasts = np.empty((self.config['prediction_horizon'], y.shape[1]))
+        for h in range(self.config['prediction_horizon']):
+            next_value = np.einsum('sp,sp->s', recent, weights)
+            forecasts[h] = next_value
+            recent[:, :-1] = recent[:, 1:]
+            recent[:, -1] = next_value
+
+        # Forecast changes accumulate from the last reading
+        return y[-1] + np.cumsum(forecasts * scale, axis=0)
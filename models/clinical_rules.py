@@ -0,0 +1,613 @@
+import os
+import copy
+import json
+import threading
+import numpy as np
+
+# Vital sign features the rules are written against
+FEATURES = ['heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+            'respiratory_rate', 'oxygen_saturation', 'temperature']
+
+# Default rule table. Tier tables map each feature to tiers checked in order;
+# the first tier whose 'above' or 'below' bound is crossed applies, giving its
+# score and (optionally) its message, where {value} is the feature's value and
+# any other feature can be referenced by name.
+DEFAULT_RULES = {
+    # Normal ranges, also the alert thresholds shown in the settings
+    'normal_ranges': {
+        'heart_rate': {'min': 60, 'max': 100},
+        'blood_pressure_systolic': {'min': 90, 'max': 140},
+        'blood_pressure_diastolic': {'min': 60, 'max': 90},
+        'respiratory_rate': {'min': 12, 'max': 20},
+        'oxygen_saturation': {'min': 95},
+        'temperature': {'min': 97, 'max': 99}
+    },
+    'tiers': {
+        # Component risk on a 0-1 scale (RiskCalculator)
+        'severity': {
+            'heart_rate': [
+                {'above': 150, 'below': 40, 'score': 1.0},
+                {'above': 120, 'below': 50, 'score': 0.7},
+                {'above': 100, 'below': 60, 'score': 0.3}
+            ],
+            'blood_pressure_systolic': [
+                {'above': 180, 'below': 80, 'score': 1.0},
+                {'above': 160, 'below': 90, 'score': 0.7},
+                {'above': 140, 'below': 100, 'score': 0.3}
+            ],
+            'blood_pressure_diastolic': [
+                {'above': 120, 'below': 40, 'score': 1.0},
+                {'above': 100, 'below': 50, 'score': 0.7},
+                {'above': 90, 'below': 60, 'score': 0.3}
+            ],
+            'respiratory_rate': [
+                {'above': 30, 'below': 8, 'score': 1.0},
+                {'above': 24, 'below': 10, 'score': 0.7},
+                {'above': 20, 'below': 12, 'score': 0.3}
+            ],
+            'oxygen_saturation': [
+                {'below': 85, 'score': 1.0},
+                {'below': 90, 'score': 0.8},
+                {'below': 92, 'score': 0.6},
+                {'below': 95, 'score': 0.3}
+            ],
+            'temperature': [
+                {'above': 103, 'below': 94, 'score': 1.0},
+                {'above': 101, 'below': 95, 'score': 0.7},
+                {'above': 99.5, 'below': 97, 'score': 0.3}
+            ]
+        },
+        # Risk factors reported for severe components (RiskCalculator)
+        'severe_factors': {
+            'heart_rate': [
+                {'above': 120, 'message': "Elevated heart rate: {value} BPM"},
+                {'below': 50, 'message': "Low heart rate: {value} BPM"}
+            ],
+            'blood_pressure_systolic': [
+                {'above': 160, 'message': "Elevated systolic pressure: {value} mmHg"},
+                {'below': 90, 'message': "Low systolic pressure: {value} mmHg"}
+            ],
+            'blood_pressure_diastolic': [
+                {'above': 100, 'message': "Elevated diastolic pressure: {value} mmHg"},
+                {'below': 50, 'message': "Low diastolic pressure: {value} mmHg"}
+            ],
+            'respiratory_rate': [
+                {'above': 24, 'message': "Elevated respiratory rate: {value} breaths/min"},
+                {'below': 10, 'message': "Low respiratory rate: {value} breaths/min"}
+            ],
+            'oxygen_saturation': [
+                {'below': 92, 'message': "Low oxygen saturation: {value}%"}
+            ],
+            'temperature': [
+                {'above': 101, 'message': "Elevated temperature: {value}°F"},
+                {'below': 95, 'message': "Low temperature: {value}°F"}
+            ]
+        },
+        # Additive risk of the vital signs simulator
+        'simulator': {
+            'heart_rate': [
+                {'above': 120, 'score': 0.15, 'message': "Elevated heart rate: {value} BPM"},
+                {'above': 100, 'score': 0.1},
+                {'below': 50, 'score': 0.15, 'message': "Low heart rate: {value} BPM"}
+            ],
+            'blood_pressure_systolic': [
+                {'above': 180, 'score': 0.2,
+                 'message': "Hypertensive crisis: {value}/{blood_pressure_diastolic} mmHg"},
+                {'above': 140, 'score': 0.1},
+                {'below': 90, 'score': 0.2, 'message': "Hypotension: {value}/{blood_pressure_diastolic} mmHg"}
+            ],
+            'respiratory_rate': [
+                {'above': 24, 'score': 0.15, 'message': "Tachypnea: {value} breaths/min"},
+                {'below': 10, 'score': 0.2, 'message': "Bradypnea: {value} breaths/min"}
+            ],
+            'oxygen_saturation': [
+                {'below': 90, 'score': 0.3, 'message': "Severe hypoxemia: {value}% O₂ saturation"},
+                {'below': 94, 'score': 0.15, 'message': "Hypoxemia: {value}% O₂ saturation"}
+            ],
+            'temperature': [
+                {'above': 102, 'score': 0.15, 'message': "High fever: {value}°F"},
+                {'above': 100.4, 'score': 0.1, 'message': "Fever: {value}°F"},
+                {'below': 96, 'score': 0.15, 'message': "Hypothermia: {value}°F"}
+            ]
+        },
+        # Decision path of the explainable AI view; scores are risk contributions
+        'decision_path': {
+            'oxygen_saturation': [
+                {'below': 90, 'score': 0.3, 'severe': True, 'name': 'Severe Hypoxemia',
+                 'description': 'Oxygen saturation severely decreased'},
+                {'below': 95, 'score': 0.2, 'name': 'Mild Hypoxemia',
+                 'description': 'Oxygen saturation mildly decreased'}
+            ],
+            'heart_rate': [
+                {'above': 120, 'score': 0.25, 'severe': True, 'name': 'Tachycardia',
+                 'description': 'Heart rate severely elevated'},
+                {'below': 50, 'score': 0.25, 'severe': True, 'name': 'Bradycardia',
+                 'description': 'Heart rate severely decreased'},
+                {'above': 100, 'score': 0.15, 'name': 'Mild Tachycardia',
+                 'description': 'Heart rate mildly elevated'},
+                {'below': 60, 'score': 0.15, 'name': 'Mild Bradycardia',
+                 'description': 'Heart rate mildly decreased'}
+            ]
+        }
+    },
+    # Risk history: groups added in order; a group counts when any of its
+    # features is outside its normal range, as weight * the largest
+    # min(1, |value - center| / scale) of its features
+    'ramps': {
+        'history': [
+            {'weight': 0.2, 'features': {'heart_rate': {'center': 80, 'scale': 40}}},
+            {'weight': 0.2, 'features': {'blood_pressure_systolic': {'center': 120, 'scale': 50},
+                                         'blood_pressure_diastolic': {'center': 80, 'scale': 30}}},
+            {'weight': 0.3, 'features': {'oxygen_saturation': {'center': 95, 'scale': 10}}},
+            {'weight': 0.2, 'features': {'respiratory_rate': {'center': 16, 'scale': 8}}}
+        ]
+    }
+}
+
+# Alert threshold names used by the settings API
+ALERT_THRESHOLD_KEYS = {
+    'heartRate': {'min': ('heart_rate', 'min'), 'max': ('heart_rate', 'max')},
+    'bloodPressure': {
+        'systolicMin': ('blood_pressure_systolic', 'min'), 'systolicMax': ('blood_pressure_systolic', 'max'),
+        'diastolicMin': ('blood_pressure_diastolic', 'min'), 'diastolicMax': ('blood_pressure_diastolic', 'max')
+    },
+    'oxygenSaturation': {'min': ('oxygen_saturation', 'min'), 'max': ('oxygen_saturation', 'max')},
+    'respiratoryRate': {'min': ('respiratory_rate', 'min'), 'max': ('respiratory_rate', 'max')},
+    'temperature': {'min': ('temperature', 'min'), 'max': ('temperature', 'max')}
+}
+
+
+# Features each tier table must cover (its callers read all of them), and
+# the bounds a feature must have somewhere in the table: RiskCalculator takes
+# its prediction-trend limits from the severe factor tiers
+REQUIRED_TIER_FEATURES = {name: list(table) for name, table in DEFAULT_RULES['tiers'].items()}
+REQUIRED_TIER_BOUNDS = {
+    'severe_factors': {'heart_rate': ['above', 'below'], 'oxygen_saturation': ['below']}
+}
+
+# Tier fields that decision path tiers must name
+DECISION_PATH_FIELDS = ['name', 'description']
+
+
+def _is_number(value):
+    """Whether a rule value is a plain number (bool is not)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ClinicalRuleEngine:
+    """
+    Shared table of clinical threshold rules, compiled for array evaluation.
+
+    The rule table (see DEFAULT_RULES) is declarative: normal ranges, ordered
+    threshold tiers per feature and ramp groups. Each tier table is compiled
+    into (features, tiers) bound and score matrices, so it is evaluated for a
+    whole ward or history window in one broadcast comparison. Tables can be
+    overridden from a JSON file and updated at runtime, which recompiles
+    them and swaps the compiled form in for every caller at once.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the engine.
+
+        Args:
+            config (dict, optional): Configuration parameters:
+                - rules_path: JSON file with rule overrides, written by update
+        """
+        # Default configuration
+        self.config = {
+            'rules_path': 'config/clinical_rules.json',
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self._lock = threading.Lock()
+        self.version = 0  # Incremented whenever the rules change, for caches of rule results
+        self.rules = copy.deepcopy(DEFAULT_RULES)
+        self._compiled = self._compile(self.rules)
+        self.reload()
+
+    def reload(self):
+        """
+        Load the rules from rules_path (defaults overridden by the file).
+
+        Returns:
+            bool: Whether the file was loaded; otherwise the current rules are kept
+        """
+        path = self.config['rules_path']
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rules = self._merge(DEFAULT_RULES, json.load(f))
+            compiled = self._compile(rules)
+        except (OSError, AttributeError, KeyError, TypeError, ValueError) as e:
+            print(f"Error loading clinical rules: {e}. Keeping the current rules.")
+            return False
+        with self._lock:
+            self.rules, self._compiled = rules, compiled
+            self.version += 1
+        print(f"Loaded clinical rules from {path}")
+        return True
+
+    @staticmethod
+    def _merge(rules, overrides):
+        """
+        Rules with overrides applied per feature.
+
+        Normal ranges and the features of a tier table are replaced one at a
+        time, so overriding one feature keeps the others; ramp tables are
+        replaced whole.
+        """
+        merged = copy.deepcopy(rules)
+        if not isinstance(overrides, dict):
+            raise ValueError("Rule overrides must be an object")
+        for section, tables in overrides.items():
+            if section not in merged:
+                raise ValueError(f"Unknown rule section: {section}")
+            if not isinstance(tables, dict):
+                raise ValueError(f"Rule section {section} must be an object")
+            for name, table in tables.items():
+                if section == 'tiers':
+                    if not isinstance(table, dict):
+                        raise ValueError(f"Tier table {name} must be an object")
+                    merged[section].setdefault(name, {}).update(copy.deepcopy(table))
+                else:
+                    merged[section][name] = copy.deepcopy(table)
+        return merged
+
+    @staticmethod
+    def _validate(rules):
+        """
+        Check a rule table before it is compiled.
+
+        Raises:
+            ValueError: Naming the first problem found
+        """
+        for feature, bounds in rules['normal_ranges'].items():
+            if not isinstance(bounds, dict):
+                raise ValueError(f"Normal range of {feature} must be an object")
+            low, high = bounds.get('min'), bounds.get('max')
+            for bound in (low, high):
+                if bound is not None and not _is_number(bound):
+                    raise ValueError(f"Normal range of {feature} must have numeric bounds")
+            if low is not None and high is not None and low > high:
+                raise ValueError(f"Normal range of {feature} has min {low} above max {high}")
+
+        # Every template is formatted against a sample reading, so a bad
+        # placeholder fails here rather than in a risk calculation
+        sample = {feature: 1.0 for feature in FEATURES}
+        for name, table in rules['tiers'].items():
+            if not isinstance(table, dict):
+                raise ValueError(f"Tier table {name} must be an object")
+            for feature in REQUIRED_TIER_FEATURES.get(name, []):
+                if feature not in table:
+                    raise ValueError(f"Tier table {name} has no tiers for {feature}")
+            for feature, tiers in table.items():
+                if feature not in FEATURES:
+                    raise ValueError(f"Tier table {name} has unknown feature {feature}")
+                if not isinstance(tiers, list) or not tiers:
+                    raise ValueError(f"Tier table {name} has no tiers for {feature}")
+                for tier in tiers:
+                    if not isinstance(tier, dict):
+                        raise ValueError(f"A {name} tier of {feature} must be an object")
+                    if 'above' not in tier and 'below' not in tier:
+                        raise ValueError(f"A {name} tier of {feature} has neither 'above' nor 'below'")
+                    for field in ('above', 'below', 'score'):
+                        if field in tier and not _is_number(tier[field]):
+                            raise ValueError(f"A {name} tier of {feature} has a non-numeric '{field}'")
+                    if 'above' in tier and 'below' in tier and tier['below'] > tier['above']:
+                        raise ValueError(f"A {name} tier of {feature} has 'below' {tier['below']} "
+                                         f"above 'above' {tier['above']}, so it matches every value")
+                    if tier.get('message') is not None:
+                        try:
+                            tier['message'].format(value=sample[feature], **sample)
+                        except (AttributeError, IndexError, KeyError, ValueError) as e:
+                            raise ValueError(f"Invalid message in a {name} tier of {feature}: {e!r}")
+                    if name == 'decision_path':
+                        for field in DECISION_PATH_FIELDS:
+                            if not isinstance(tier.get(field), str):
+                                raise ValueError(f"A decision_path tier of {feature} needs a '{field}'")
+            for feature, bounds in REQUIRED_TIER_BOUNDS.get(name, {}).items():
+                for bound in bounds:
+                    if not any(bound in tier for tier in table[feature]):
+                        raise ValueError(f"Tier table {name} needs a '{bound}' tier for {feature}")
+
+        for name, groups in rules['ramps'].items():
+            if not isinstance(groups, list):
+                raise ValueError(f"Ramp table {name} must be a list")
+            for group in groups:
+                if not isinstance(group, dict) or not _is_number(group.get('weight')):
+                    raise ValueError(f"A group of ramp table {name} needs a numeric 'weight'")
+                if not isinstance(group.get('features'), dict) or not group['features']:
+                    raise ValueError(f"A group of ramp table {name} has no features")
+                for feature, ramp in group['features'].items():
+                    if feature not in FEATURES:
+                        raise ValueError(f"Ramp table {name} has unknown feature {feature}")
+                    if not isinstance(ramp, dict) or not _is_number(ramp.get('center')) \
+                            or not _is_number(ramp.get('scale')) or ramp['scale'] <= 0:
+                        raise ValueError(f"Ramp of {feature} in {name} needs a numeric 'center' "
+                                         f"and a positive 'scale'")
+
+    @staticmethod
+    def _compile(rules):
+        """Compile the rule table into bound and score arrays."""
+        ClinicalRuleEngine._validate(rules)
+        compiled = {'normal_ranges': {}, 'tiers': {}, 'ramps': {}}
+
+        for feature, bounds in rules['normal_ranges'].items():
+            low, high = bounds.get('min'), bounds.get('max')
+            compiled['normal_ranges'][feature] = (
+                -np.inf if low is None else float(low), np.inf if high is None else float(high)
+            )
+
+        # Tier tables become (features, tiers) bound matrices, padded with
+        # tiers that are never crossed, plus a final score-0 column for rows
+        # that cross none
+        for name, table in rules['tiers'].items():
+            width = max(len(tiers) for tiers in table.values())
+            above = np.full((len(table), width), np.inf)
+            below = np.full((len(table), width), -np.inf)
+            scores = np.zeros((len(table), width + 1))
+            has_message = np.zeros((len(table), width + 1), dtype=bool)
+            for i, tiers in enumerate(table.values()):
+                above[i, :len(tiers)] = [tier.get('above', np.inf) for tier in tiers]
+                below[i, :len(tiers)] = [tier.get('below', -np.inf) for tier in tiers]
+                scores[i, :len(tiers)] = [tier.get('score', 0.0) for tier in tiers]
+                has_message[i, :len(tiers)] = [tier.get('message') is not None for tier in tiers]
+
+            compiled['tiers'][name] = {
+                'features': list(table),
+                'index': {feature: i for i, feature in enumerate(table)},
+                'above': above[:, :, None],
+                'below': below[:, :, None],
+                'scores': scores,
+                'has_message': has_message,
+                'width': width,
+                'tiers': table,
+                # Plain bounds for single readings, where array overhead dominates
+                'bounds': {
+                    feature: [(tier.get('above', np.inf), tier.get('below', -np.inf), tier.get('score', 0.0))
+                              for tier in tiers]
+                    for feature, tiers in table.items()
+                }
+            }
+
+        for name, groups in rules['ramps'].items():
+            compiled['ramps'][name] = [
+                {
+                    'weight': float(group['weight']),
+                    'features': list(group['features']),
+                    'center': np.array([ramp['center'] for ramp in group['features'].values()], dtype=float),
+                    'scale': np.array([ramp['scale'] for ramp in group['features'].values()], dtype=float)
+                }
+                for group in groups
+            ]
+
+        return compiled
+
+    def update(self, overrides, persist=True):
+        """
+        Override rules per feature and recompile.
+
+        The new rules are validated and, with persist, written to rules_path
+        before they are swapped in, so a rejected or unsaved update leaves the
+        current rules in place.
+
+        Args:
+            overrides (dict): Section -> table name -> overrides, e.g.
+                              {'normal_ranges': {'heart_rate': {'min': 55, 'max': 110}}}
+                              or {'tiers': {'severity': {'heart_rate': [...]}}}
+            persist (bool): Write the resulting rules to rules_path
+
+        Raises:
+            ValueError: If the rules are invalid; the current rules are kept
+        """
+        with self._lock:
+            rules = self._merge(self.rules, overrides)
+            try:
+                compiled = self._compile(rules)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid clinical rules: {e}")
+
+            if persist and self.config['rules_path']:
+                path = self.config['rules_path']
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                # Write a temporary file and rename it, so the rule file is never half-written
+                with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(rules, f, indent=4, ensure_ascii=False)
+                os.replace(path + '.tmp', path)
+
+            self.rules, self._compiled = rules, compiled
+            self.version += 1
+
+    def evaluate(self, table, values):
+        """
+        Evaluate a tier table.
+
+        Args:
+            table (str): Tier table name
+            values (dict): Feature -> value or array of values; features of the
+                           table that are missing are skipped
+
+        Returns:
+            dict: Feature -> {'scores': array, 'tiers': array of the matched
+                  tier index per row, -1 where no tier applies}
+        """
+        compiled = self._compiled['tiers'][table]
+        features = [feature for feature in compiled['features'] if feature in values]
+        if not features:
+            return {}
+        rows = np.array([compiled['index'][feature] for feature in features])
+        x = np.array([np.atleast_1d(np.asarray(values[feature], dtype=float)) for feature in features])
+
+        # One broadcast over (features, tiers, rows); the first crossed tier applies
+        crossed = (x[:, None, :] > compiled['above'][rows]) | (x[:, None, :] < compiled['below'][rows])
+        tiers = np.where(crossed.any(axis=1), np.argmax(crossed, axis=1), compiled['width'])
+        scores = np.take_along_axis(compiled['scores'][rows], tiers, axis=1)
+        tiers = np.where(tiers < compiled['width'], tiers, -1)
+        return {feature: {'scores': scores[i], 'tiers': tiers[i]} for i, feature in enumerate(features)}
+
+    def evaluate_one(self, table, values):
+        """
+        Evaluate a tier table for a single reading, without arrays.
+
+        Args:
+            table (str): Tier table name
+            values (dict): Feature -> value; features of the table that are
+                           missing are skipped
+
+        Returns:
+            dict: Feature -> (score, matched tier index or -1)
+        """
+        results = {}
+        for feature, bounds in self._compiled['tiers'][table]['bounds'].items():
+            if feature not in values:
+                continue
+            value = values[feature]
+            results[feature] = (0.0, -1)
+            for index, (above, below, score) in enumerate(bounds):
+                if value > above or value < below:
+                    results[feature] = (score, index)
+                    break
+        return results
+
+    def message(self, table, feature, tier, values):
+        """Message of a matched tier for a single reading, or None (tier -1 or no message)."""
+        if tier < 0:
+            return None
+        template = self._compiled['tiers'][table]['tiers'][feature][tier].get('message')
+        return None if template is None else template.format(value=values[feature], **values)
+
+    def tiers(self, table, feature):
+        """Tier definitions of a feature in a tier table."""
+        return self._compiled['tiers'][table]['tiers'][feature]
+
+    def messages(self, table, values, evaluation, gates=None):
+        """
+        Risk factor messages of matched tiers, per row in the table's feature order.
+
+        Strings are only formatted for rows where a tier with a message matched.
+
+        Args:
+            table (str): Tier table name
+            values (dict): Feature -> array of values, as passed to evaluate
+            evaluation (dict): Result of evaluate
+            gates (dict, optional): Feature -> boolean array; rows where it is
+                                    False get no message for that feature
+
+        Returns:
+            list: One list of messages per row
+        """
+        n_rows = len(next(iter(evaluation.values()))['tiers']) if evaluation else 0
+        rows = [[] for _ in range(n_rows)]
+        arrays = {feature: np.atleast_1d(np.asarray(value)) for feature, value in values.items()}
+
+        compiled = self._compiled['tiers'][table]
+        for feature, result in evaluation.items():
+            tiers = compiled['tiers'][feature]
+            # Index -1 (no tier) lands on the padding column, which has no message
+            flagged = compiled['has_message'][compiled['index'][feature]][result['tiers']]
+            if gates is not None and feature in gates:
+                flagged &= gates[feature]
+            if not flagged.any():
+                continue
+            for row in np.flatnonzero(flagged):
+                fields = {name: array[row].item() for name, array in arrays.items()}
+                rows[row].append(tiers[result['tiers'][row]]['message'].format(value=fields[feature], **fields))
+        return rows
+
+    def outside_normal(self, values):
+        """
+        Feature -> whether values are outside the normal range.
+
+        Args:
+            values (dict): Feature -> value or array of values (results have
+                           the same shape)
+        """
+        outside = {}
+        for feature, (low, high) in self._compiled['normal_ranges'].items():
+            if feature in values:
+                x = np.asarray(values[feature], dtype=float)
+                outside[feature] = (x < low) | (x > high)
+        return outside
+
+    def normal_range(self, feature):
+        """(low, high) normal range of a feature; open ends are -inf / inf."""
+        return self._compiled['normal_ranges'].get(feature, (-np.inf, np.inf))
+
+    def abnormal_count(self, values):
+        """Number of features outside their normal range (per row for arrays)."""
+        outside = self.outside_normal(values)
+        return np.sum(list(outside.values()), axis=0) if outside else 0
+
+    def ramp_risk(self, name, values):
+        """
+        Total risk of a ramp table (see DEFAULT_RULES['ramps']).
+
+        Args:
+            name (str): Ramp table name
+            values (dict): Feature -> array of values
+
+        Returns:
+            numpy.ndarray: Risk per row
+        """
+        outside = self.outside_normal(values)
+        total = 0
+        for group in self._compiled['ramps'][name]:
+            x = np.array([np.asarray(values[feature], dtype=float) for feature in group['features']])
+            abnormal = np.any([outside.get(feature, False) for feature in group['features']], axis=0)
+            ramp = np.minimum(1, np.abs(x - group['center'][:, None]) / group['scale'][:, None]).max(axis=0)
+            total = total + np.where(abnormal, ramp * group['weight'], 0)
+        return total
+
+    def alert_thresholds(self):
+        """Normal ranges in the settings API format ('alertThresholds')."""
+        ranges = self.rules['normal_ranges']
+        thresholds = {}
+        for group, keys in ALERT_THRESHOLD_KEYS.items():
+            thresholds[group] = {
+                key: ranges[feature][bound] for key, (feature, bound) in keys.items()
+                if ranges.get(feature, {}).get(bound) is not None
+            }
+        return thresholds
+
+    def update_alert_thresholds(self, thresholds, persist=True):
+        """
+        Update normal ranges from the settings API format.
+
+        Args:
+            thresholds (dict): e.g. {'heartRate': {'min': 55, 'max': 110}}
+            persist (bool): Write the rules to rules_path
+
+        Raises:
+            ValueError: For unknown thresholds or non-numeric values
+        """
+        ranges = copy.deepcopy(self.rules['normal_ranges'])
+        for group, values in thresholds.items():
+            if group not in ALERT_THRESHOLD_KEYS or not isinstance(values, dict):
+                raise ValueError(f"Unknown alert threshold group: {group}")
+            for key, value in values.items():
+                if key not in ALERT_THRESHOLD_KEYS[group]:
+                    raise ValueError(f"Unknown alert threshold: {group}.{key}")
+                if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                    raise ValueError(f"Alert threshold {group}.{key} must be a number")
+                feature, bound = ALERT_THRESHOLD_KEYS[group][key]
+                ranges.setdefault(feature, {})[bound] = value
+        self.update({'normal_ranges': ranges}, persist)
+
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+def get_rule_engine():
+    """The rule engine shared by all callers in this process."""
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = ClinicalRuleEngine()
+        return _shared_engine
@@ -282,12 +282,81 @@ class DeepAutoencoder:
         
         return history
     
-    def compute_anomaly_scores(self, data):
+    def train_on_dataset(self, dataset, mean, std, validation_dataset=None, epochs=100, save_path=None):
+        """
+        Train the autoencoder from a stream of batches that does not fit in memory.
+        
+        Args:
+            dataset (tf.data.Dataset): Raw (unstandardized) batches with shape (batch, features),
+                                       e.g. from TrainingCorpus.reading_dataset
+            mean (numpy.ndarray): Per-feature mean of the training data
+            std (numpy.ndarray): Per-feature standard deviation of the training data
+            validation_dataset (tf.data.Dataset, optional): Raw validation batches
+            epochs (int): Number of training epochs
+            save_path (str, optional): Custom path to save the model
+            
+        Returns:
+            History object with training metrics
+        """
+        offset, scale = 0.0, 1.0
+        if self.config['standardize_input']:
+            self.mean = np.asarray(mean, dtype=float)
+            self.std = np.asarray(std, dtype=float)
+            self.std[self.std == 0] = 1  # Avoid division by zero
+            offset, scale = tf.constant(self.mean, tf.float32), tf.constant(self.std, tf.float32)
+        
+        # Standardize inside the pipeline so batches stay lazy
+        def to_pairs(batch):
+            processed = (batch - offset) / scale
+            return processed, processed
+        
+        model_path = save_path if save_path else self.config['model_path']
+        callbacks = [
+            EarlyStopping(patience=10, restore_best_weights=True),
+            ModelCheckpoint(model_path, save_best_only=True)
+        ]
+        
+        history = self.model.fit(
+            dataset.map(to_pairs),
+            epochs=epochs,
+            validation_data=validation_dataset.map(to_pairs) if validation_dataset is not None else None,
+            callbacks=callbacks,
+            verbose=1
+        )
+        
+        # Reconstruction error statistics in one streamed pass
+        count = 0
+        mse_sum = 0.0
+        mse_sum_sq = 0.0
+        feature_sum = np.zeros(self.config['input_dim'])
+        for processed, _ in dataset.map(to_pairs):
+            processed = processed.numpy()
+            squared_error = np.square(processed - self.model.predict_on_batch(processed))
+            mse = np.mean(squared_error, axis=1)
+            count += len(mse)
+            mse_sum += mse.sum()
+            mse_sum_sq += np.square(mse).sum()
+            feature_sum += squared_error.sum(axis=0)
+        
+        # Same thresholds as train(): mean + n*std overall, scaled mean per feature
+        mse_mean = mse_sum / count
+        mse_std = np.sqrt(max(mse_sum_sq / count - mse_mean ** 2, 0))
+        self.threshold = mse_mean + self.config['threshold_multiplier'] * mse_std
+        self.feature_thresholds = feature_sum / count * self.config['threshold_multiplier']
+        
+        # Save the model and threshold
+        self.save(model_path)
+        
+        return history
+    
+    def compute_anomaly_scores(self, data, batch_size=None):
         """
         Compute anomaly scores for input data.
         
         Args:
             data (numpy.ndarray): Input data with shape (samples, features)
+            batch_size (int, optional): Inference batch size; large values
+                speed up scoring of long histories
             
         Returns:
             tuple: (overall_scores, feature_scores)
@@ -298,7 +367,7 @@ class DeepAutoencoder:
         processed_data = self.preprocess_data(data)
         
         # Get reconstructions
-        reconstructions = self.model.predict(processed_data)
+        reconstructions = self.model.predict(processed_data, batch_size=batch_size)
         
         # Calculate reconstruction error (MSE) for each sample
         overall_scores = np.mean(np.square(processed_data - reconstructions), axis=1)
@@ -308,12 +377,15 @@ class DeepAutoencoder:
         
         return overall_scores, feature_scores
     
-    def detect_anomalies(self, data):
+    def detect_anomalies(self, data, threshold=None, feature_thresholds=None):
         """
         Detect anomalies in the input data.
         
         Args:
             data (numpy.ndarray): Input data with shape (samples, features)
+            threshold (float, optional): Overrides the trained overall threshold
+            feature_thresholds (numpy.ndarray, optional): Overrides the trained
+                per-feature thresholds
             
         Returns:
             dict: Detection results with keys:
@@ -322,17 +394,21 @@ class DeepAutoencoder:
                 - feature_scores: Per-feature anomaly scores
                 - anomalous_features: Boolean array indicating anomalous features
         """
-        if self.threshold is None:
+        if threshold is None:
+            threshold = self.threshold
+        if feature_thresholds is None:
+            feature_thresholds = self.feature_thresholds
+        if threshold is None:
             raise ValueError("Model has not been trained or threshold not set")
         
         # Compute anomaly scores
         overall_scores, feature_scores = self.compute_anomaly_scores(data)
         
         # Detect anomalies (overall)
-        is_anomaly = overall_scores > self.threshold
+        is_anomaly = overall_scores > threshold
         
         # Detect anomalous features
-        anomalous_features = feature_scores > self.feature_thresholds
+        anomalous_features = feature_scores > feature_thresholds
         
         return {
             'is_anomaly': is_anomaly,
@@ -0,0 +1,208 @@
+import threading
+from bisect import bisect_left
+
+# Scoring bands: (resolution, inclusive upper bounds, points). A value is
+# rounded to the chart's resolution and gets the points of the first band
+# whose upper bound it does not exceed; values above the last bound get the
+# last points.
+NEWS2_BANDS = {
+    'respiratory_rate': (1, [8, 11, 20, 24], [3, 1, 0, 2, 3]),
+    'oxygen_saturation': (1, [91, 93, 95], [3, 2, 1, 0]),
+    # SpO2 scale 2, for patients with hypercapnic respiratory failure
+    'oxygen_saturation_scale2': (1, [83, 85, 87, 92], [3, 2, 1, 0, 0]),
+    'oxygen_saturation_scale2_on_oxygen': (1, [83, 85, 87, 92, 94, 96], [3, 2, 1, 0, 1, 2, 3]),
+    'blood_pressure_systolic': (1, [90, 100, 110, 219], [3, 2, 1, 0, 3]),
+    'heart_rate': (1, [40, 50, 90, 110, 130], [3, 1, 0, 1, 2, 3]),
+    'temperature': (0.1, [35.0, 36.0, 38.0, 39.0], [3, 1, 0, 1, 2])
+}
+
+MEWS_BANDS = {
+    'blood_pressure_systolic': (1, [70, 80, 100, 199], [3, 2, 1, 0, 2]),
+    'heart_rate': (1, [40, 50, 100, 110, 129], [2, 1, 0, 1, 2, 3]),
+    'respiratory_rate': (1, [8, 14, 20, 29], [2, 0, 1, 2, 3]),
+    'temperature': (0.1, [34.9, 38.4], [2, 0, 2])
+}
+
+# Level of consciousness: Alert, new Confusion, responds to Voice or Pain, Unresponsive
+NEWS2_CONSCIOUSNESS = {'A': 0, 'C': 3, 'V': 3, 'P': 3, 'U': 3}
+MEWS_CONSCIOUSNESS = {'A': 0, 'C': 1, 'V': 1, 'P': 2, 'U': 3}
+
+
+def _compile_bands(bands):
+    """Bands with the upper bounds as integers in units of the resolution."""
+    return {
+        name: (resolution, [int(round(upper / resolution)) for upper in uppers], points)
+        for name, (resolution, uppers, points) in bands.items()
+    }
+
+
+def _band_points(compiled, name, value):
+    """Points of a value in a compiled band table."""
+    resolution, uppers, points = compiled[name]
+    return points[bisect_left(uppers, int(round(value / resolution)))]
+
+
+class EarlyWarningScorer:
+    """
+    Incremental NEWS2 and MEWS early-warning scores per patient.
+
+    Each reading is scored on its own against the published band charts,
+    so an update costs a handful of comparisons whatever the length of the
+    patient's history. The scorer keeps a materialized ward table with every
+    patient's latest scores, so the ward view is read in O(patients) without
+    touching any history. The score history itself is kept by the caller,
+    next to the patient's vitals history.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the scorer.
+
+        Args:
+            config (dict, optional): Configuration parameters:
+                - temperature_unit: 'F' or 'C', the unit of incoming temperatures
+                - spo2_scale: NEWS2 SpO2 scale (1, or 2 for hypercapnic respiratory failure)
+                - default_consciousness: AVPU level assumed when a reading has none
+                - mews_thresholds: (medium, high) MEWS totals of the risk levels
+        """
+        # Default configuration
+        self.config = {
+            'temperature_unit': 'F',
+            'spo2_scale': 1,
+            'default_consciousness': 'A',
+            'mews_thresholds': (3, 5),
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self._news2_bands = _compile_bands(NEWS2_BANDS)
+        self._mews_bands = _compile_bands(MEWS_BANDS)
+
+        self.table = {}
+        self._lock = threading.Lock()
+
+    def score(self, reading):
+        """
+        Score one reading, without changing any state.
+
+        Args:
+            reading (dict): Vital signs with 'heart_rate', 'blood_pressure'
+                            [systolic, diastolic], 'respiratory_rate',
+                            'oxygen_saturation' and 'temperature', and optionally
+                            'consciousness' (A, C, V, P or U) and
+                            'supplemental_oxygen' (bool)
+
+        Returns:
+            dict: 'news2' and 'mews' totals, their risk levels ('news2_risk',
+                  'mews_risk') and per-parameter points ('news2_components',
+                  'mews_components')
+        """
+        temperature = reading['temperature']
+        if self.config['temperature_unit'] == 'F':
+            temperature = (temperature - 32) * 5 / 9
+        systolic = reading['blood_pressure'][0]
+        consciousness = str(reading.get('consciousness') or self.config['default_consciousness']).upper()
+        if consciousness not in NEWS2_CONSCIOUSNESS:
+            raise ValueError(f"Unknown level of consciousness: {consciousness}")
+        on_oxygen = bool(reading.get('supplemental_oxygen', False))
+
+        if self.config['spo2_scale'] == 2:
+            spo2_band = 'oxygen_saturation_scale2_on_oxygen' if on_oxygen else 'oxygen_saturation_scale2'
+        else:
+            spo2_band = 'oxygen_saturation'
+
+        news2 = {
+            'respiratory_rate': _band_points(self._news2_bands, 'respiratory_rate', reading['respiratory_rate']),
+            'oxygen_saturation': _band_points(self._news2_bands, spo2_band, reading['oxygen_saturation']),
+            'supplemental_oxygen': 2 if on_oxygen else 0,
+            'blood_pressure_systolic': _band_points(self._news2_bands, 'blood_pressure_systolic', systolic),
+            'heart_rate': _band_points(self._news2_bands, 'heart_rate', reading['heart_rate']),
+            'consciousness': NEWS2_CONSCIOUSNESS[consciousness],
+            'temperature': _band_points(self._news2_bands, 'temperature', temperature)
+        }
+        mews = {
+            'blood_pressure_systolic': _band_points(self._mews_bands, 'blood_pressure_systolic', systolic),
+            'heart_rate': _band_points(self._mews_bands, 'heart_rate', reading['heart_rate']),
+            'respiratory_rate': _band_points(self._mews_bands, 'respiratory_rate', reading['respiratory_rate']),
+            'temperature': _band_points(self._mews_bands, 'temperature', temperature),
+            'consciousness': MEWS_CONSCIOUSNESS[consciousness]
+        }
+
+        news2_total = sum(news2.values())
+        mews_total = sum(mews.values())
+        return {
+            'news2': news2_total,
+            'news2_risk': self._news2_risk(news2_total, max(news2.values())),
+            'news2_components': news2,
+            'mews': mews_total,
+            'mews_risk': self._mews_risk(mews_total),
+            'mews_components': mews
+        }
+
+    @staticmethod
+    def _news2_risk(total, highest):
+        """NEWS2 clinical risk: a 3 in any single parameter is at least low-medium."""
+        if total >= 7:
+            return 'high'
+        if total >= 5:
+            return 'medium'
+        if highest >= 3:
+            return 'low-medium'
+        return 'low'
+
+    def _mews_risk(self, total):
+        """MEWS risk level from the configured thresholds."""
+        medium, high = self.config['mews_thresholds']
+        if total >= high:
+            return 'high'
+        if total >= medium:
+            return 'medium'
+        return 'low'
+
+    def update(self, patient_id, reading, timestamp=None):
+        """
+        Score a patient's new reading and update the ward table.
+
+        Args:
+            patient_id (str): Patient the reading belongs to
+            reading (dict): Vital signs, as for score
+            timestamp (str, optional): Time of the reading
+
+        Returns:
+            dict: The patient's table row: the scores of score, plus
+                  'patient_id', 'timestamp' and the change of each total
+                  since the previous reading ('news2_change', 'mews_change')
+        """
+        row = self.score(reading)
+        row['patient_id'] = patient_id
+        row['timestamp'] = timestamp
+
+        with self._lock:
+            previous = self.table.get(patient_id)
+            row['news2_change'] = row['news2'] - previous['news2'] if previous else 0
+            row['mews_change'] = row['mews'] - previous['mews'] if previous else 0
+            self.table[patient_id] = row
+        return row
+
+    def current(self, patient_id=None):
+        """
+        Latest scores from the ward table.
+
+        Args:
+            patient_id (str, optional): Only this patient
+
+        Returns:
+            list: Table rows (see update), or the patient's row (None if unknown)
+        """
+        with self._lock:
+            if patient_id is not None:
+                row = self.table.get(patient_id)
+                return dict(row) if row else None
+            return [dict(row) for row in self.table.values()]
+
+    def remove(self, patient_id):
+        """Drop a patient from the ward table (e.g. on discharge)."""
+        with self._lock:
+            self.table.pop(patient_id, None)
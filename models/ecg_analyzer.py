@@ -1,10 +1,52 @@
 import numpy as np
+import threading
+from collections import deque
+from datetime import datetime
 from scipy import signal
 
+from models.qrs_detector import StreamingQRSDetector
+from models.hrv_analyzer import HRVAnalyzer
+from models.beat_classifier import BeatMorphologyClassifier
+from utils.ecg_filtering import ECGFilterBank
+
+
+def _clock_seconds(timestamp):
+    """Epoch seconds of a datetime, a "%Y-%m-%d %H:%M:%S" string or a number."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return float(timestamp)
+
+
 class ECGAnalyzer:
     """Analyze ECG patterns to detect cardiac abnormalities"""
     
-    def __init__(self):
+    def __init__(self, config=None):
+        """
+        Initialize the analyzer.
+        
+        Args:
+            config (dict, optional): Configuration parameters:
+                - input_rate: Default sampling rate of incoming ECG in Hz; other
+                  rates and multi-lead input are filtered and resampled to the
+                  125 Hz analysis rate (see ECGFilterBank)
+                - detection_lead: Lead used for beat detection in multi-lead input
+                - stream_window_seconds: Recent beats used by analyze_stream
+                - filtering: ECGFilterBank configuration
+        """
+        # Default configuration
+        self.config = {
+            'input_rate': 125,
+            'detection_lead': 0,
+            'stream_window_seconds': 10,
+            'filtering': None,
+        }
+        
+        # Update config if provided
+        if config:
+            self.config.update(config)
+        
         # Define ECG characteristics to detect
         self.conditions = {
             'normal': 'Normal sinus rhythm',
@@ -17,7 +59,19 @@ class ECGAnalyzer:
         }
         
         # Load feature detection parameters
-        self.sampling_rate = 125  # Hz
+        self.sampling_rate = 125  # Hz, analysis rate
+        
+        # Continuous ECG per patient: filters, QRS detector and recent beats
+        self.stream_window_seconds = self.config['stream_window_seconds']
+        self.streams = {}
+        self._streams_lock = threading.Lock()
+        
+        # Filter designs per input rate; every analysis clones one with fresh state
+        self._filter_banks = {}
+        self._filter_banks_lock = threading.Lock()
+        
+        # Long-window heart rate variability from the streamed beats
+        self.hrv = HRVAnalyzer()
     
     def _detect_r_peaks(self, ecg_data):
         """Detect R peaks in the ECG signal"""
@@ -98,10 +152,33 @@ class ECGAnalyzer:
             'st_deviation': avg_deviation
         }
     
-    def analyze(self, ecg_data):
-        """Analyze ECG data for cardiac abnormalities"""
+    def analyze(self, ecg_data, sampling_rate=None):
+        """
+        Analyze ECG data for cardiac abnormalities.
+        
+        A single lead at the analysis rate is analyzed as is. Multi-lead input
+        and other sampling rates are first filtered and resampled to the
+        analysis rate; beats are detected on the detection lead and the ST
+        segment is measured on every lead.
+        
+        Args:
+            ecg_data (array-like): ECG samples, (samples,) or (leads, samples)
+            sampling_rate (int, optional): Sampling rate in Hz (default: input_rate)
+            
+        Returns:
+            dict: Analysis results; multi-lead results have the ST deviation of
+                  each lead in st_segment['leads']
+        """
+        ecg_data = np.asarray(ecg_data, dtype=float)
+        sampling_rate = sampling_rate or self.config['input_rate']
+        if ecg_data.ndim == 1 and sampling_rate == self.sampling_rate:
+            leads = ecg_data[None]
+        else:
+            ecg_data = np.atleast_2d(ecg_data)
+            leads = self._filter_bank(sampling_rate, len(ecg_data)).process(ecg_data)
+        
         # Detect R peaks
-        r_peaks = self._detect_r_peaks(ecg_data)
+        r_peaks = self._detect_r_peaks(leads[self._detection_lead(len(leads))])
         
         # Calculate heart rate
         heart_rate = self._calculate_heart_rate(r_peaks)
@@ -109,9 +186,348 @@ class ECGAnalyzer:
         # Check for rhythm irregularity
         is_irregular, irregularity_score = self._detect_rhythm_irregularity(r_peaks)
         
-        # Check ST segment
-        st_analysis = self._detect_st_segment(ecg_data, r_peaks)
+        # Check ST segment on every lead; the most deviated lead decides
+        st_by_lead = [self._detect_st_segment(lead, r_peaks) for lead in leads]
+        st_analysis = max(st_by_lead, key=lambda st: abs(st['st_deviation']))
+        
+        results = self._build_results(heart_rate, is_irregular, irregularity_score, st_analysis)
+        if len(leads) > 1:
+            results['st_segment']['leads'] = [st['st_deviation'] for st in st_by_lead]
+        return results
+    
+    def _filter_bank(self, sampling_rate, n_leads):
+        """Stateless filter bank for the input rate, with the designs cached across calls"""
+        key = int(round(sampling_rate))
+        with self._filter_banks_lock:
+            bank = self._filter_banks.get(key)
+            if bank is None:
+                bank = self._filter_banks[key] = ECGFilterBank(key, self.sampling_rate, 1,
+                                                               self.config['filtering'])
+        return bank.clone(n_leads)
+    
+    def _detection_lead(self, n_leads):
+        """Index of the lead used for beat detection"""
+        lead = self.config['detection_lead']
+        return lead if lead < n_leads else 0
+    
+    def analyze_stream(self, patient_id, samples, sampling_rate=None, timestamp=None):
+        """
+        Analyze continuous ECG pushed in chunks.
+        
+        The chunk is filtered and resampled to the analysis rate (all leads at
+        once, see ECGFilterBank) and appended to the patient's stream, whose
+        filters and QRS detector keep their state between calls. Beats are
+        detected on the detection lead, and the ST segment of multi-lead
+        streams is measured on every lead. New beats are
+        classified by morphology against the patient's beat templates. Rate,
+        rhythm, ST and PVC metrics are computed from the beats of the last
+        stream_window_seconds, so beats across chunk edges are counted. Until
+        the stream has two beats, the chunk is analyzed on its own.
+        
+        Strips usually cover only part of the time between readings, so HRV
+        windows are measured in reading time: with a timestamp, the beats of
+        the chunk are placed after the time the chunk was recorded.
+        
+        Args:
+            patient_id (str): Patient the ECG belongs to
+            samples (array-like): New ECG samples, (samples,) or (leads, samples)
+            sampling_rate (int, optional): Sampling rate of the stream in Hz
+                                           (default: input_rate); the rate and
+                                           number of leads are fixed when the
+                                           stream is created
+            timestamp (datetime, str or float, optional): Time the chunk starts,
+                                                          as a datetime, a
+                                                          "%Y-%m-%d %H:%M:%S"
+                                                          string or epoch seconds
+            
+        Returns:
+            dict: Results in the format of analyze, plus 'beats_analyzed', beat
+                  morphology counts ('beat_morphology') and the patient's cached
+                  HRV metrics ('hrv', see HRVAnalyzer.get_metrics)
+        """
+        with self._streams_lock:
+            stream = self.streams.get(patient_id)
+            if stream is None:
+                n_leads = len(samples) if np.ndim(samples) == 2 else 1
+                stream = self.streams[patient_id] = {
+                    'filters': self._filter_bank(sampling_rate or self.config['input_rate'], n_leads),
+                    'detector': StreamingQRSDetector(self.sampling_rate),
+                    'classifier': BeatMorphologyClassifier(self.sampling_rate),
+                    'beats': deque(),
+                    'leads': np.empty((n_leads, 0)),
+                    'leads_start': 0,
+                    'lock': threading.Lock()
+                }
+        
+        with stream['lock']:
+            detector = stream['detector']
+            beats = stream['beats']
+            stream_start = detector.samples_seen / detector.sampling_rate
+            leads = stream['filters'].process(samples)
+            detected = detector.process(leads[self._detection_lead(len(leads))])
+            new_beats = stream['classifier'].classify(detected)
+            if len(leads) > 1:
+                self._measure_lead_st(stream, leads, new_beats)
+            if timestamp is not None:
+                clock = _clock_seconds(timestamp)
+                for beat in new_beats:
+                    beat['clock'] = clock + (beat['time'] - stream_start)
+            beats.extend(new_beats)
+            self.hrv.add_beats(patient_id, new_beats)
+            
+            # Only the recent beats describe the current rhythm
+            horizon = detector.samples_seen / detector.sampling_rate - self.stream_window_seconds
+            while beats and beats[0]['time'] < horizon:
+                beats.popleft()
+            recent = list(beats)
+        
+        if len(recent) < 2:
+            results = self.analyze(samples, stream['filters'].input_rate)
+            results['beats_analyzed'] = 0
+            results['beat_morphology'] = None
+            results['hrv'] = self.hrv.get_metrics(patient_id)
+            return results
+        
+        rr_intervals = np.array([beat['rr'] for beat in recent[1:] if beat['rr'] is not None])
+        heart_rate = np.mean(60 / rr_intervals) if len(rr_intervals) > 0 else None
+        
+        # Ectopic beats and the pause after them are not the underlying rhythm
+        ectopic = [beat['morphology'] in ('pvc', 'premature') for beat in recent]
+        rhythm_rr = np.array([beat['rr'] for i, beat in enumerate(recent[1:], 1)
+                              if beat['rr'] is not None and not ectopic[i] and not ectopic[i - 1]])
+        if len(rhythm_rr) >= 2:
+            rr_intervals = rhythm_rr
+        
+        if len(rr_intervals) >= 2:
+            irregularity_score = np.std(rr_intervals) / np.mean(rr_intervals)
+            is_irregular = irregularity_score > 0.2
+        else:
+            is_irregular, irregularity_score = False, 0
+        
+        multi_lead = stream['filters'].n_leads > 1
+        if multi_lead:
+            st_deviations = [beat['lead_st'] for beat in recent if beat['lead_st'] is not None]
+        else:
+            st_deviations = [beat['st_level'] - beat['baseline'] for beat in recent
+                             if beat['st_level'] is not None and beat['baseline'] is not None]
+        lead_deviations = None
+        if st_deviations:
+            # Average per lead; the most deviated lead decides
+            lead_deviations = np.atleast_1d(np.mean(st_deviations, axis=0))
+            avg_deviation = lead_deviations[np.argmax(np.abs(lead_deviations))]
+            st_analysis = {
+                'st_elevation': avg_deviation > 0.3,
+                'st_depression': avg_deviation < -0.3,
+                'st_deviation': avg_deviation
+            }
+        else:
+            st_analysis = {'st_elevation': False, 'st_depression': False, 'st_deviation': 0}
+        
+        classified = [beat['morphology'] for beat in recent if beat['morphology'] is not None]
+        morphology = {
+            label: classified.count(label) for label in ('normal', 'pvc', 'premature', 'aberrant')
+        }
+        morphology['pvc_fraction'] = morphology['pvc'] / len(classified) if classified else 0
+        
+        results = self._build_results(heart_rate, is_irregular, irregularity_score, st_analysis, morphology)
+        if multi_lead and lead_deviations is not None:
+            results['st_segment']['leads'] = lead_deviations.tolist()
+        results['beats_analyzed'] = len(recent)
+        results['beat_morphology'] = morphology
+        results['hrv'] = self.hrv.get_metrics(patient_id)
+        return results
+    
+    def _measure_lead_st(self, stream, leads, beats):
+        """Set each new beat's per-lead ST deviation ('lead_st') from the recent filtered leads"""
+        detector = stream['detector']
+        buffer = np.concatenate((stream['leads'], leads), axis=1)
+        start = stream['leads_start']
+        
+        if beats:
+            positions = np.array([beat['sample'] for beat in beats]) - start
+            levels = []
+            complete = np.ones(len(beats), dtype=bool)
+            for window in (detector.config['pr_window'], detector.config['st_window']):
+                offsets = np.arange(int(round(window[0] * self.sampling_rate)),
+                                    int(round(window[1] * self.sampling_rate)))
+                index = positions[:, None] + offsets
+                complete &= (index[:, 0] >= 0) & (index[:, -1] < buffer.shape[1])
+                levels.append(buffer[:, np.clip(index, 0, buffer.shape[1] - 1)].mean(axis=2))
+            deviations = levels[1] - levels[0]
+            for i, beat in enumerate(beats):
+                beat['lead_st'] = deviations[:, i] if complete[i] else None
+        
+        keep = int(detector.config['buffer_seconds'] * self.sampling_rate)
+        stream['leads'] = buffer[:, -keep:]
+        stream['leads_start'] = start + buffer.shape[1] - stream['leads'].shape[1]
+    
+    def reset_stream(self, patient_id):
+        """Drop a patient's ECG stream, e.g. after a lead change or discharge"""
+        with self._streams_lock:
+            self.streams.pop(patient_id, None)
+        self.hrv.reset(patient_id)
+    
+    def analyze_batch(self, strips, sampling_rate=None):
+        """
+        Analyze many single-lead ECG strips at once.
+        
+        Normalization, R-peak candidates, heart rate, rhythm irregularity and
+        ST-segment levels are computed with array operations over all strips.
+        Per-strip reductions are done on groups of strips with the same number
+        of peaks, so every value is reduced in the same order as in analyze and
+        the results are identical to calling analyze on each strip. Strips at
+        another rate are filtered and resampled together first, each strip
+        as one lead of the filter bank. Multi-lead strips are not supported;
+        use analyze for them.
         
+        Args:
+            strips (numpy.ndarray): Single-lead ECG strips with shape (n, samples)
+            sampling_rate (int, optional): Sampling rate in Hz (default: input_rate)
+            
+        Returns:
+            list: One analyze result dictionary per strip
+        """
+        strips = np.asarray(strips, dtype=float)
+        if strips.ndim != 2:
+            raise ValueError(f"Expected strips with shape (n, samples), got {strips.shape}")
+        sampling_rate = sampling_rate or self.config['input_rate']
+        if sampling_rate != self.sampling_rate:
+            strips = self._filter_bank(sampling_rate, len(strips)).process(strips)
+        n_strips, n_samples = strips.shape
+        
+        peak_rows, peak_positions = self._detect_r_peaks_batch(strips)
+        peak_counts = np.bincount(peak_rows, minlength=n_strips)
+        
+        # Heart rate from the RR intervals within each strip
+        rr_rows, rr_intervals = self._segment_diffs(peak_rows, peak_positions)
+        rr_counts = np.bincount(rr_rows, minlength=n_strips)
+        heart_rates = self._segment_reduce(60 / (rr_intervals / self.sampling_rate), rr_counts, np.mean)
+        
+        # Coefficient of variation of the RR intervals
+        irregularity = (self._segment_reduce(rr_intervals, rr_counts, np.std) /
+                        self._segment_reduce(rr_intervals, rr_counts, np.mean))
+        
+        # ST level (80-120ms after R) against the PR baseline, for peaks with a full ST window
+        has_st = peak_positions + 15 < n_samples
+        st_rows, st_peaks = peak_rows[has_st], peak_positions[has_st]
+        offsets = np.arange(5)
+        st_levels = np.mean(strips[st_rows[:, None], st_peaks[:, None] + 10 + offsets], axis=1)
+        pr_baselines = np.zeros(len(st_peaks))
+        has_pr = st_peaks > 10
+        pr_baselines[has_pr] = np.mean(
+            strips[st_rows[has_pr, None], st_peaks[has_pr, None] - 10 + offsets], axis=1
+        )
+        st_counts = np.bincount(st_rows, minlength=n_strips)
+        st_deviations = self._segment_reduce(st_levels - pr_baselines, st_counts, np.mean)
+        
+        results = []
+        for i in range(n_strips):
+            heart_rate = heart_rates[i] if peak_counts[i] >= 2 else None
+            if peak_counts[i] >= 3:
+                is_irregular, irregularity_score = irregularity[i] > 0.2, irregularity[i]
+            else:
+                is_irregular, irregularity_score = False, 0
+            if st_counts[i] > 0:
+                st_analysis = {
+                    'st_elevation': st_deviations[i] > 0.3,
+                    'st_depression': st_deviations[i] < -0.3,
+                    'st_deviation': st_deviations[i]
+                }
+            else:
+                st_analysis = {'st_elevation': False, 'st_depression': False, 'st_deviation': 0}
+            results.append(self._build_results(heart_rate, is_irregular, irregularity_score, st_analysis))
+        
+        return results
+    
+    def _detect_r_peaks_batch(self, strips):
+        """
+        Detect R peaks in many strips with the criteria of _detect_r_peaks.
+        
+        Candidates (local maxima above the threshold) are found for all strips
+        at once and the minimum peak distance is enforced with the rule of
+        find_peaks: higher peaks are kept first and remove lower ones nearby.
+        Strips with flat runs or equally high close candidates are passed to
+        find_peaks directly, as its plateau and tie handling is not reproduced.
+        
+        Returns:
+            tuple: (rows, positions) arrays of the peaks, sorted by strip and position
+        """
+        normalized = (strips - np.mean(strips, axis=1, keepdims=True)) / np.std(strips, axis=1, keepdims=True)
+        threshold = 0.7
+        distance = self.sampling_rate // 2
+        
+        center = normalized[:, 1:-1]
+        candidates = (center > normalized[:, :-2]) & (center > normalized[:, 2:]) & (center >= threshold)
+        rows, positions = np.nonzero(candidates)
+        positions = positions + 1
+        heights = normalized[rows, positions]
+        
+        # Pairs of candidates in the same strip closer than the minimum distance
+        first, second = [], []
+        for step in range(1, len(positions)):
+            close = (rows[step:] == rows[:-step]) & (positions[step:] - positions[:-step] < distance)
+            if not close.any():
+                break
+            index = np.nonzero(close)[0]
+            first.append(index)
+            second.append(index + step)
+        first = np.concatenate(first) if first else np.empty(0, dtype=int)
+        second = np.concatenate(second) if second else np.empty(0, dtype=int)
+        
+        redo = np.any(normalized[:, 1:] == normalized[:, :-1], axis=1)
+        redo[rows[first[heights[first] == heights[second]]]] = True
+        
+        # Keep a candidate once every higher one nearby is removed; it removes the lower ones
+        higher = np.where(heights[first] > heights[second], first, second)
+        lower = np.where(heights[first] > heights[second], second, first)
+        state = np.zeros(len(positions), dtype=np.int8)  # 0 undecided, 1 kept, -1 removed
+        while np.any(state == 0):
+            blocked = np.zeros(len(positions), dtype=bool)
+            blocked[lower[state[higher] != -1]] = True
+            state[(state == 0) & ~blocked] = 1
+            state[lower[state[higher] == 1]] = -1
+        
+        keep = (state == 1) & ~redo[rows]
+        rows, positions = [rows[keep]], [positions[keep]]
+        for row in np.nonzero(redo)[0]:
+            peaks, _ = signal.find_peaks(normalized[row], height=threshold, distance=distance)
+            rows.append(np.full(len(peaks), row))
+            positions.append(peaks)
+        rows, positions = np.concatenate(rows), np.concatenate(positions)
+        order = np.lexsort((positions, rows))
+        return rows[order], positions[order]
+    
+    @staticmethod
+    def _segment_diffs(rows, positions):
+        """Differences between consecutive positions within the same row."""
+        same_row = rows[1:] == rows[:-1]
+        return rows[1:][same_row], np.diff(positions)[same_row]
+    
+    @staticmethod
+    def _segment_reduce(values, counts, reduce):
+        """
+        Reduce consecutive per-strip segments of values.
+        
+        Segments of equal length are stacked and reduced along their last
+        axis, which reduces each segment exactly as a 1-D call would.
+        
+        Args:
+            values (numpy.ndarray): Values of all strips, grouped by strip
+            counts (numpy.ndarray): Number of values of each strip
+            reduce (callable): np.mean or np.std
+            
+        Returns:
+            numpy.ndarray: One value per strip (NaN for strips without values)
+        """
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        reduced = np.full(len(counts), np.nan)
+        for count in np.unique(counts[counts > 0]):
+            strip_rows = np.nonzero(counts == count)[0]
+            reduced[strip_rows] = reduce(values[starts[strip_rows, None] + np.arange(count)], axis=1)
+        return reduced
+    
+    def _build_results(self, heart_rate, is_irregular, irregularity_score, st_analysis, morphology=None):
+        """Turn the measured ECG features into conditions and confidence scores"""
         # Determine conditions
         conditions = []
         confidence_scores = {}
@@ -138,6 +554,12 @@ class ECGAnalyzer:
             confidence_scores['afib'] = min(1.0, irregularity_score * 3)
             confidence_scores['normal'] *= (1 - confidence_scores['afib'])
         
+        # Check for premature ventricular contractions (streams only)
+        if morphology is not None and morphology['pvc'] > 0:
+            conditions.append('pvc')
+            confidence_scores['pvc'] = min(1.0, 0.5 + morphology['pvc_fraction'] * 5)
+            confidence_scores['normal'] *= (1 - confidence_scores['pvc'])
+        
         # Check for ST segment abnormalities
         if st_analysis['st_elevation']:
             conditions.append('st_elevation')
@@ -12,20 +12,28 @@ class EnhancedAnomalyDetector(AnomalyDetector):
     providing the same interface but with enhanced capabilities.
     """
     
-    def __init__(self):
-        """Initialize the enhanced anomaly detector."""
+    def __init__(self, engine='isolation_forest', training_service=None):
+        """
+        Initialize the enhanced anomaly detector.
+        
+        Args:
+            engine (str): Traditional detection engine, 'isolation_forest'
+                or 'half_space_trees'
+            training_service (TrainingService, optional): Service used to train
+                the forests and the autoencoder in a background process
+        """
         # Initialize the original detector
-        super().__init__()
+        super().__init__(engine, training_service=training_service)
         
         # Initialize the autoencoder-based detector
-        self.autoencoder_detector = AutoencoderAnomalyDetector()
+        self.autoencoder_detector = AutoencoderAnomalyDetector(training_service=training_service)
         
         # Flag to track if autoencoder is available
         self.autoencoder_available = os.path.exists(self.autoencoder_detector.config['model_path'])
         
         print(f"Enhanced Anomaly Detector initialized. Autoencoder available: {self.autoencoder_available}")
     
-    def detect(self, current_data, history):
+    def detect(self, current_data, history, patient_id='default'):
         """
         Detect anomalies in the current vital signs using both traditional
         and deep learning-based methods.
@@ -33,15 +41,18 @@ class EnhancedAnomalyDetector(AnomalyDetector):
         Args:
             current_data (dict): Dictionary with current vital signs
             history (dict): Dictionary with patient history data
+            patient_id (str): Patient identifier for per-patient autoencoder thresholds
             
         Returns:
             dict: Anomaly detection results
         """
-        # Train the autoencoder if not already trained
+        # Train the autoencoder if not already trained. With a training service
+        # this only queues the job and traditional detection is used until it is published.
         if not self.autoencoder_available and history and len(history['timestamps']) > 50:
-            print("Training autoencoder model with patient history...")
-            self.autoencoder_detector.train(history)
-            self.autoencoder_available = True
+            if not self.autoencoder_detector.training_pending:
+                print("Training autoencoder model with patient history...")
+                self.autoencoder_detector.train(history)
+            self.autoencoder_available = self.autoencoder_detector.model_trained
         
         # Call the parent (original) detector
         base_results = super().detect(current_data, history)
@@ -50,13 +61,13 @@ class EnhancedAnomalyDetector(AnomalyDetector):
         if self.autoencoder_available:
             try:
                 # Get autoencoder results
-                autoencoder_results = self.autoencoder_detector.detect(current_data)
+                autoencoder_results = self.autoencoder_detector.detect(current_data, patient_id=patient_id)
                 
                 # Merge results (prioritize autoencoder for features it analyzes)
                 merged_results = self._merge_results(base_results, autoencoder_results)
                 
                 # Add explanation if available
-                explanation = self.autoencoder_detector.explain_anomalies(current_data)
+                explanation = self.autoencoder_detector.explain_anomalies(current_data, patient_id)
                 if explanation:
                     merged_results['explanation'] = explanation
                 
@@ -111,4 +122,23 @@ class EnhancedAnomalyDetector(AnomalyDetector):
         """
         if self.autoencoder_available:
             return self.autoencoder_detector.get_latent_features(current_data)
-        return None
\ No newline at end of file
+        return None
+    
+    @property
+    def latent_version(self):
+        """Version of the encoder behind the latent representations."""
+        return self.autoencoder_detector.model_version
+    
+    def get_latent_history(self, history):
+        """
+        Get latent space representations for every reading in a history.
+        
+        Args:
+            history (dict): Dictionary with patient history data
+            
+        Returns:
+            numpy.ndarray: Latent vectors or None if unavailable
+        """
+        if self.autoencoder_available:
+            return self.autoencoder_detector.get_latent_history(history)
+        return None
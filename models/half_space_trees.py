@@ -0,0 +1,259 @@
+import numpy as np
+
+class HalfSpaceTrees:
+    """
+    Streaming anomaly detector based on Half-Space Trees (Tan, Ting & Liu, 2011).
+
+    The ensemble is made of fully grown binary trees whose split points are
+    chosen at random inside a perturbed workspace, so no data is needed to
+    build them. Each node counts how many readings fell into it during the
+    previous window (reference mass) and the current window (latest mass).
+    When a window fills up the latest mass becomes the reference, which lets
+    the model follow a drifting baseline without ever being refitted.
+
+    Scoring and updating a reading both cost O(n_trees * height), and memory
+    is fixed at O(n_trees * 2^height) regardless of how long the stream runs.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the half-space trees ensemble.
+
+        Args:
+            config (dict, optional): Configuration dictionary with parameters:
+                - limits: List of (min, max) tuples, one per input feature
+                - n_trees: Number of trees in the ensemble
+                - height: Depth of each tree
+                - window_size: Number of readings per reference window
+                - size_limit: Minimum mass for a node to be trusted when scoring
+                - contamination: Expected proportion of anomalies in a window
+                - random_state: Seed for the random split structure
+        """
+        # Default configuration
+        self.config = {
+            'limits': [(0.0, 1.0)],  # Feature ranges used to scale inputs to [0, 1]
+            'n_trees': 25,
+            'height': 8,
+            'window_size': 250,
+            'size_limit': None,  # Defaults to 10% of the window
+            'contamination': 0.05,
+            'random_state': 42,
+        }
+
+        # Update with provided config
+        if config:
+            self.config.update(config)
+
+        limits = np.asarray(self.config['limits'], dtype=float)
+        self.n_features = len(limits)
+        self._low = limits[:, 0]
+        self._span = limits[:, 1] - limits[:, 0]
+        self._span[self._span == 0] = 1
+
+        self.n_trees = self.config['n_trees']
+        self.height = self.config['height']
+        self.window_size = self.config['window_size']
+        self.size_limit = self.config['size_limit']
+        if self.size_limit is None:
+            self.size_limit = 0.1 * self.window_size
+
+        # Complete binary trees stored as arrays (node i has children 2i+1, 2i+2)
+        self._n_nodes = 2 ** (self.height + 1) - 1
+        self._depth_weights = 2.0 ** np.arange(self.height + 1)
+        self._max_score = self.n_trees * self.window_size * (2 ** (self.height + 1) - 1)
+        self._tree_index = np.arange(self.n_trees)
+        self._build_trees(np.random.RandomState(self.config['random_state']))
+
+        # Offsets into the flattened per-tree arrays (flat indexing is much faster)
+        self._internal_offset = self._tree_index * (2 ** self.height - 1)
+        self._node_offset = self._tree_index[:, None] * self._n_nodes
+
+        self.reset()
+
+    def _build_trees(self, rng):
+        """Draw the random split structure of every tree."""
+        n_internal = 2 ** self.height - 1
+        self._split_feature = np.zeros((self.n_trees, n_internal), dtype=np.intp)
+        self._split_value = np.zeros((self.n_trees, n_internal))
+
+        for t in range(self.n_trees):
+            # Randomly perturbed workspace that still covers [0, 1]
+            s = rng.uniform(size=self.n_features)
+            half_range = np.maximum(s, 1 - s)
+            lows = {0: s - half_range}
+            highs = {0: s + half_range}
+
+            for node in range(n_internal):
+                low, high = lows.pop(node), highs.pop(node)
+                feature = rng.randint(self.n_features)
+                split = (low[feature] + high[feature]) / 2
+                self._split_feature[t, node] = feature
+                self._split_value[t, node] = split
+
+                left_high = high.copy()
+                left_high[feature] = split
+                right_low = low.copy()
+                right_low[feature] = split
+                lows[2 * node + 1], highs[2 * node + 1] = low, left_high
+                lows[2 * node + 2], highs[2 * node + 2] = right_low, high
+
+    def reset(self):
+        """Forget all observed data while keeping the tree structure."""
+        self._r_mass = np.zeros((self.n_trees, self._n_nodes))
+        self._l_mass = np.zeros((self.n_trees, self._n_nodes))
+        self._window_count = 0
+        self._window_scores = np.zeros(self.window_size)
+        self.threshold = None
+        self.is_ready = False
+
+    def _scale(self, X):
+        """Scale raw feature values to the unit hypercube."""
+        return (np.asarray(X, dtype=float).reshape(-1, self.n_features) - self._low) / self._span
+
+    def _paths(self, X_scaled):
+        """
+        Walk every sample down every tree.
+
+        Args:
+            X_scaled (numpy.ndarray): Scaled samples with shape (samples, features)
+
+        Returns:
+            numpy.ndarray: Visited node indices with shape (samples, n_trees, height + 1)
+        """
+        n_samples = len(X_scaled)
+        paths = np.zeros((n_samples, self.n_trees, self.height + 1), dtype=np.intp)
+        node = np.zeros((n_samples, self.n_trees), dtype=np.intp)
+        split_feature = self._split_feature.ravel()
+        split_value = self._split_value.ravel()
+
+        for depth in range(self.height):
+            flat_node = node + self._internal_offset
+            if self.n_features == 1:
+                value = X_scaled
+            else:
+                value = np.take_along_axis(X_scaled, split_feature[flat_node], axis=1)
+            go_right = value > split_value[flat_node]
+            node = 2 * node + 1 + go_right
+            paths[:, :, depth + 1] = node
+
+        return paths
+
+    def _mass_scores(self, paths):
+        """Compute the raw (un-normalised) mass score of each sample."""
+        r_mass = self._r_mass.ravel()[paths + self._node_offset]
+
+        # Stop descending after the first node whose reference mass is too small.
+        # A child never holds more mass than its parent, so a node is visited
+        # exactly when its parent was at or above the size limit.
+        visited = np.ones(r_mass.shape, dtype=bool)
+        visited[..., 1:] = r_mass[..., :-1] >= self.size_limit
+        contributions = np.where(visited, r_mass, 0) @ self._depth_weights
+
+        return contributions.sum(axis=1)
+
+    def score_many(self, X):
+        """
+        Compute anomaly scores for a batch of samples.
+
+        Args:
+            X (numpy.ndarray): Samples with shape (samples, features)
+
+        Returns:
+            numpy.ndarray: Scores in [0, 1] where higher is more anomalous
+        """
+        paths = self._paths(self._scale(X))
+        return 1 - self._mass_scores(paths) / self._max_score
+
+    def score_one(self, x):
+        """Compute the anomaly score of a single sample."""
+        return float(self.score_many(x)[0])
+
+    def learn_one(self, x, score=None):
+        """
+        Update the latest mass with a single sample.
+
+        Args:
+            x (array-like): Sample with shape (features,)
+            score (float, optional): Anomaly score of the sample if already computed,
+                used to calibrate the threshold for the next window
+        """
+        paths = self._paths(self._scale(x))[0]
+        self._l_mass[self._tree_index[:, None], paths] += 1
+
+        if score is None and self.is_ready:
+            score = 1 - self._mass_scores(paths[None])[0] / self._max_score
+        if score is not None:
+            self._window_scores[self._window_count] = score
+
+        self._window_count += 1
+        if self._window_count == self.window_size:
+            self._end_window(calibrate=self.is_ready)
+
+    def fit(self, X):
+        """
+        Initialise the reference mass from a batch of historical samples.
+
+        This replaces any previously observed data, so it is meant for
+        bootstrapping the model before switching to streaming updates.
+
+        Args:
+            X (numpy.ndarray): Samples with shape (samples, features)
+        """
+        X = np.asarray(X, dtype=float).reshape(-1, self.n_features)[-self.window_size:]
+        if len(X) == 0:
+            raise ValueError("Cannot fit half-space trees on an empty batch")
+        self.reset()
+        paths = self._paths(self._scale(X))
+
+        # Accumulate counts for every (tree, node) pair along all paths
+        np.add.at(self._l_mass, (self._tree_index[None, :, None], paths), 1)
+
+        self._window_count = len(X)
+        self._end_window(calibrate=False)
+
+        # Calibrate the threshold on the batch that built the reference
+        self._set_threshold(self.score_many(X))
+        return self
+
+    def _end_window(self, calibrate):
+        """Promote the latest mass to reference and start a new window."""
+        if calibrate:
+            self._set_threshold(self._window_scores[:self._window_count])
+        self._r_mass = self._l_mass
+        self._l_mass = np.zeros_like(self._r_mass)
+        self._window_count = 0
+        self.is_ready = True
+
+    def _set_threshold(self, scores):
+        """Set the anomaly threshold from the scores of a window."""
+        if len(scores) > 0:
+            self.threshold = float(np.quantile(scores, 1 - self.config['contamination']))
+
+    def decision_function_many(self, X):
+        """
+        Signed anomaly scores compatible with IsolationForest.decision_function.
+
+        The threshold is calibrated by fit, or at the end of the second window
+        of a model trained only with learn_one; scoring before that fails.
+
+        Args:
+            X (numpy.ndarray): Samples with shape (samples, features)
+
+        Returns:
+            numpy.ndarray: Scores where negative values are anomalous
+        """
+        if self.threshold is None:
+            raise ValueError("Half-space trees have no anomaly threshold yet; call fit first")
+        return self.threshold - self.score_many(X)
+
+    def decision_function(self, x):
+        """
+        Signed anomaly score of a single sample (see decision_function_many).
+
+        Args:
+            x (array-like): Sample with shape (features,)
+
+        Returns:
+            float: Score where negative values are anomalous
+        """
+        return float(self.decision_function_many(x)[0])
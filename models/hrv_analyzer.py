@@ -0,0 +1,343 @@
+import threading
+import numpy as np
+from collections import deque
+from scipy import signal
+
+def welch_psd(values, rate, segment):
+    """
+    Welch power spectral density with linear detrending of each segment.
+
+    Equivalent to scipy.signal.welch(values, rate, nperseg=segment,
+    detrend='linear') with its default Hann window and half overlap, but the
+    segments are detrended by one projection and transformed in one batch,
+    which is much faster on day-long series.
+
+    Returns:
+        tuple: (frequencies, power density)
+    """
+    # scipy overlaps segments by segment // 2, so odd segments step by one more
+    step = segment - segment // 2
+    segments = np.lib.stride_tricks.sliding_window_view(values, segment)[::step]
+    ramp = np.arange(segment) - (segment - 1) / 2
+    segments = segments - segments.mean(axis=1, keepdims=True)
+    segments = segments - np.outer(segments @ ramp / (ramp @ ramp), ramp)
+
+    window = signal.get_window('hann', segment)
+    power = np.abs(np.fft.rfft(segments * window, axis=1)) ** 2
+    power = power.mean(axis=0) / (rate * (window ** 2).sum())
+    # One-sided density: double everything except DC (and Nyquist for even segments)
+    power[1:-1 if segment % 2 == 0 else None] *= 2
+    return np.fft.rfftfreq(segment, 1 / rate), power
+
+
+class SlidingHRVWindow:
+    """
+    Time-domain HRV over a sliding time window, kept as running sums.
+
+    Adding a beat and evicting old ones only updates sums, so SDNN, RMSSD
+    and pNN50 cost O(1) per beat whatever the window length. Successive
+    differences are only counted between consecutive normal (NN) beats.
+    The sums are recomputed from the stored beats now and then to remove
+    floating-point drift.
+    """
+
+    def __init__(self, length_seconds, resum_interval=10000):
+        """
+        Initialize an empty window.
+
+        Args:
+            length_seconds (float): Window length
+            resum_interval (int): Beats between exact recomputations of the sums
+        """
+        self.length_seconds = length_seconds
+        self.resum_interval = resum_interval
+        self.beats = deque()  # [time, nn_ms, successive difference or None, stream time]
+        self._clear_sums()
+        self._updates = 0
+
+    def _clear_sums(self):
+        self.count = 0
+        self.sum_nn = 0.0
+        self.sum_nn_sq = 0.0
+        self.diff_count = 0
+        self.sum_diff_sq = 0.0
+        self.nn50 = 0
+
+    def _add_diff(self, diff, sign):
+        self.diff_count += sign
+        self.sum_diff_sq += sign * diff * diff
+        if abs(diff) > 50:
+            self.nn50 += sign
+
+    def add(self, time, nn, diff=None, stream_time=None):
+        """
+        Add an NN interval.
+
+        Args:
+            time (float): Time of the beat ending the interval, in seconds
+            nn (float): NN interval in milliseconds
+            diff (float, optional): Difference to the previous NN interval, if
+                                    the two are consecutive
+            stream_time (float, optional): Time of the beat in the ECG stream,
+                                           if different from time
+        """
+        # The oldest beat's difference refers to a beat outside the window
+        if not self.beats:
+            diff = None
+        self.beats.append([time, nn, diff, time if stream_time is None else stream_time])
+        self.count += 1
+        self.sum_nn += nn
+        self.sum_nn_sq += nn * nn
+        if diff is not None:
+            self._add_diff(diff, 1)
+
+        while self.beats and self.beats[0][0] < time - self.length_seconds:
+            _, old_nn, _, _ = self.beats.popleft()
+            self.count -= 1
+            self.sum_nn -= old_nn
+            self.sum_nn_sq -= old_nn * old_nn
+            if self.beats and self.beats[0][2] is not None:
+                self._add_diff(self.beats[0][2], -1)
+                self.beats[0][2] = None
+
+        self._updates += 1
+        if self._updates % self.resum_interval == 0:
+            self._resum()
+
+    def _resum(self):
+        """Recompute the sums exactly from the stored beats."""
+        self._clear_sums()
+        for _, nn, diff, _ in self.beats:
+            self.count += 1
+            self.sum_nn += nn
+            self.sum_nn_sq += nn * nn
+            if diff is not None:
+                self._add_diff(diff, 1)
+
+    def stream_seconds(self, now):
+        """Stream time from the oldest beat in the window to now (a stream time)."""
+        return now - self.beats[0][3] if self.beats else 0.0
+
+    def metrics(self):
+        """
+        Time-domain HRV metrics of the window.
+
+        Returns:
+            dict: beats, mean_nn (ms), mean_hr (bpm), sdnn (ms), rmssd (ms) and
+                  pnn50 (%); values are None when there are too few beats
+        """
+        metrics = {'beats': self.count, 'mean_nn': None, 'mean_hr': None, 'sdnn': None, 'rmssd': None, 'pnn50': None}
+        if self.count >= 2:
+            mean_nn = self.sum_nn / self.count
+            variance = (self.sum_nn_sq - self.count * mean_nn * mean_nn) / (self.count - 1)
+            metrics['mean_nn'] = mean_nn
+            metrics['mean_hr'] = 60000 / mean_nn
+            metrics['sdnn'] = float(np.sqrt(max(variance, 0.0)))
+        if self.diff_count >= 1:
+            metrics['rmssd'] = float(np.sqrt(max(self.sum_diff_sq, 0.0) / self.diff_count))
+            metrics['pnn50'] = 100 * self.nn50 / self.diff_count
+        return metrics
+
+
+class TachogramBuffer:
+    """Ring buffer of the NN tachogram resampled on a regular time grid."""
+
+    def __init__(self, capacity):
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.size = 0
+        self.position = 0
+
+    def extend(self, values):
+        """Append samples, overwriting the oldest when full."""
+        values = np.asarray(values, dtype=np.float32)[-len(self.values):]
+        capacity = len(self.values)
+        first = min(len(values), capacity - self.position)
+        self.values[self.position:self.position + first] = values[:first]
+        self.values[:len(values) - first] = values[first:]
+        self.position = (self.position + len(values)) % capacity
+        self.size = min(capacity, self.size + len(values))
+
+    def latest(self, n):
+        """The most recent n samples (or fewer), oldest first."""
+        n = min(n, self.size)
+        return np.roll(self.values, -self.position)[len(self.values) - n:] if n else np.empty(0, dtype=np.float32)
+
+
+class HRVAnalyzer:
+    """
+    Incremental heart rate variability per patient.
+
+    Beats (e.g. from StreamingQRSDetector) are filtered to NN intervals and
+    added to sliding windows of several lengths, whose time-domain metrics
+    are updated from running sums with every beat. Windows are measured in
+    reading time (each beat's 'clock' time) when beats carry one: monitors
+    often send only part of the ECG between readings, so the stream's own
+    time would make a window span much more than its length. For frequency-domain
+    metrics the NN series is resampled at a low fixed rate into a ring buffer
+    covering the longest window, and LF/HF powers are estimated with Welch's
+    method on a fixed cadence. All results are cached, so reading them is
+    O(1).
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the analyzer.
+
+        Args:
+            config (dict, optional): Configuration parameters:
+                - windows: Window name -> length in seconds of reading time
+                - min_rr / max_rr: Plausible RR interval range in seconds
+                - max_rr_change: Largest relative change to the previous RR of an NN interval
+                - tachogram_rate: Resampling rate of the NN series in Hz
+                - spectral_interval: Stream seconds between spectral updates
+                - welch_segment: Welch segment length in seconds
+                - lf_band / hf_band: Frequency bands in Hz
+        """
+        # Default configuration
+        self.config = {
+            'windows': {'5min': 300, '1h': 3600, '24h': 86400},
+            'min_rr': 0.3,
+            'max_rr': 2.0,
+            'max_rr_change': 0.2,
+            'tachogram_rate': 2.0,
+            'spectral_interval': 60,
+            'welch_segment': 128,
+            'lf_band': (0.04, 0.15),
+            'hf_band': (0.15, 0.4),
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self.patients = {}
+        self._lock = threading.Lock()
+
+    def _patient(self, patient_id):
+        """Get or create the state of a patient."""
+        patient = self.patients.get(patient_id)
+        if patient is None:
+            rate = self.config['tachogram_rate']
+            longest = max(self.config['windows'].values())
+            patient = self.patients[patient_id] = {
+                'windows': {name: SlidingHRVWindow(length) for name, length in self.config['windows'].items()},
+                'tachogram': TachogramBuffer(int(longest * rate)),
+                'previous_rr': None,
+                'previous_nn': None,
+                'last_point': None,        # (time, nn_ms) of the last NN beat
+                'next_grid_time': None,
+                'next_spectral_time': None,
+                'lock': threading.Lock(),
+                'results': {name: None for name in self.config['windows']}
+            }
+        return patient
+
+    def add_beats(self, patient_id, beats):
+        """
+        Add detected beats of a patient and refresh the cached metrics.
+
+        Args:
+            patient_id (str): Patient the beats belong to
+            beats (list): Beats in time order, each with 'time' (stream seconds),
+                          'rr' (seconds since the previous beat, or None) and
+                          optionally 'clock' (reading time in seconds, used for
+                          the windows; defaults to 'time')
+        """
+        with self._lock:
+            patient = self._patient(patient_id)
+
+        with patient['lock']:
+            added = False
+            for beat in beats:
+                added |= self._add_beat(patient, beat['time'], beat['rr'], beat.get('clock', beat['time']))
+            if not added:
+                return
+
+            now = patient['last_point'][0]
+            spectral_due = patient['next_spectral_time'] is None or now >= patient['next_spectral_time']
+            if spectral_due:
+                patient['next_spectral_time'] = now + self.config['spectral_interval']
+
+            for name, window in patient['windows'].items():
+                results = window.metrics()
+                previous = patient['results'][name]
+                if spectral_due:
+                    # The tachogram is in stream time; take the part the window's beats cover
+                    results.update(self._spectral_metrics(patient['tachogram'], window.stream_seconds(now)))
+                    results['spectrum_time'] = now
+                elif previous is not None:
+                    for key in ('lf', 'hf', 'lf_hf', 'spectrum_time'):
+                        results[key] = previous.get(key)
+                patient['results'][name] = results
+
+    def _add_beat(self, patient, time, rr, clock):
+        """Add one beat if it ends an NN interval; returns whether it did."""
+        previous_rr = patient['previous_rr']
+        patient['previous_rr'] = rr
+        if rr is None or not self.config['min_rr'] <= rr <= self.config['max_rr']:
+            patient['previous_nn'] = None
+            return False
+        if previous_rr is not None and abs(rr - previous_rr) > self.config['max_rr_change'] * previous_rr:
+            # Ectopic or artefact: break the chain of successive differences
+            patient['previous_nn'] = None
+            return False
+
+        nn = rr * 1000
+        diff = nn - patient['previous_nn'] if patient['previous_nn'] is not None else None
+        patient['previous_nn'] = nn
+        for window in patient['windows'].values():
+            window.add(clock, nn, diff, time)
+
+        self._extend_tachogram(patient, time, nn)
+        return True
+
+    def _extend_tachogram(self, patient, time, nn):
+        """Resample the NN series up to this beat by linear interpolation."""
+        rate = self.config['tachogram_rate']
+        last_point = patient['last_point']
+        patient['last_point'] = (time, nn)
+        if last_point is None:
+            patient['next_grid_time'] = time
+            return
+
+        grid_start = patient['next_grid_time']
+        if time < grid_start:
+            return
+        grid = grid_start + np.arange(int((time - grid_start) * rate) + 1) / rate
+        last_time, last_nn = last_point
+        fraction = (grid - last_time) / (time - last_time) if time > last_time else np.ones(len(grid))
+        patient['tachogram'].extend(last_nn + fraction * (nn - last_nn))
+        patient['next_grid_time'] = grid[-1] + 1 / rate
+
+    def _spectral_metrics(self, tachogram, length_seconds):
+        """LF and HF power (ms^2) of the latest window of the tachogram."""
+        rate = self.config['tachogram_rate']
+        values = tachogram.latest(int(length_seconds * rate)).astype(float)
+        segment = int(self.config['welch_segment'] * rate)
+        if len(values) < segment:
+            return {'lf': None, 'hf': None, 'lf_hf': None}
+
+        frequencies, power = welch_psd(values, rate, segment)
+        resolution = frequencies[1] - frequencies[0]
+        lf_band, hf_band = self.config['lf_band'], self.config['hf_band']
+        lf = float(power[(frequencies >= lf_band[0]) & (frequencies < lf_band[1])].sum() * resolution)
+        hf = float(power[(frequencies >= hf_band[0]) & (frequencies < hf_band[1])].sum() * resolution)
+        return {'lf': lf, 'hf': hf, 'lf_hf': lf / hf if hf > 0 else None}
+
+    def get_metrics(self, patient_id):
+        """
+        Cached HRV metrics of a patient.
+
+        Returns:
+            dict: Window name -> metrics (time-domain metrics plus lf, hf, lf_hf
+                  and spectrum_time), or None for a patient without beats
+        """
+        patient = self.patients.get(patient_id)
+        if patient is None:
+            return None
+        return patient['results']
+
+    def reset(self, patient_id):
+        """Forget a patient's beats and metrics."""
+        with self._lock:
+            self.patients.pop(patient_id, None)
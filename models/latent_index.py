@@ -0,0 +1,235 @@
+import threading
+import numpy as np
+
+class LatentCaseIndex:
+    """
+    Incrementally built nearest-neighbour index over autoencoder latent vectors.
+
+    Each indexed reading carries a metadata dictionary (patient, timestamp,
+    vitals, risk) so similar historical cases can be shown next to an
+    explanation. Small indexes are searched exhaustively. Once the index
+    grows past brute_force_limit it becomes an inverted-file (IVF) index:
+    vectors are bucketed by their nearest k-means centroid and a query only
+    scans the few buckets closest to it. The coarse quantizer is retrained
+    whenever the index has grown by rebuild_factor, so the cost of rebuilding
+    is amortised over many additions.
+
+    Latent vectors of different encoders are not comparable, so the index
+    records the encoder_version its vectors come from and is re-encoded as a
+    whole when the encoder changes.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize an empty index.
+
+        Args:
+            config (dict, optional): Configuration parameters:
+                - dim: Dimension of the latent vectors
+                - brute_force_limit: Size below which queries scan every vector
+                - n_probe: Number of buckets scanned per query
+                - rebuild_factor: Growth factor that triggers retraining the centroids
+                - kmeans_iterations: Lloyd iterations when training the centroids
+                - random_state: Seed for centroid initialisation
+        """
+        # Default configuration
+        self.config = {
+            'dim': 8,  # Bottleneck size of the vital signs autoencoder
+            'brute_force_limit': 4096,
+            'n_probe': 8,
+            'rebuild_factor': 2,
+            'kmeans_iterations': 10,
+            'random_state': 42,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self.encoder_version = None  # Encoder the indexed vectors come from
+        self._clear()
+
+        # Readings are added by the monitoring thread while requests query
+        self._lock = threading.Lock()
+
+    def _clear(self):
+        """Drop every vector and the inverted lists."""
+        self._vectors = np.empty((1024, self.config['dim']), dtype=np.float32)
+        self.metadata = []
+        self.size = 0
+
+        # Inverted lists (built once the index outgrows brute force)
+        self._centroids = None
+        self._lists = []
+        self._list_sizes = None
+        self._built_size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, vector, metadata=None):
+        """
+        Add a single latent vector.
+
+        Args:
+            vector (array-like): Latent vector with shape (dim,)
+            metadata (dict, optional): Information about the reading
+        """
+        self.add_many(np.asarray(vector).reshape(1, -1), [metadata])
+
+    def add_many(self, vectors, metadata=None):
+        """
+        Add a batch of latent vectors.
+
+        Args:
+            vectors (numpy.ndarray): Latent vectors with shape (samples, dim)
+            metadata (list, optional): One metadata dictionary per vector
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.config['dim'])
+        n_new = len(vectors)
+        if n_new == 0:
+            return
+        if metadata is None:
+            metadata = [None] * n_new
+
+        with self._lock:
+            self._add(vectors, metadata)
+
+    def reencode(self, vectors, encoder_version):
+        """
+        Replace every vector with its encoding by a new encoder.
+
+        The metadata is kept, so vectors must be given for all indexed
+        readings, in the order of metadata. An empty index just takes the
+        new version.
+
+        Args:
+            vectors (numpy.ndarray): Latent vectors with shape (size, dim)
+            encoder_version: Version of the encoder that produced them
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.config['dim'])
+        with self._lock:
+            if len(vectors) != self.size:
+                raise ValueError(f"Expected {self.size} vectors, got {len(vectors)}")
+            metadata = self.metadata
+            self._clear()
+            self.encoder_version = encoder_version
+            if len(vectors):
+                self._add(vectors, metadata)
+
+    def latest(self):
+        """Metadata of the most recently added reading, or None."""
+        with self._lock:
+            return self.metadata[-1] if self.size else None
+
+    def _add(self, vectors, metadata):
+        """Store vectors and update the inverted lists (lock held)."""
+        n_new = len(vectors)
+
+        # Grow storage geometrically
+        if self.size + n_new > len(self._vectors):
+            capacity = max(2 * len(self._vectors), self.size + n_new)
+            grown = np.empty((capacity, self.config['dim']), dtype=np.float32)
+            grown[:self.size] = self._vectors[:self.size]
+            self._vectors = grown
+
+        ids = np.arange(self.size, self.size + n_new)
+        self._vectors[ids] = vectors
+        self.metadata.extend(metadata)
+        self.size += n_new
+
+        if self.size >= self.config['brute_force_limit'] and (
+                self._centroids is None or self.size >= self._built_size * self.config['rebuild_factor']):
+            self._rebuild()
+        elif self._centroids is not None:
+            self._append_to_lists(ids, self._nearest_centroids(vectors))
+
+    def _nearest_centroids(self, vectors, count=1):
+        """Indices of the closest centroids for each vector."""
+        distances = (
+            np.sum(vectors ** 2, axis=1, keepdims=True)
+            - 2 * vectors @ self._centroids.T
+            + np.sum(self._centroids ** 2, axis=1)
+        )
+        if count == 1:
+            return np.argmin(distances, axis=1)
+        count = min(count, len(self._centroids))
+        return np.argpartition(distances, count - 1, axis=1)[:, :count]
+
+    def _append_to_lists(self, ids, assignments):
+        """Append vector ids to their inverted lists."""
+        for list_id in np.unique(assignments):
+            new_ids = ids[assignments == list_id]
+            size = self._list_sizes[list_id]
+            bucket = self._lists[list_id]
+            if size + len(new_ids) > len(bucket):
+                grown = np.empty(max(2 * len(bucket), size + len(new_ids)), dtype=np.intp)
+                grown[:size] = bucket[:size]
+                bucket = self._lists[list_id] = grown
+            bucket[size:size + len(new_ids)] = new_ids
+            self._list_sizes[list_id] = size + len(new_ids)
+
+    def _rebuild(self):
+        """Retrain the coarse quantizer and reassign every vector."""
+        rng = np.random.RandomState(self.config['random_state'])
+        vectors = self._vectors[:self.size]
+        n_lists = max(1, int(np.sqrt(self.size)))
+
+        # Train on a bounded sample so rebuilds stay cheap
+        sample_size = min(self.size, 64 * n_lists)
+        sample = vectors[rng.choice(self.size, sample_size, replace=False)]
+        self._centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.config['kmeans_iterations']):
+            assignments = self._nearest_centroids(sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+            sums = np.zeros_like(self._centroids)
+            np.add.at(sums, assignments, sample)
+            non_empty = counts > 0
+            self._centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+
+        self._lists = [np.empty(16, dtype=np.intp) for _ in range(n_lists)]
+        self._list_sizes = np.zeros(n_lists, dtype=np.intp)
+
+        # Assign in chunks to bound the size of the distance matrix
+        for start in range(0, self.size, 65536):
+            chunk = vectors[start:start + 65536]
+            self._append_to_lists(np.arange(start, start + len(chunk)), self._nearest_centroids(chunk))
+
+        self._built_size = self.size
+
+    def query(self, vector, k=3):
+        """
+        Find the k most similar indexed readings.
+
+        Args:
+            vector (array-like): Query latent vector with shape (dim,)
+            k (int): Number of neighbours to return
+
+        Returns:
+            list: (distance, metadata) tuples sorted by increasing distance
+        """
+        query = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+
+        with self._lock:
+            return self._query(query, k)
+
+    def _query(self, query, k):
+        """Search the index (lock held)."""
+        if self.size == 0:
+            return []
+
+        if self._centroids is None:
+            candidates = np.arange(self.size)
+        else:
+            probes = self._nearest_centroids(query, self.config['n_probe'])[0]
+            candidates = np.concatenate([self._lists[p][:self._list_sizes[p]] for p in probes])
+
+        distances = np.sum((self._vectors[candidates] - query) ** 2, axis=1)
+        k = min(k, len(candidates))
+        if k == 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+
+        return [(float(np.sqrt(distances[i])), self.metadata[candidates[i]]) for i in nearest]
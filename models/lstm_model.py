@@ -5,6 +5,7 @@ from tensorflow.keras.layers import LSTM, Dense, Dropout, Input, Bidirectional
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
 import os
+from models.streaming_lstm import StreamingLSTM, streaming_path
 
 class HealthcareLSTM:
     """
@@ -46,6 +47,7 @@ class HealthcareLSTM:
         
         # Initialize model
         self.model = None
+        self.pretrained = False  # Whether the model was loaded from model_path
         
         # Try to load pre-trained model if it exists
         self._load_or_create_model()
@@ -54,8 +56,17 @@ class HealthcareLSTM:
         """Load existing model or create a new one if none exists."""
         try:
             if os.path.exists(self.config['model_path']):
-                self.model = load_model(self.config['model_path'])
-                print(f"Loaded existing model from {self.config['model_path']}")
+                model = load_model(self.config['model_path'])
+                is_bidirectional = any(isinstance(layer, Bidirectional) for layer in model.layers)
+                if is_bidirectional and not self.config['bidirectional']:
+                    # A unidirectional model is needed for streaming export and serving
+                    print(f"Model at {self.config['model_path']} is bidirectional, "
+                          "but a unidirectional one is configured. Creating new model instead.")
+                    self._build_model()
+                else:
+                    self.model = model
+                    self.pretrained = True
+                    print(f"Loaded existing model from {self.config['model_path']}")
             else:
                 self._build_model()
                 print("Created new LSTM model")
@@ -121,9 +132,11 @@ class HealthcareLSTM:
         
         Args:
             X_train (numpy.ndarray): Training input sequences 
-                                    [samples, sequence_length, features]
+                                    [samples, sequence_length, features],
+                                    or a Keras Sequence / tf.data.Dataset yielding (inputs, targets)
             y_train (numpy.ndarray): Training target sequences 
-                                    [samples, prediction_horizon * features]
+                                    [samples, prediction_horizon * features],
+                                    or None when X_train yields batches
             X_val (numpy.ndarray): Validation input sequences
             y_val (numpy.ndarray): Validation target sequences
             epochs (int): Number of training epochs
@@ -137,41 +150,78 @@ class HealthcareLSTM:
             ModelCheckpoint(self.config['model_path'], save_best_only=True)
         ]
         
-        validation_data = None
-        if X_val is not None and y_val is not None:
-            validation_data = (X_val, y_val)
-        
-        history = self.model.fit(
-            X_train, y_train,
-            epochs=epochs,
-            batch_size=batch_size,
-            validation_data=validation_data,
-            callbacks=callbacks,
-            verbose=1
-        )
+        if y_train is None:
+            # Batched sequence (e.g. WindowSequence): it provides targets and batch size
+            history = self.model.fit(
+                X_train,
+                epochs=epochs,
+                validation_data=X_val,
+                callbacks=callbacks,
+                verbose=1
+            )
+        else:
+            validation_data = None
+            if X_val is not None and y_val is not None:
+                validation_data = (X_val, y_val)
+            
+            history = self.model.fit(
+                X_train, y_train,
+                epochs=epochs,
+                batch_size=batch_size,
+                validation_data=validation_data,
+                callbacks=callbacks,
+                verbose=1
+            )
         
         # Save the trained model
         self.model.save(self.config['model_path'])
         
+        # Unidirectional models also get a stateful serving export
+        if not self.config['bidirectional']:
+            self.export_streaming()
+        
         return history
     
+    def export_streaming(self, path=None):
+        """
+        Export the weights for NumPy serving that advances a patient's
+        recurrent state by one step per reading (see StreamingLSTM and
+        StaggeredState, which bounds the context to the training window).
+        
+        Args:
+            path (str, optional): Destination .npz file; defaults to a file
+                                  next to the model path
+            
+        Returns:
+            StreamingLSTM: The exported serving model
+        """
+        if path is None:
+            path = streaming_path(self.config['model_path'])
+        
+        streaming_model = StreamingLSTM.from_keras(
+            self.model, self.config['prediction_horizon'], self.config['feature_count']
+        )
+        streaming_model.save(path)
+        print(f"Streaming model exported to {path}")
+        return streaming_model
+    
     def predict(self, input_sequence):
         """
         Generate predictions for the input sequence.
         
         Args:
-            input_sequence (numpy.ndarray): Input sequence of shape 
-                                          [1, sequence_length, features]
+            input_sequence (numpy.ndarray): Input sequences of shape 
+                                          [samples, sequence_length, features]
                                           
         Returns:
             numpy.ndarray: Predicted values for the next prediction_horizon time steps
-                          Shape: [prediction_horizon, features]
+                          Shape: [samples, prediction_horizon, features]
         """
         if self.model is None:
             raise ValueError("Model not initialized. Please train or load a model first.")
         
-        # Make prediction
-        predictions = self.model.predict(input_sequence)
+        # Make prediction (predict_on_batch skips the per-call dataset setup of predict)
+        predictions = np.asarray(self.model.predict_on_batch(input_sequence))
         
         # Reshape to [prediction_horizon, features]
         return predictions.reshape((-1, self.config['prediction_horizon'], self.config['feature_count']))
@@ -194,6 +244,7 @@ class HealthcareLSTM:
         
         if os.path.exists(path):
             self.model = load_model(path)
+            self.pretrained = True
             print(f"Model loaded from {path}")
         else:
             print(f"No model found at {path}")
\ No newline at end of file
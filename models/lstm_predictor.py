@@ -2,11 +2,17 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import os
+import threading
 import tensorflow as tf
 
 # Import our custom LSTM model and data preprocessing utilities
 from models.lstm_model import HealthcareLSTM
-from utils.data_preprocessing import HealthcareDataPreprocessor
+from utils.data_preprocessing import HealthcareDataPreprocessor, VitalSignWindow, scaler_path
+from utils.training_service import train_lstm
+from utils.inference_queue import MicroBatchQueue
+from models.streaming_lstm import StreamingLSTM, StaggeredState, PatientStateCache, streaming_path
+from models.classical_forecaster import ClassicalForecaster
+from models.student_forecaster import StudentForecaster, distill
 
 class LSTMPredictor:
     """
@@ -16,12 +22,14 @@ class LSTMPredictor:
     based on historical data.
     """
     
-    def __init__(self, model_config=None):
+    def __init__(self, model_config=None, training_service=None):
         """
         Initialize the LSTM predictor.
         
         Args:
             model_config (dict, optional): Configuration for the LSTM model
+            training_service (TrainingService, optional): Service used to train
+                the model in a background process
         """
         # Default configuration
         self.config = {
@@ -35,7 +43,18 @@ class LSTMPredictor:
                 'oxygen_saturation'
             ],
             'model_path': 'models/saved_lstm_model',
-            'use_simulated_prediction': True  # Fall back to simulation if model not ready
+            'use_simulated_prediction': True,  # Fall back to simulation if model not ready
+            'micro_batching': True,     # Batch concurrent predictions into one model call
+            'max_batch_size': 64,
+            'max_wait_ms': 5,
+            'streaming': False,         # Serve a unidirectional model one reading at a time
+            'state_cache_size': 1000,   # Patients whose streaming state is kept
+            'state_ttl_seconds': 3600,  # Idle time after which a patient's state is dropped
+            'forecasting_engine': 'lstm',  # 'lstm', or 'holt' / 'ar' for the classical engine
+            'classical_context_length': 96,  # Readings used by the classical engine
+            'serving_model': 'lstm',    # 'lstm', or 'student' for the distilled compact model
+            'student_model_path': 'models/saved_student_model.keras',
+            'distillation_alpha': 0.8   # Weight of the teacher's predictions when re-distilling the student
         }
         
         # Update with provided config if any
@@ -49,23 +68,55 @@ class LSTMPredictor:
             feature_columns=self.config['feature_columns']
         )
         
-        # Initialize the LSTM model
-        self.lstm_model = HealthcareLSTM({
-            'sequence_length': self.config['sequence_length'],
-            'prediction_horizon': self.config['prediction_horizon'],
-            'feature_count': len(self.config['feature_columns']),
-            'model_path': self.config['model_path']
-        })
+        # Scalers are fitted at training time and kept fixed for inference
+        self.preprocessor.load_scalers(scaler_path(self._serving_path()))
+        
+        # Rolling input window per patient, updated as readings arrive
+        self.windows = {}
+        self._windows_lock = threading.Lock()
+        
+        # Initialize the LSTM model (or its distilled student)
+        self.lstm_model = self._create_serving_model()
         
         # Check if model is available or if we need to use simulation
+        # (a model that could not be loaded is replaced by an untrained one)
         self.model_available = (
             self.lstm_model.model is not None and 
-            os.path.exists(self.config['model_path'])
+            self.lstm_model.pretrained
         )
         
         if not self.model_available and not self.config['use_simulated_prediction']:
             raise ValueError("LSTM model not available and simulation is disabled.")
         
+        # Background training
+        self.training_service = training_service
+        
+        # Vectorized statistical engine, used instead of the LSTM when selected
+        self.classical_forecaster = None
+        if self.config['forecasting_engine'] != 'lstm':
+            self.classical_forecaster = ClassicalForecaster({
+                'method': self.config['forecasting_engine'],
+                'prediction_horizon': self.config['prediction_horizon'],
+                'context_length': self.config['classical_context_length']
+            })
+        
+        # Stateful serving model and per-patient recurrent state
+        self.streaming_model = self._load_streaming_model()
+        self.state_cache = PatientStateCache(self.config['state_cache_size'], self.config['state_ttl_seconds'])
+        
+        # Predictions per patient, keyed on the caller's history version
+        self.prediction_cache = {}
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        self._cache_lock = threading.Lock()
+        
+        # Concurrent callers (monitoring loop, request threads) share model calls
+        self.inference_queue = None
+        if self.config['micro_batching']:
+            self.inference_queue = MicroBatchQueue(self._predict_batch, {
+                'max_batch_size': self.config['max_batch_size'],
+                'max_wait_ms': self.config['max_wait_ms']
+            })
+        
         print(f"LSTM Predictor initialized. Using {'real model' if self.model_available else 'simulation mode'}.")
     
     def _simulated_predict(self, history):
@@ -147,47 +198,335 @@ class LSTMPredictor:
         
         return predictions
     
-    def predict(self, history):
+    def _model_config(self):
+        """Configuration for the underlying HealthcareLSTM."""
+        return {
+            'sequence_length': self.config['sequence_length'],
+            'prediction_horizon': self.config['prediction_horizon'],
+            'feature_count': len(self.config['feature_columns']),
+            'model_path': self.config['model_path'],
+            # Streaming needs a unidirectional model
+            'bidirectional': not self.config['streaming']
+        }
+    
+    def _serving_path(self):
+        """Path of the model used for predictions; its scalers are stored beside it."""
+        if self.config['serving_model'] == 'student':
+            return self.config['student_model_path']
+        return self.config['model_path']
+    
+    def _create_serving_model(self):
+        """Create the model used for predictions."""
+        if self.config['serving_model'] == 'student':
+            # The student has the same inputs and outputs as the teacher LSTM
+            return StudentForecaster({
+                'sequence_length': self.config['sequence_length'],
+                'prediction_horizon': self.config['prediction_horizon'],
+                'feature_count': len(self.config['feature_columns']),
+                'model_path': self.config['student_model_path']
+            })
+        return HealthcareLSTM(self._model_config())
+    
+    def _load_streaming_model(self):
+        """Load the exported streaming weights if streaming is enabled."""
+        path = streaming_path(self.config['model_path'])
+        if not self.config['streaming'] or self.config['serving_model'] != 'lstm' or not os.path.exists(path):
+            return None
+        return StreamingLSTM.load(path)
+    
+    def _streaming_forecast(self, history, patient_id, history_version):
+        """
+        Advance the patient's recurrent state with new readings and forecast.
+        
+        Args:
+            history (dict): Historical data dictionary
+            patient_id (str): Patient the history belongs to
+            history_version (int): Number of readings ever appended to the history
+            
+        Returns:
+            numpy.ndarray: Normalized predictions with shape (prediction_horizon, features)
+        """
+        n_samples = len(history['timestamps'])
+        sequence_length = self.config['sequence_length']
+        if n_samples < sequence_length:
+            raise ValueError(f"Not enough data points. Need at least {sequence_length} time steps.")
+        
+        with self._windows_lock:
+            if not self.preprocessor.scalers_fitted:
+                self.preprocessor.normalize_data(self.preprocessor.convert_to_dataframe(history))
+            
+            state = self.state_cache.get(patient_id)
+            if state is None or state.model is not self.streaming_model \
+                    or not 0 <= history_version - state.next_index <= n_samples:
+                # Both states restart within the last 2 * sequence_length readings,
+                # so replaying those rebuilds the state exactly (a shorter history
+                # starts both states at its first reading)
+                first_index = history_version - min(n_samples, 2 * sequence_length)
+                state = StaggeredState(self.streaming_model, sequence_length, first_index)
+            
+            new_readings = history_version - state.next_index
+            if new_readings > 0:
+                rows = np.column_stack(
+                    [history[feature][n_samples - new_readings:] for feature in self.config['feature_columns']]
+                ).astype(np.float32)
+                state.advance(self.preprocessor.transform_window(rows))
+            
+            self.state_cache.put(patient_id, state)
+            return state.forecast()
+    
+    def _get_window(self, patient_id):
+        """Get or create the rolling input window of a patient."""
+        window = self.windows.get(patient_id)
+        if window is None:
+            window = self.windows[patient_id] = VitalSignWindow(
+                self.config['sequence_length'], self.config['feature_columns']
+            )
+        return window
+    
+    def _predict_batch(self, input_sequences):
+        """
+        Run the model once for a group of queued input sequences.
+        
+        Args:
+            input_sequences (list): Arrays with shape (1, sequence_length, features)
+            
+        Returns:
+            numpy.ndarray: Predictions with shape (samples, prediction_horizon, features)
+        """
+        return self.lstm_model.predict(np.concatenate(input_sequences))
+    
+    def predict(self, history, patient_id='default', history_version=None):
         """
         Generate predictions for the next time steps of vital signs.
         
         Args:
             history (dict): Historical data dictionary
+            patient_id (str): Patient the history belongs to
+            history_version (int, optional): Number of readings ever appended to the
+                                             patient's history, advanced by the caller
+                                             with each new reading; when given,
+                                             predictions are reused until it changes
+                                             and new readings are found by it
             
         Returns:
             dict: Predicted values for each vital sign
         """
+        if history_version is None:
+            return self._predict(history, patient_id)
+        
+        predictions = self._cached_predictions(patient_id, history_version)
+        if predictions is None:
+            predictions = self._predict(history, patient_id, history_version)
+            self._cache_predictions(patient_id, history_version, predictions)
+        return predictions
+    
+    def _cached_predictions(self, patient_id, history_version):
+        """Cached predictions of a patient for this history version, or None."""
+        with self._cache_lock:
+            cached = self.prediction_cache.get(patient_id)
+            if cached is not None and cached[0] == history_version:
+                self.cache_stats['hits'] += 1
+                return cached[1]
+            self.cache_stats['misses'] += 1
+        return None
+    
+    def _cache_predictions(self, patient_id, history_version, predictions):
+        """Keep a patient's predictions until the history version changes."""
+        with self._cache_lock:
+            self.prediction_cache[patient_id] = (history_version, predictions)
+    
+    def get_cache_stats(self):
+        """Return prediction cache hit and miss counters."""
+        with self._cache_lock:
+            stats = dict(self.cache_stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+    
+    def clear_prediction_cache(self):
+        """Forget cached predictions, e.g. after the model changed."""
+        with self._cache_lock:
+            self.prediction_cache.clear()
+    
+    def _predict(self, history, patient_id, history_version=None):
+        """Compute predictions without consulting the cache."""
+        if self.classical_forecaster is not None:
+            return self._classical_predict_many({patient_id: history})[patient_id]
+        
         # Check if we should use the real model or simulation
         if not self.model_available or self.config['use_simulated_prediction']:
             return self._simulated_predict(history)
         
         try:
+            if self.streaming_model is not None and history_version is not None:
+                # O(1) per new reading, independent of the context length
+                prediction = self._streaming_forecast(history, patient_id, history_version)
+                return self._finish_predictions(self.preprocessor.inverse_transform_predictions(prediction), history)
+            
             # Preprocess the data
-            input_sequence = self.preprocessor.preprocess_real_time_data(history)
+            with self._windows_lock:
+                input_sequence = self.preprocessor.preprocess_real_time_data(
+                    history, self._get_window(patient_id), history_version
+                )
             
-            # Make prediction using the model
-            predictions_array = self.lstm_model.predict(input_sequence)
+            # Make prediction using the model, batched with other pending requests
+            if self.streaming_model is not None:
+                # Without a history version new readings cannot be told apart:
+                # replay the window from a zero state, as in training
+                prediction = self.streaming_model.predict(input_sequence)[0]
+            elif self.inference_queue is not None:
+                prediction = self.inference_queue.predict(input_sequence)
+            else:
+                prediction = self.lstm_model.predict(input_sequence)[0]
             
             # Convert predictions back to original scale
-            predictions = self.preprocessor.inverse_transform_predictions(predictions_array[0])
-            
-            # Add temperature predictions (if not included in the model)
-            if 'temperature' not in self.config['feature_columns']:
-                # Use simpler prediction for temperature
-                recent_temp = history['temperature'][-20:]
-                temp_trend = (recent_temp[-1] - recent_temp[-5]) / 5 if len(recent_temp) > 5 else 0
-                
-                predictions['temperature'] = []
-                for i in range(self.config['prediction_horizon']):
-                    next_temp = recent_temp[-1] + temp_trend * (i+1) + np.random.normal(0, 0.05)
-                    predictions['temperature'].append(round(next_temp, 1))
-                
-            return predictions
+            predictions = self.preprocessor.inverse_transform_predictions(prediction)
+            
+            return self._finish_predictions(predictions, history)
             
         except Exception as e:
             print(f"Error making LSTM prediction: {e}. Falling back to simulation.")
             return self._simulated_predict(history)
     
+    def predict_many(self, histories, history_versions=None):
+        """
+        Forecast many patients at once.
+        
+        The classical engine forecasts all patients in one vectorized call.
+        For the LSTM, every patient's input window is built first and all of
+        them are submitted to the micro-batching queue (or stacked into one
+        model call) before any result is awaited; streaming models advance
+        each patient's state by its new readings.
+        
+        Args:
+            histories (dict): Mapping of patient_id -> history dictionary
+            history_versions (dict, optional): Mapping of patient_id -> history
+                                               version (see predict); patients
+                                               with one use the prediction cache
+            
+        Returns:
+            dict: Mapping of patient_id -> predictions, in the same format as predict
+        """
+        history_versions = history_versions or {}
+        results = {}
+        missing = {}
+        for patient_id, history in histories.items():
+            version = history_versions.get(patient_id)
+            cached = None if version is None else self._cached_predictions(patient_id, version)
+            if cached is not None:
+                results[patient_id] = cached
+            else:
+                missing[patient_id] = history
+        
+        if self.classical_forecaster is not None:
+            computed = self._classical_predict_many(missing)
+        else:
+            computed = self._lstm_predict_many(missing, history_versions)
+        
+        for patient_id, predictions in computed.items():
+            version = history_versions.get(patient_id)
+            if version is not None:
+                self._cache_predictions(patient_id, version, predictions)
+            results[patient_id] = predictions
+        return {patient_id: results[patient_id] for patient_id in histories}
+    
+    def _lstm_predict_many(self, histories, history_versions):
+        """LSTM predictions for many patients, with one batched model call."""
+        if not histories:
+            return {}
+        if not self.model_available or self.config['use_simulated_prediction'] or self.streaming_model is not None:
+            # Simulation and streaming cost O(1) per patient; there is nothing to batch
+            return {patient_id: self._predict(history, patient_id, history_versions.get(patient_id))
+                    for patient_id, history in histories.items()}
+        
+        results = {}
+        input_sequences = {}
+        for patient_id, history in histories.items():
+            try:
+                with self._windows_lock:
+                    input_sequences[patient_id] = self.preprocessor.preprocess_real_time_data(
+                        history, self._get_window(patient_id), history_versions.get(patient_id)
+                    )
+            except Exception as e:
+                print(f"Error preparing LSTM input for {patient_id}: {e}. Falling back to simulation.")
+                results[patient_id] = self._simulated_predict(history)
+        
+        patient_ids = list(input_sequences)
+        try:
+            if self.inference_queue is not None:
+                # Submit everything before waiting, so the queue can batch it
+                futures = [self.inference_queue.submit(input_sequences[p]) for p in patient_ids]
+                predictions = [future.result() for future in futures]
+            elif patient_ids:
+                predictions = self.lstm_model.predict(np.concatenate([input_sequences[p] for p in patient_ids]))
+            else:
+                predictions = []
+        except Exception as e:
+            print(f"Error making LSTM predictions: {e}. Falling back to simulation.")
+            predictions = [None] * len(patient_ids)
+        
+        for patient_id, prediction in zip(patient_ids, predictions):
+            history = histories[patient_id]
+            if prediction is None:
+                results[patient_id] = self._simulated_predict(history)
+            else:
+                results[patient_id] = self._finish_predictions(
+                    self.preprocessor.inverse_transform_predictions(prediction), history
+                )
+        return results
+    
+    def _classical_predict_many(self, histories):
+        """Classical-engine forecasts of many patients in one vectorized call."""
+        if not histories:
+            return {}
+        forecaster = self.classical_forecaster
+        
+        # The classical engine also forecasts temperature directly
+        columns = list(self.config['feature_columns'])
+        if 'temperature' not in columns:
+            columns.append('temperature')
+        
+        patient_ids = list(histories)
+        try:
+            forecasts = forecaster.forecast(forecaster.history_array([histories[p] for p in patient_ids], columns))
+        except Exception as e:
+            print(f"Error making classical forecasts: {e}. Falling back to simulation.")
+            return {patient_id: self._simulated_predict(histories[patient_id]) for patient_id in patient_ids}
+        
+        # Round like the monitored readings (whole mmHg for blood pressure)
+        whole = np.isin(columns, ['blood_pressure_systolic', 'blood_pressure_diastolic'])
+        forecasts = np.where(whole, np.round(forecasts), np.round(forecasts, 1))
+        if 'oxygen_saturation' in columns:
+            o2 = columns.index('oxygen_saturation')
+            np.minimum(forecasts[:, :, o2], 100, out=forecasts[:, :, o2])
+        
+        results = {}
+        for p, patient_id in enumerate(patient_ids):
+            last_timestamp = datetime.strptime(histories[patient_id]['timestamps'][-1], "%Y-%m-%d %H:%M:%S")
+            predictions = {'timestamps': [
+                (last_timestamp + timedelta(seconds=3*i)).strftime("%Y-%m-%d %H:%M:%S")
+                for i in range(1, self.config['prediction_horizon'] + 1)
+            ]}
+            for i, column in enumerate(columns):
+                predictions[column] = forecasts[p, :, i].tolist()
+            results[patient_id] = predictions
+        
+        return results
+    
+    def _finish_predictions(self, predictions, history):
+        """Add temperature predictions (if not included in the model)."""
+        if 'temperature' not in self.config['feature_columns']:
+            # Use simpler prediction for temperature
+            recent_temp = history['temperature'][-20:]
+            temp_trend = (recent_temp[-1] - recent_temp[-5]) / 5 if len(recent_temp) > 5 else 0
+            
+            predictions['temperature'] = []
+            for i in range(self.config['prediction_horizon']):
+                next_temp = recent_temp[-1] + temp_trend * (i+1) + np.random.normal(0, 0.05)
+                predictions['temperature'].append(round(next_temp, 1))
+        
+        return predictions
+    
     def train_model(self, patient_data_history, epochs=50, batch_size=32):
         """
         Train the LSTM model on historical data.
@@ -201,13 +540,28 @@ class LSTMPredictor:
             batch_size (int): Batch size for training
             
         Returns:
-            bool: True if training was successful
+            bool: True if training was successful, or if it was queued on the
+                training service (the model is swapped in once published)
         """
+        if self.training_service is not None:
+            # Snapshot the history so the worker does not see it change
+            history_snapshot = {key: list(values) for key, values in patient_data_history.items()}
+            self.training_service.submit(
+                f'lstm-{id(self)}', train_lstm, self.config, history_snapshot, epochs, batch_size,
+                on_complete=self._publish_model
+            )
+            return True
+        
         try:
             from utils.model_training import ModelTrainer
             
+            # A served student is never fitted to the data directly: the teacher
+            # is trained and the student distilled from it
+            serves_student = self.config['serving_model'] == 'student'
+            teacher = HealthcareLSTM(self._model_config()) if serves_student else self.lstm_model
+            
             # Create model trainer
-            trainer = ModelTrainer(self.lstm_model, self.preprocessor)
+            trainer = ModelTrainer(teacher, self.preprocessor)
             
             # Prepare data
             X_train, y_train, X_val, y_val, X_test, y_test = trainer.prepare_data(
@@ -216,6 +570,18 @@ class LSTMPredictor:
             
             # Train model
             trainer.train_model(X_train, y_train, X_val, y_val, epochs, batch_size)
+            if serves_student:
+                distill(teacher, self.lstm_model, X_train, y_train, X_val, y_val,
+                        self.config['distillation_alpha'], epochs, batch_size)
+                self.preprocessor.save_scalers(scaler_path(self.config['model_path']))
+            
+            # Persist the scalers the model was trained with
+            self.preprocessor.save_scalers(scaler_path(self._serving_path()))
+            
+            # Pick up the streaming export written during training
+            self.streaming_model = self._load_streaming_model()
+            self.state_cache.clear()
+            self.clear_prediction_cache()
             
             # Evaluate model
             metrics = trainer.evaluate_model(X_test, y_test)
@@ -232,4 +598,29 @@ class LSTMPredictor:
             
         except Exception as e:
             print(f"Error training LSTM model: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    def _publish_model(self, metrics):
+        """
+        Load the model published by the training service and swap it in.
+        
+        Args:
+            metrics (dict): Evaluation metrics reported by the training job
+        """
+        lstm_model = self._create_serving_model()
+        preprocessor = HealthcareDataPreprocessor(
+            sequence_length=self.config['sequence_length'],
+            prediction_horizon=self.config['prediction_horizon'],
+            feature_columns=self.config['feature_columns']
+        )
+        preprocessor.load_scalers(scaler_path(self._serving_path()))
+        
+        # Predictions keep using the previous model until this assignment
+        self.preprocessor = preprocessor
+        self.lstm_model = lstm_model
+        self.streaming_model = self._load_streaming_model()
+        # Recurrent state and predictions from the previous weights are no longer valid
+        self.state_cache.clear()
+        self.clear_prediction_cache()
+        self.model_available = lstm_model.pretrained
+        print(f"LSTM model published by training service (test loss: {metrics.get('test_loss')})")
@@ -0,0 +1,274 @@
+import numpy as np
+from collections import deque
+from scipy import signal
+
+class StreamingQRSDetector:
+    """
+    Pan-Tompkins style QRS detector for continuous ECG.
+
+    Samples can be pushed in chunks of any length. The band-pass,
+    derivative and moving-window integration filters carry their state
+    across chunks, so a beat split over two chunks is detected like any
+    other. Peaks of the integrated signal are classified as QRS or noise
+    with adaptive thresholds. There is a refractory period, a T-wave slope
+    check and a searchback for missed beats.
+
+    A beat is emitted once the signal has advanced one refractory period
+    past it, with its R-peak position located in the raw signal and the
+    PR-baseline and ST-segment levels around it.
+    """
+
+    def __init__(self, sampling_rate=125, config=None):
+        """
+        Initialize the detector.
+
+        Args:
+            sampling_rate (int): ECG sampling rate in Hz
+            config (dict, optional): Configuration parameters (times in seconds):
+                - low_cutoff / high_cutoff: Band-pass edges in Hz
+                - filter_order: Butterworth order of the band-pass
+                - integration_window: Moving-window integration length
+                - refractory_period: Minimum time between beats
+                - t_wave_window: Time after a beat in which a peak may be a T wave
+                - learning_period: Signal used to initialize the thresholds
+                - searchback_factor: Missed-beat search after this many average RR intervals
+                - pr_window / st_window: Baseline and ST windows relative to the R peak
+                - beat_window: Raw waveform returned with each beat, relative to the R peak
+                  (it must end within the refractory period, which has been seen at emission)
+                - buffer_seconds: Recent signal kept for R-peak location and searchback
+        """
+        self.sampling_rate = sampling_rate
+
+        # Default configuration
+        self.config = {
+            'low_cutoff': 5.0,
+            'high_cutoff': 15.0,
+            'filter_order': 2,
+            'integration_window': 0.15,
+            'refractory_period': 0.2,
+            't_wave_window': 0.36,
+            'learning_period': 2.0,
+            'searchback_factor': 1.66,
+            'pr_window': (-0.08, -0.04),
+            'st_window': (0.08, 0.12),
+            'beat_window': (-0.2, 0.2),
+            'buffer_seconds': 5.0,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        nyquist = sampling_rate / 2
+        high_cutoff = min(self.config['high_cutoff'], 0.9 * nyquist)
+        self._sos = signal.butter(self.config['filter_order'],
+                                  [self.config['low_cutoff'] / nyquist, high_cutoff / nyquist],
+                                  btype='bandpass', output='sos')
+
+        # Causal five-point derivative
+        self._derivative = np.array([1.0, 2.0, 0.0, -2.0, -1.0]) * sampling_rate / 8
+
+        width = max(1, int(round(self.config['integration_window'] * sampling_rate)))
+        self._integration = np.full(width, 1.0 / width)
+
+        self._refractory = max(1, int(round(self.config['refractory_period'] * sampling_rate)))
+        self._t_wave = int(round(self.config['t_wave_window'] * sampling_rate))
+        self._learning = int(round(self.config['learning_period'] * sampling_rate))
+        self._buffer_size = max(int(self.config['buffer_seconds'] * sampling_rate), 4 * self._refractory + width)
+
+        # The R peak lies within the integration window (plus filter delay) before the integrated peak
+        self._r_search = width + int(round(0.05 * sampling_rate))
+
+        self.reset()
+
+    def reset(self):
+        """Forget all signal history and adaptive state."""
+        self._bandpass_state = np.zeros((self._sos.shape[0], 2))
+        self._derivative_state = np.zeros(len(self._derivative) - 1)
+        self._integration_state = np.zeros(len(self._integration) - 1)
+
+        self.samples_seen = 0
+        self._buffer_start = 0
+        self._raw = np.empty(0)
+        self._slope = np.empty(0)
+        self._integrated = np.empty(0)
+        self._scan_from = 1
+
+        self.initialized = False
+        self.signal_level = 0.0
+        self.noise_level = 0.0
+        self._last_qrs = None
+        self._last_qrs_slope = None
+        self._last_r = None
+        self._noise_peaks = []
+        self._rr = deque(maxlen=8)
+
+    @property
+    def threshold(self):
+        """Current detection threshold on the integrated signal."""
+        return self.noise_level + 0.25 * (self.signal_level - self.noise_level)
+
+    def process(self, samples):
+        """
+        Push a chunk of ECG samples.
+
+        Args:
+            samples (array-like): New samples, in order
+
+        Returns:
+            list: Beats confirmed by this chunk, in order. Each beat is a dict with
+                  'sample' (index of the R peak since the start of the stream),
+                  'time' (seconds), 'rr' (seconds since the previous beat, or None),
+                  'amplitude', 'baseline' and 'st_level' (raw signal units) and
+                  'waveform' (raw samples in beat_window); the last three are
+                  None near the start of the stream
+        """
+        samples = np.asarray(samples, dtype=float).ravel()
+        if len(samples) == 0:
+            return []
+
+        filtered, self._bandpass_state = signal.sosfilt(self._sos, samples, zi=self._bandpass_state)
+        slope, self._derivative_state = signal.lfilter(self._derivative, 1.0, filtered,
+                                                       zi=self._derivative_state)
+        integrated, self._integration_state = signal.lfilter(self._integration, 1.0, slope ** 2,
+                                                             zi=self._integration_state)
+
+        self._raw = np.concatenate((self._raw, samples))
+        self._slope = np.concatenate((self._slope, np.abs(slope)))
+        self._integrated = np.concatenate((self._integrated, integrated))
+        self.samples_seen += len(samples)
+
+        beats = []
+        if not self.initialized:
+            if self.samples_seen < self._learning:
+                return beats
+            learning = self._integrated[:self._learning]
+            self.signal_level = 0.25 * learning.max()
+            self.noise_level = 0.5 * learning.mean()
+            self.initialized = True
+
+        # Peaks are final once a refractory period of signal follows them
+        stop = self.samples_seen - self._refractory
+        for peak in self._dominant_peaks(self._scan_from, stop):
+            self._searchback(peak, beats)
+            self._classify(peak, beats)
+        self._searchback(stop, beats)
+        self._scan_from = max(self._scan_from, stop)
+
+        # Keep only the recent signal
+        excess = len(self._raw) - self._buffer_size
+        if excess > 0:
+            self._raw = self._raw[excess:]
+            self._slope = self._slope[excess:]
+            self._integrated = self._integrated[excess:]
+            self._buffer_start += excess
+
+        return beats
+
+    def _dominant_peaks(self, start, stop):
+        """Local maxima of the integrated signal in [start, stop) that dominate their refractory neighbourhood."""
+        offset = self._buffer_start
+        start = max(start, offset + 1)
+        if stop <= start:
+            return []
+
+        integrated = self._integrated
+        i = np.arange(start - offset, stop - offset)
+        local = (integrated[i] > integrated[i - 1]) & (integrated[i] >= integrated[i + 1])
+        peaks = []
+        for index in i[local]:
+            lo = max(0, index - self._refractory)
+            window = integrated[lo:index + self._refractory + 1]
+            # First maximum of the neighbourhood, so a flat top yields one peak
+            if lo + np.argmax(window) == index:
+                peaks.append(index + offset)
+        return peaks
+
+    def _classify(self, peak, beats):
+        """Classify one integrated-signal peak as QRS or noise."""
+        value = self._integrated[peak - self._buffer_start]
+        slope = self._peak_slope(peak)
+
+        if value < self.threshold:
+            self.noise_level = 0.125 * value + 0.875 * self.noise_level
+            self._noise_peaks.append(peak)
+            return
+
+        if self._last_qrs is not None:
+            since_last = peak - self._last_qrs
+            if since_last < self._refractory:
+                return
+            # A peak shortly after a beat with a much flatter slope is a T wave
+            if since_last < self._t_wave and slope < 0.5 * self._last_qrs_slope:
+                self.noise_level = 0.125 * value + 0.875 * self.noise_level
+                self._noise_peaks.append(peak)
+                return
+
+        self.signal_level = 0.125 * value + 0.875 * self.signal_level
+        self._accept(peak, slope, beats)
+
+    def _searchback(self, position, beats):
+        """Recover a missed beat when no QRS was found for too long before position."""
+        if self._last_qrs is None or len(self._rr) == 0:
+            return
+        limit = self.config['searchback_factor'] * np.mean(self._rr) * self.sampling_rate
+        if position - self._last_qrs <= limit:
+            return
+
+        candidates = [
+            peak for peak in self._noise_peaks
+            if peak - self._last_qrs >= self._refractory and peak >= self._buffer_start
+            and self._integrated[peak - self._buffer_start] >= 0.5 * self.threshold
+        ]
+        if not candidates:
+            return
+
+        peak = max(candidates, key=lambda p: self._integrated[p - self._buffer_start])
+        value = self._integrated[peak - self._buffer_start]
+        self.signal_level = 0.25 * value + 0.75 * self.signal_level
+        self._accept(peak, self._peak_slope(peak), beats)
+
+    def _peak_slope(self, peak):
+        """Maximum absolute slope in the integration window before an integrated peak."""
+        index = peak - self._buffer_start
+        return self._slope[max(0, index - len(self._integration)):index + 1].max()
+
+    def _accept(self, peak, slope, beats):
+        """Record a QRS at an integrated-signal peak and emit its beat."""
+        self._last_qrs = peak
+        self._last_qrs_slope = slope
+        self._noise_peaks = []
+
+        # R peak: largest deflection from the local median of the raw signal
+        lo = max(self._buffer_start, peak - self._r_search)
+        window = self._raw[lo - self._buffer_start:peak - self._buffer_start + 1]
+        r_peak = lo + int(np.argmax(np.abs(window - np.median(window))))
+
+        rr = None
+        if self._last_r is not None and r_peak > self._last_r:
+            rr = (r_peak - self._last_r) / self.sampling_rate
+            self._rr.append(rr)
+        self._last_r = r_peak
+
+        beats.append({
+            'sample': r_peak,
+            'time': r_peak / self.sampling_rate,
+            'rr': rr,
+            'amplitude': float(self._raw[r_peak - self._buffer_start]),
+            'baseline': self._segment_level(r_peak, self.config['pr_window']),
+            'st_level': self._segment_level(r_peak, self.config['st_window']),
+            'waveform': self._segment(r_peak, self.config['beat_window'])
+        })
+
+    def _segment(self, r_peak, window):
+        """Raw samples in a window relative to the R peak, or None if outside the buffer."""
+        start = r_peak + int(round(window[0] * self.sampling_rate)) - self._buffer_start
+        stop = r_peak + int(round(window[1] * self.sampling_rate)) - self._buffer_start
+        if start < 0 or stop > len(self._raw) or stop <= start:
+            return None
+        return self._raw[start:stop].copy()
+
+    def _segment_level(self, r_peak, window):
+        """Mean raw level in a window relative to the R peak, or None if outside the buffer."""
+        segment = self._segment(r_peak, window)
+        return None if segment is None else float(np.mean(segment))
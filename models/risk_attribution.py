@@ -0,0 +1,202 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from math import factorial
+
+# Vital sign inputs of the risk score that attributions are computed for
+ATTRIBUTION_FEATURES = ['heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+                        'respiratory_rate', 'oxygen_saturation', 'temperature']
+
+
+def shapley_weights(n_features):
+    """
+    Matrix turning coalition values into exact Shapley values.
+
+    Coalition c is the bitmask of the features that take the patient's value
+    (the rest keep the baseline). For values v of all 2^n coalitions,
+    weights @ v gives each feature's Shapley value: the weighted sum of
+    v(S + i) - v(S) over all coalitions S without feature i.
+
+    Returns:
+        numpy.ndarray: Weights of shape (n_features, 2 ** n_features)
+    """
+    coalitions = np.arange(2 ** n_features)
+    members = (coalitions[None, :] >> np.arange(n_features)[:, None]) & 1
+    sizes = members.sum(axis=0)
+    # |S|! (n - |S| - 1)! / n! for a coalition S of each size
+    weight = np.array([factorial(size) * factorial(n_features - size - 1) / factorial(n_features)
+                       for size in range(n_features)] + [0.0])
+    # A coalition containing i is S + i (weight of S = coalition minus i); one without i is S
+    return np.where(members == 1, weight[np.maximum(sizes - 1, 0)], -weight[sizes])
+
+
+class RiskAttributor:
+    """
+    Exact Shapley attribution of the vital-sign risk score to its inputs.
+
+    The value of a coalition of features is the risk RiskCalculator gives a
+    reading in which those features take the patient's values and the others
+    a normal baseline. With six vital signs there are only 64 coalitions, so
+    all of them are scored in one calculate_risk_batch call and the Shapley
+    values are a single matrix product. Readings are quantized to the
+    resolution the vitals are reported in, and attributions are cached per
+    quantized reading (and rule table version), so an unchanged patient costs
+    a dictionary lookup.
+
+    The anomaly and prediction-trend terms of the risk score do not depend on
+    the current reading alone and are not attributed.
+    """
+
+    def __init__(self, risk_calculator, config=None):
+        """
+        Initialize the attributor.
+
+        Args:
+            risk_calculator (RiskCalculator): Risk model to explain
+            config (dict, optional): Configuration parameters:
+                - baseline: Normal reading that absent features take
+                - resolution: Quantization step per feature (1 / an integer)
+                - cache_size: Quantized readings whose attributions are kept
+        """
+        self.risk_calculator = risk_calculator
+
+        # Default configuration
+        self.config = {
+            'baseline': {
+                'heart_rate': 75,
+                'blood_pressure_systolic': 120,
+                'blood_pressure_diastolic': 80,
+                'respiratory_rate': 16,
+                'oxygen_saturation': 98,
+                'temperature': 98.6
+            },
+            # Vitals are reported to 0.1, and the rule bounds cut between such values
+            'resolution': {
+                'heart_rate': 0.1,
+                'blood_pressure_systolic': 0.1,
+                'blood_pressure_diastolic': 0.1,
+                'respiratory_rate': 0.1,
+                'oxygen_saturation': 0.1,
+                'temperature': 0.1
+            },
+            'cache_size': 4096,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        n_features = len(ATTRIBUTION_FEATURES)
+        self._weights = shapley_weights(n_features)
+        coalitions = np.arange(2 ** n_features)
+        self._members = ((coalitions[:, None] >> np.arange(n_features)) & 1).astype(bool)
+        self._baseline = np.array([self.config['baseline'][feature] for feature in ATTRIBUTION_FEATURES], dtype=float)
+        # Quantization steps per unit; dividing by them recovers exact decimals (1010 / 10 == 101.0)
+        self._steps = np.round(1 / np.array([self.config['resolution'][feature]
+                                            for feature in ATTRIBUTION_FEATURES], dtype=float))
+
+        self._cache = OrderedDict()
+        self.cache_stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def _quantize(self, reading):
+        """Reading as a tuple of integers in units of the feature resolutions."""
+        values = np.array([
+            reading['blood_pressure'][0] if feature == 'blood_pressure_systolic'
+            else reading['blood_pressure'][1] if feature == 'blood_pressure_diastolic'
+            else reading[feature]
+            for feature in ATTRIBUTION_FEATURES
+        ], dtype=float)
+        return tuple(np.round(values * self._steps).astype(int).tolist())
+
+    def attribute(self, reading):
+        """
+        Shapley values of one reading.
+
+        Args:
+            reading (dict): Vital signs as passed to RiskCalculator.calculate_risk
+
+        Returns:
+            dict: 'base_value' (risk of the baseline), 'risk' (vital-sign risk of
+                  the reading) and 'contributions' (feature -> Shapley value; they
+                  sum to risk - base_value)
+        """
+        return self.attribute_many([reading])[0]
+
+    def attribute_many(self, readings):
+        """
+        Shapley values of many readings, with all uncached ones scored in one batch.
+
+        Args:
+            readings (list): Vital sign dictionaries
+
+        Returns:
+            list: One result per reading (see attribute)
+        """
+        version = self.risk_calculator.rules.version
+        keys = [(version, self._quantize(reading)) for reading in readings]
+
+        results = {}
+        with self._lock:
+            for key in keys:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self.cache_stats['hits'] += 1
+                    results[key] = cached
+                else:
+                    self.cache_stats['misses'] += 1
+        missing = list(dict.fromkeys(key for key in keys if key not in results))
+
+        if missing:
+            computed = self._compute([key[1] for key in missing])
+            with self._lock:
+                for key, result in zip(missing, computed):
+                    self._cache[key] = results[key] = result
+                while len(self._cache) > self.config['cache_size']:
+                    self._cache.popitem(last=False)
+
+        return [results[key] for key in keys]
+
+    def _compute(self, quantized):
+        """Score every coalition of every reading in one batch and apply the Shapley weights."""
+        values = np.array(quantized, dtype=float) / self._steps
+        n_readings, n_coalitions = len(values), len(self._members)
+
+        # Rows (reading, coalition): the reading's values where the coalition has them, else baseline
+        rows = np.where(self._members[None, :, :], values[:, None, :], self._baseline)
+        rows = rows.reshape(n_readings * n_coalitions, -1)
+        current_data = {
+            'heart_rate': rows[:, 0],
+            'blood_pressure': rows[:, 1:3],
+            'respiratory_rate': rows[:, 3],
+            'oxygen_saturation': rows[:, 4],
+            'temperature': rows[:, 5]
+        }
+        no_predictions = np.empty((len(rows), 0))
+        risk, _ = self.risk_calculator.calculate_risk_batch(
+            current_data, {'heart_rate': no_predictions, 'oxygen_saturation': no_predictions},
+            include_factors=False
+        )
+
+        coalition_values = risk.reshape(n_readings, n_coalitions)
+        shapley = coalition_values @ self._weights.T
+        # Features that never change the score get exact zeros, not cancellation noise
+        shapley[np.abs(shapley) < 1e-12] = 0.0
+        return [
+            {
+                'base_value': float(coalition_values[i, 0]),
+                'risk': float(coalition_values[i, -1]),
+                'contributions': dict(zip(ATTRIBUTION_FEATURES, shapley[i].tolist()))
+            }
+            for i in range(n_readings)
+        ]
+
+    def get_cache_stats(self):
+        """Return attribution cache hit and miss counters."""
+        with self._lock:
+            stats = dict(self.cache_stats)
+            stats['size'] = len(self._cache)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
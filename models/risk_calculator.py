@@ -1,10 +1,18 @@
 import numpy as np
-import json
+
+from models.clinical_rules import FEATURES, get_rule_engine
 
 class RiskCalculator:
     """Calculate health risk scores based on vital signs and anomaly detection"""
     
-    def __init__(self):
+    def __init__(self, rule_engine=None):
+        """
+        Initialize the calculator.
+        
+        Args:
+            rule_engine (ClinicalRuleEngine, optional): Threshold rules (default:
+                                                        the shared engine)
+        """
         # Risk weights for different vital signs
         self.weights = {
             'heart_rate': 0.2,
@@ -14,70 +22,55 @@ class RiskCalculator:
             'temperature': 0.2
         }
         
-        # Set thresholds for severe risk conditions
-        self.severe_thresholds = {
-            'heart_rate_high': 120,
-            'heart_rate_low': 50,
-            'blood_pressure_systolic_high': 160,
-            'blood_pressure_systolic_low': 90,
-            'blood_pressure_diastolic_high': 100,
-            'blood_pressure_diastolic_low': 50,
-            'respiratory_rate_high': 24,
-            'respiratory_rate_low': 10,
-            'oxygen_saturation_low': 92,
-            'temperature_high': 101,
-            'temperature_low': 95
-        }
+        # Component risks and severe thresholds come from the clinical rule table
+        self.rules = rule_engine or get_rule_engine()
+    
+    @property
+    def severe_thresholds(self):
+        """Thresholds of the severe risk factors, e.g. 'heart_rate_high' and 'heart_rate_low'"""
+        thresholds = {}
+        for feature in FEATURES:
+            for tier in self.rules.tiers('severe_factors', feature):
+                if 'above' in tier:
+                    thresholds.setdefault(f"{feature}_high", tier['above'])
+                if 'below' in tier:
+                    thresholds.setdefault(f"{feature}_low", tier['below'])
+        return thresholds
     
     def calculate_risk(self, current_data, predictions, anomaly_results):
         """Calculate overall health risk score and identify contributing factors"""
         risk_score = 0
-        risk_factors = []
+        thresholds = self.severe_thresholds
+        values = {
+            'heart_rate': current_data['heart_rate'],
+            'blood_pressure_systolic': current_data['blood_pressure'][0],
+            'blood_pressure_diastolic': current_data['blood_pressure'][1],
+            'respiratory_rate': current_data['respiratory_rate'],
+            'oxygen_saturation': current_data['oxygen_saturation'],
+            'temperature': current_data['temperature']
+        }
         
         # Evaluate current vital signs
-        hr_risk = self._evaluate_heart_rate(current_data['heart_rate'])
-        risk_score += hr_risk * self.weights['heart_rate']
-        if hr_risk > 0.6:
-            if current_data['heart_rate'] > self.severe_thresholds['heart_rate_high']:
-                risk_factors.append(f"Elevated heart rate: {current_data['heart_rate']} BPM")
-            elif current_data['heart_rate'] < self.severe_thresholds['heart_rate_low']:
-                risk_factors.append(f"Low heart rate: {current_data['heart_rate']} BPM")
-        
-        bp_risk = self._evaluate_blood_pressure(current_data['blood_pressure'][0], 
-                                               current_data['blood_pressure'][1])
-        risk_score += bp_risk * self.weights['blood_pressure']
-        if bp_risk > 0.6:
-            systolic, diastolic = current_data['blood_pressure']
-            if systolic > self.severe_thresholds['blood_pressure_systolic_high']:
-                risk_factors.append(f"Elevated systolic pressure: {systolic} mmHg")
-            elif systolic < self.severe_thresholds['blood_pressure_systolic_low']:
-                risk_factors.append(f"Low systolic pressure: {systolic} mmHg")
-            if diastolic > self.severe_thresholds['blood_pressure_diastolic_high']:
-                risk_factors.append(f"Elevated diastolic pressure: {diastolic} mmHg")
-            elif diastolic < self.severe_thresholds['blood_pressure_diastolic_low']:
-                risk_factors.append(f"Low diastolic pressure: {diastolic} mmHg")
-        
-        rr_risk = self._evaluate_respiratory_rate(current_data['respiratory_rate'])
-        risk_score += rr_risk * self.weights['respiratory_rate']
-        if rr_risk > 0.6:
-            if current_data['respiratory_rate'] > self.severe_thresholds['respiratory_rate_high']:
-                risk_factors.append(f"Elevated respiratory rate: {current_data['respiratory_rate']} breaths/min")
-            elif current_data['respiratory_rate'] < self.severe_thresholds['respiratory_rate_low']:
-                risk_factors.append(f"Low respiratory rate: {current_data['respiratory_rate']} breaths/min")
-        
-        ox_risk = self._evaluate_oxygen_saturation(current_data['oxygen_saturation'])
-        risk_score += ox_risk * self.weights['oxygen_saturation']
-        if ox_risk > 0.6:
-            if current_data['oxygen_saturation'] < self.severe_thresholds['oxygen_saturation_low']:
-                risk_factors.append(f"Low oxygen saturation: {current_data['oxygen_saturation']}%")
-        
-        temp_risk = self._evaluate_temperature(current_data['temperature'])
-        risk_score += temp_risk * self.weights['temperature']
-        if temp_risk > 0.6:
-            if current_data['temperature'] > self.severe_thresholds['temperature_high']:
-                risk_factors.append(f"Elevated temperature: {current_data['temperature']}°F")
-            elif current_data['temperature'] < self.severe_thresholds['temperature_low']:
-                risk_factors.append(f"Low temperature: {current_data['temperature']}°F")
+        severity = self.rules.evaluate_one('severity', values)
+        risks = {
+            'heart_rate': severity['heart_rate'][0],
+            'blood_pressure': max(severity['blood_pressure_systolic'][0],
+                                  severity['blood_pressure_diastolic'][0]),
+            'respiratory_rate': severity['respiratory_rate'][0],
+            'oxygen_saturation': severity['oxygen_saturation'][0],
+            'temperature': severity['temperature'][0]
+        }
+        for key, risk in risks.items():
+            risk_score += risk * self.weights[key]
+        
+        # Severe components name their factor
+        risk_factors = []
+        for feature, (_, tier) in self.rules.evaluate_one('severe_factors', values).items():
+            component = 'blood_pressure' if feature.startswith('blood_pressure') else feature
+            if risks[component] > 0.6:
+                message = self.rules.message('severe_factors', feature, tier, values)
+                if message is not None:
+                    risk_factors.append(message)
         
         # Consider anomaly detection results
         if 'scores' in anomaly_results:
@@ -92,19 +85,18 @@ class RiskCalculator:
         
         # Consider prediction trends
         hr_prediction_risk = self._evaluate_prediction_trend(predictions['heart_rate'], 
-                                                            self.severe_thresholds['heart_rate_high'],
-                                                            self.severe_thresholds['heart_rate_low'])
+                                                            thresholds['heart_rate_high'],
+                                                            thresholds['heart_rate_low'])
         if hr_prediction_risk > 0.5:
             risk_score += hr_prediction_risk * 0.05
-            if predictions['heart_rate'][-1] > self.severe_thresholds['heart_rate_high']:
+            if predictions['heart_rate'][-1] > thresholds['heart_rate_high']:
                 risk_factors.append("Predicted increasing heart rate trend")
-            elif predictions['heart_rate'][-1] < self.severe_thresholds['heart_rate_low']:
+            elif predictions['heart_rate'][-1] < thresholds['heart_rate_low']:
                 risk_factors.append("Predicted decreasing heart rate trend")
         
-        # Add other prediction evaluations...
         ox_prediction_risk = self._evaluate_prediction_trend(predictions['oxygen_saturation'], 
                                                            100, 
-                                                           self.severe_thresholds['oxygen_saturation_low'],
+                                                           thresholds['oxygen_saturation_low'],
                                                            decreasing_is_bad=True)
         if ox_prediction_risk > 0.5:
             risk_score += ox_prediction_risk * 0.1
@@ -115,76 +107,141 @@ class RiskCalculator:
         
         return risk_score, risk_factors
     
-    def _evaluate_heart_rate(self, heart_rate):
-        """Evaluate heart rate risk on a 0-1 scale"""
-        if heart_rate > 150 or heart_rate < 40:
-            return 1.0  # Severe risk
-        elif heart_rate > 120 or heart_rate < 50:
-            return 0.7  # High risk
-        elif heart_rate > 100 or heart_rate < 60:
-            return 0.3  # Moderate risk
-        else:
-            return 0.0  # Normal
-    
-    def _evaluate_blood_pressure(self, systolic, diastolic):
-        """Evaluate blood pressure risk on a 0-1 scale"""
-        # Evaluate systolic
-        if systolic > 180 or systolic < 80:
-            systolic_risk = 1.0
-        elif systolic > 160 or systolic < 90:
-            systolic_risk = 0.7
-        elif systolic > 140 or systolic < 100:
-            systolic_risk = 0.3
-        else:
-            systolic_risk = 0.0
-        
-        # Evaluate diastolic
-        if diastolic > 120 or diastolic < 40:
-            diastolic_risk = 1.0
-        elif diastolic > 100 or diastolic < 50:
-            diastolic_risk = 0.7
-        elif diastolic > 90 or diastolic < 60:
-            diastolic_risk = 0.3
-        else:
-            diastolic_risk = 0.0
+    def calculate_risk_batch(self, current_data, predictions, anomaly_scores=None, anomaly_order=None,
+                             include_factors=True):
+        """
+        Calculate risk scores and factors for many patients at once.
         
-        # Take the higher risk level
-        return max(systolic_risk, diastolic_risk)
-    
-    def _evaluate_respiratory_rate(self, respiratory_rate):
-        """Evaluate respiratory rate risk on a 0-1 scale"""
-        if respiratory_rate > 30 or respiratory_rate < 8:
-            return 1.0
-        elif respiratory_rate > 24 or respiratory_rate < 10:
-            return 0.7
-        elif respiratory_rate > 20 or respiratory_rate < 12:
-            return 0.3
-        else:
-            return 0.0
-    
-    def _evaluate_oxygen_saturation(self, oxygen_saturation):
-        """Evaluate oxygen saturation risk on a 0-1 scale"""
-        if oxygen_saturation < 85:
-            return 1.0
-        elif oxygen_saturation < 90:
-            return 0.8
-        elif oxygen_saturation < 92:
-            return 0.6
-        elif oxygen_saturation < 95:
-            return 0.3
-        else:
-            return 0.0
+        Inputs are struct-of-arrays versions of calculate_risk's (see
+        stack_risk_inputs). Component risks and severe factors come from the
+        clinical rule table, evaluated over all rows at once. Factor strings
+        are only built for rows where a threshold is crossed. Results match
+        calculate_risk row for row.
+        
+        Args:
+            current_data (dict): 'heart_rate', 'respiratory_rate',
+                                 'oxygen_saturation' and 'temperature' arrays of
+                                 shape (n,) and 'blood_pressure' of shape (n, 2)
+            predictions (dict): 'heart_rate' and 'oxygen_saturation' arrays of
+                                shape (n, horizon)
+            anomaly_scores (dict, optional): Anomaly score name -> array of shape
+                                             (n,), NaN where a patient has no score
+            anomaly_order (numpy.ndarray, optional): Per row, the indices into the
+                                                     anomaly_scores names in the
+                                                     order the patient's scores
+                                                     are applied, padded with -1,
+                                                     shape (n, scores); default:
+                                                     every row in dict order
+            include_factors (bool): Build the factor lists; without them only
+                                    the scores are computed (factors are None)
+            
+        Returns:
+            tuple: (risk_scores array of shape (n,), list of risk factor lists)
+        """
+        blood_pressure = np.asarray(current_data['blood_pressure'])
+        values = {
+            'heart_rate': np.asarray(current_data['heart_rate']),
+            'blood_pressure_systolic': blood_pressure[:, 0],
+            'blood_pressure_diastolic': blood_pressure[:, 1],
+            'respiratory_rate': np.asarray(current_data['respiratory_rate']),
+            'oxygen_saturation': np.asarray(current_data['oxygen_saturation']),
+            'temperature': np.asarray(current_data['temperature'])
+        }
+        thresholds = self.severe_thresholds
+        
+        # Current vital signs
+        severity = self.rules.evaluate('severity', values)
+        hr_risk = severity['heart_rate']['scores']
+        bp_risk = np.maximum(severity['blood_pressure_systolic']['scores'],
+                             severity['blood_pressure_diastolic']['scores'])
+        rr_risk = severity['respiratory_rate']['scores']
+        ox_risk = severity['oxygen_saturation']['scores']
+        temp_risk = severity['temperature']['scores']
+        
+        risk_scores = np.zeros(len(hr_risk))
+        risk_scores = risk_scores + hr_risk * self.weights['heart_rate']
+        risk_scores = risk_scores + bp_risk * self.weights['blood_pressure']
+        risk_scores = risk_scores + rr_risk * self.weights['respiratory_rate']
+        risk_scores = risk_scores + ox_risk * self.weights['oxygen_saturation']
+        risk_scores = risk_scores + temp_risk * self.weights['temperature']
+        
+        # Severe components name their factor
+        gates = {
+            'heart_rate': hr_risk > 0.6,
+            'blood_pressure_systolic': bp_risk > 0.6,
+            'blood_pressure_diastolic': bp_risk > 0.6,
+            'respiratory_rate': rr_risk > 0.6,
+            'oxygen_saturation': ox_risk > 0.6,
+            'temperature': temp_risk > 0.6
+        }
+        risk_factors = None
+        if include_factors:
+            risk_factors = self.rules.messages('severe_factors', values,
+                                               self.rules.evaluate('severe_factors', values), gates)
+        
+        # Further risk factors as (rows, message), in calculate_risk's order
+        flags = []
+        
+        # Anomaly detection results, applied in each patient's own order
+        names = list(anomaly_scores or {})
+        if names:
+            stacked = np.array([np.asarray(anomaly_scores[key], dtype=float) for key in names]).T
+            rows = np.arange(len(stacked))
+            if anomaly_order is None:
+                anomaly_order = np.tile(np.arange(len(names)), (len(stacked), 1))
+            for slot in np.asarray(anomaly_order, dtype=int).T:
+                scores = np.where(slot >= 0, stacked[rows, np.maximum(slot, 0)], np.nan)
+                anomalous = scores < -0.2  # NaN (no score) is never anomalous
+                anomaly_contribution = ((-scores) - 0.2) * 2
+                risk_scores = np.where(anomalous, risk_scores + anomaly_contribution * 0.1, risk_scores)
+                for index, key in enumerate(names):
+                    flags.append((anomalous & (slot == index),
+                                  f"Unusual pattern detected in {key.replace('_', ' ')}"))
+        
+        # Prediction trends
+        hr_predictions = np.asarray(predictions['heart_rate'], dtype=float)
+        hr_prediction_risk = self._evaluate_prediction_trend_batch(hr_predictions,
+                                                             thresholds['heart_rate_high'],
+                                                             thresholds['heart_rate_low'])
+        hr_trend = hr_prediction_risk > 0.5
+        risk_scores = np.where(hr_trend, risk_scores + hr_prediction_risk * 0.05, risk_scores)
+        if hr_predictions.shape[1] > 0:
+            hr_last = hr_predictions[:, -1]
+            hr_rising = hr_last > thresholds['heart_rate_high']
+            flags.append((hr_trend & hr_rising, "Predicted increasing heart rate trend"))
+            flags.append((hr_trend & ~hr_rising & (hr_last < thresholds['heart_rate_low']),
+                          "Predicted decreasing heart rate trend"))
+        
+        ox_prediction_risk = self._evaluate_prediction_trend_batch(
+            np.asarray(predictions['oxygen_saturation'], dtype=float),
+            100, thresholds['oxygen_saturation_low'], decreasing_is_bad=True
+        )
+        ox_trend = ox_prediction_risk > 0.5
+        risk_scores = np.where(ox_trend, risk_scores + ox_prediction_risk * 0.1, risk_scores)
+        flags.append((ox_trend, "Predicted decreasing oxygen saturation trend"))
+        
+        # Cap risk score at 1.0
+        risk_scores = np.minimum(risk_scores, 1.0)
+        
+        if include_factors:
+            for mask, message in flags:
+                for row in np.flatnonzero(mask):
+                    risk_factors[row].append(message)
+        
+        return risk_scores, risk_factors
     
-    def _evaluate_temperature(self, temperature):
-        """Evaluate temperature risk on a 0-1 scale"""
-        if temperature > 103 or temperature < 94:
-            return 1.0
-        elif temperature > 101 or temperature < 95:
-            return 0.7
-        elif temperature > 99.5 or temperature < 97:
-            return 0.3
-        else:
-            return 0.0
+    def _evaluate_prediction_trend_batch(self, predictions, high_threshold, low_threshold, decreasing_is_bad=False):
+        """Vectorized _evaluate_prediction_trend over rows of a (n, horizon) array"""
+        if predictions.shape[1] < 2:
+            return np.zeros(len(predictions))
+        
+        last_value = predictions[:, -1]
+        trend = last_value - predictions[:, 0]
+        
+        if decreasing_is_bad:
+            return np.select([(trend < -3) & (last_value < low_threshold), trend < -2], [0.8, 0.5], 0.0)
+        strong = ((trend > 3) & (last_value > high_threshold)) | ((trend < -3) & (last_value < low_threshold))
+        return np.select([strong, np.abs(trend) > 2], [0.8, 0.5], 0.0)
     
     def _evaluate_prediction_trend(self, prediction_values, high_threshold, low_threshold, decreasing_is_bad=False):
         """Evaluate if predictions show a concerning trend"""
@@ -211,4 +268,48 @@ class RiskCalculator:
             elif abs(trend) > 2:
                 return 0.5  # Moderate trend
             else:
-                return 0.0  # No concerning trend
\ No newline at end of file
+                return 0.0  # No concerning trend
+
+
+def stack_risk_inputs(current_data_list, predictions_list, anomaly_results_list):
+    """
+    Stack per-patient calculate_risk inputs into calculate_risk_batch inputs.
+    
+    Args:
+        current_data_list (list): Current vital sign dictionaries
+        predictions_list (list): Prediction dictionaries (same horizon for all)
+        anomaly_results_list (list): Anomaly detection result dictionaries
+        
+    Returns:
+        tuple: (current_data, predictions, anomaly_scores, anomaly_order), the
+               positional inputs of calculate_risk_batch; anomaly scores are NaN
+               for patients without that score, and anomaly_order keeps each
+               patient's own order of scores (patients need not share a key
+               set or order). Vital signs keep their type (integer readings
+               stay integers), so the factor strings read as in calculate_risk
+    """
+    current_data = {
+        key: np.array([data[key] for data in current_data_list])
+        for key in ('heart_rate', 'blood_pressure', 'respiratory_rate', 'oxygen_saturation', 'temperature')
+    }
+    predictions = {
+        key: np.array([prediction[key] for prediction in predictions_list], dtype=float)
+        for key in ('heart_rate', 'oxygen_saturation')
+    }
+    
+    anomaly_scores = {}
+    orders = []
+    for i, anomaly_results in enumerate(anomaly_results_list):
+        order = []
+        for key, score in anomaly_results.get('scores', {}).items():
+            if key not in anomaly_scores:
+                anomaly_scores[key] = np.full(len(anomaly_results_list), np.nan)
+            anomaly_scores[key][i] = score
+            order.append(list(anomaly_scores).index(key))
+        orders.append(order)
+    
+    anomaly_order = np.full((len(orders), max(map(len, orders), default=0)), -1)
+    for i, order in enumerate(orders):
+        anomaly_order[i, :len(order)] = order
+    
+    return current_data, predictions, anomaly_scores, anomaly_order
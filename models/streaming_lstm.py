@@ -0,0 +1,269 @@
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+class StreamingLSTM:
+    """
+    Stateful serving copy of a unidirectional HealthcareLSTM.
+
+    The weights of a trained Keras model are exported once and the recurrence
+    is evaluated in NumPy one reading at a time: a new reading advances the
+    hidden and cell state of every LSTM layer by a single step, and a
+    forecast is read off the top hidden state with the output layer, so a
+    tick costs the same whatever the context length. Patients keep their
+    state in a StaggeredState, which bounds the context to what the model
+    saw in training. Bidirectional models cannot be served this way because
+    their backward pass needs the whole window again.
+    """
+
+    def __init__(self, lstm_layers, output_kernel, output_bias, prediction_horizon, feature_count):
+        """
+        Initialize from exported weights.
+
+        Args:
+            lstm_layers (list): (kernel, recurrent_kernel, bias) per LSTM layer,
+                in Keras layout with gates ordered input, forget, cell, output
+            output_kernel (numpy.ndarray): Dense layer kernel
+            output_bias (numpy.ndarray): Dense layer bias
+            prediction_horizon (int): Number of time steps predicted
+            feature_count (int): Number of features per time step
+        """
+        self.lstm_layers = [tuple(np.asarray(w, dtype=np.float32) for w in layer) for layer in lstm_layers]
+        self.output_kernel = np.asarray(output_kernel, dtype=np.float32)
+        self.output_bias = np.asarray(output_bias, dtype=np.float32)
+        self.prediction_horizon = prediction_horizon
+        self.feature_count = feature_count
+        self.units = [recurrent.shape[0] for _, recurrent, _ in self.lstm_layers]
+
+    @classmethod
+    def from_keras(cls, model, prediction_horizon, feature_count):
+        """
+        Export the weights of a trained unidirectional Keras model.
+
+        Args:
+            model: Keras model made of LSTM, Dropout and a final Dense layer
+            prediction_horizon (int): Number of time steps predicted
+            feature_count (int): Number of features per time step
+
+        Returns:
+            StreamingLSTM: Serving model with the same weights
+        """
+        lstm_layers = []
+        output_layer = None
+        for layer in model.layers:
+            layer_type = type(layer).__name__
+            if layer_type == 'Bidirectional':
+                raise ValueError("Bidirectional LSTM layers cannot be served as a streaming model.")
+            if layer_type == 'LSTM':
+                lstm_layers.append(layer.get_weights())
+            elif layer_type == 'Dense':
+                output_layer = layer.get_weights()
+
+        if not lstm_layers or output_layer is None:
+            raise ValueError("Model must contain LSTM layers followed by a Dense output layer.")
+
+        return cls(lstm_layers, output_layer[0], output_layer[1], prediction_horizon, feature_count)
+
+    def save(self, path):
+        """Save the exported weights to an .npz file."""
+        arrays = {'output_kernel': self.output_kernel, 'output_bias': self.output_bias,
+                  'shape': np.array([self.prediction_horizon, self.feature_count])}
+        for i, (kernel, recurrent, bias) in enumerate(self.lstm_layers):
+            arrays[f'layer{i}_kernel'] = kernel
+            arrays[f'layer{i}_recurrent'] = recurrent
+            arrays[f'layer{i}_bias'] = bias
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load weights saved with save()."""
+        with np.load(path) as data:
+            n_layers = sum(1 for name in data.files if name.endswith('_recurrent'))
+            lstm_layers = [
+                (data[f'layer{i}_kernel'], data[f'layer{i}_recurrent'], data[f'layer{i}_bias'])
+                for i in range(n_layers)
+            ]
+            prediction_horizon, feature_count = data['shape']
+            return cls(lstm_layers, data['output_kernel'], data['output_bias'],
+                       int(prediction_horizon), int(feature_count))
+
+    def initial_state(self, batch_size=None):
+        """
+        Zero hidden and cell state for every layer.
+
+        Args:
+            batch_size (int, optional): Number of sequences advanced together;
+                                        states are then (batch_size, units)
+        """
+        state = []
+        for units in self.units:
+            shape = units if batch_size is None else (batch_size, units)
+            state.append((np.zeros(shape, dtype=np.float32), np.zeros(shape, dtype=np.float32)))
+        return state
+
+    def step(self, state, x):
+        """
+        Advance the state by one reading.
+
+        Args:
+            state (list): (hidden, cell) per layer, as returned by initial_state
+            x (numpy.ndarray): Normalized reading with shape (features,), or
+                               (batch_size, features) for a batched state
+
+        Returns:
+            list: New state
+        """
+        new_state = []
+        layer_input = x
+        for (kernel, recurrent, bias), (h, c), units in zip(self.lstm_layers, state, self.units):
+            z = layer_input @ kernel + h @ recurrent + bias
+            i = _sigmoid(z[..., :units])
+            f = _sigmoid(z[..., units:2 * units])
+            g = np.tanh(z[..., 2 * units:3 * units])
+            o = _sigmoid(z[..., 3 * units:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+            new_state.append((h, c))
+            layer_input = h
+        return new_state
+
+    def predict(self, input_sequence):
+        """
+        Predict from whole input windows, like HealthcareLSTM.predict.
+
+        Args:
+            input_sequence (numpy.ndarray): Normalized windows with shape
+                                            (samples, sequence_length, features)
+
+        Returns:
+            numpy.ndarray: Normalized predictions with shape
+                           (samples, prediction_horizon, features)
+        """
+        input_sequence = np.asarray(input_sequence, dtype=np.float32)
+        state = self.initial_state(len(input_sequence))
+        for t in range(input_sequence.shape[1]):
+            state = self.step(state, input_sequence[:, t])
+        return self.forecast(state)
+
+    def forecast(self, state):
+        """
+        Predict the next time steps from the current state.
+
+        Returns:
+            numpy.ndarray: Normalized predictions with shape (prediction_horizon, features),
+                           with a leading batch axis for a batched state
+        """
+        output = state[-1][0] @ self.output_kernel + self.output_bias
+        return output.reshape(output.shape[:-1] + (self.prediction_horizon, self.feature_count))
+
+
+class StaggeredState:
+    """
+    Bounded-context recurrent state of one patient.
+
+    The model was trained on sequence_length windows starting from a zero
+    state, so a state carried over an unbounded history would summarise more
+    context than it ever saw. Two states are advanced together (one batched
+    step per reading) and restarted from zero alternately, every
+    sequence_length readings, at reading numbers fixed by the patient's
+    reading count. Forecasts come from the older state, which has seen more
+    than the last sequence_length readings and at most twice as many.
+    """
+
+    def __init__(self, model, sequence_length, first_index=0):
+        """
+        Initialize zero states.
+
+        Args:
+            model (StreamingLSTM): Serving model
+            sequence_length (int): Window length the model was trained on
+            first_index (int): Number of the first reading that will be added
+        """
+        self.model = model
+        self.sequence_length = sequence_length
+        self.state = model.initial_state(2)
+        self.starts = np.array([first_index, first_index])
+        self.next_index = first_index  # Number of the next reading to add
+
+    def advance(self, readings):
+        """
+        Add normalized readings, in order.
+
+        Args:
+            readings (numpy.ndarray): Readings with shape (samples, features)
+        """
+        period = 2 * self.sequence_length
+        for x in np.asarray(readings, dtype=np.float32):
+            # State k restarts at reading numbers k * sequence_length (mod 2 * sequence_length)
+            phase = self.next_index % period
+            if phase % self.sequence_length == 0:
+                k = phase // self.sequence_length
+                for h, c in self.state:
+                    h[k] = 0
+                    c[k] = 0
+                self.starts[k] = self.next_index
+            self.state = self.model.step(self.state, x)
+            self.next_index += 1
+
+    def forecast(self):
+        """Forecast from the older of the two states (see StreamingLSTM.forecast)."""
+        k = int(np.argmin(self.starts))
+        return self.model.forecast([(h[k], c[k]) for h, c in self.state])
+
+
+class PatientStateCache:
+    """
+    LRU cache of per-patient streaming state.
+
+    Patients that have not been seen for ttl_seconds, or the least recently
+    used ones beyond max_patients, are evicted; their state is rebuilt from
+    history the next time they are predicted.
+    """
+
+    def __init__(self, max_patients=1000, ttl_seconds=3600):
+        self.max_patients = max_patients
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, patient_id):
+        """Return a patient's cached state, or None."""
+        entry = self._entries.get(patient_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry['touched'] > self.ttl_seconds:
+            del self._entries[patient_id]
+            return None
+        self._entries.move_to_end(patient_id)
+        return entry['state']
+
+    def put(self, patient_id, state):
+        """Store a patient's state."""
+        self._entries[patient_id] = {'state': state, 'touched': time.monotonic()}
+        self._entries.move_to_end(patient_id)
+        self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        # Entries are in least-recently-used order
+        while self._entries:
+            patient_id, entry = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_patients or now - entry['touched'] > self.ttl_seconds:
+                del self._entries[patient_id]
+            else:
+                break
+
+    def clear(self):
+        self._entries.clear()
+
+
+def streaming_path(model_path):
+    """Path of the streaming weights exported alongside an LSTM model."""
+    return os.path.splitext(model_path)[0] + '_streaming.npz'
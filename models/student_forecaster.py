@@ -0,0 +1,262 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import Sequential, load_model
+from tensorflow.keras.layers import GRU, Conv1D, Cropping1D, Flatten, Dense, Input
+from tensorflow.keras.optimizers import Adam
+from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
+import os
+
+class StudentForecaster:
+    """
+    Compact forecaster distilled from the HealthcareLSTM teacher.
+
+    The student has the same inputs and outputs as HealthcareLSTM (normalized
+    windows in, prediction_horizon * features values out), so it can replace
+    the teacher as the serving model. It is trained on the teacher's
+    predictions, optionally blended with the ground truth, and comes in two
+    sizes of small:
+
+    - 'gru': a single small GRU layer
+    - 'conv': a stack of causal dilated 1D convolutions whose receptive
+      field covers the input window, read out at the last time step
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the student model with configuration parameters.
+
+        Args:
+            config (dict, optional): Configuration parameters including:
+                - sequence_length: Number of time steps to use for prediction
+                - prediction_horizon: Number of time steps to predict ahead
+                - feature_count: Number of features in the input data
+                - architecture: 'gru' or 'conv'
+                - units: GRU cells for 'gru'
+                - filters: Filters per convolution for 'conv'
+                - kernel_size: Convolution kernel size for 'conv'
+                - dilations: Dilation rate of each convolution for 'conv'
+                - learning_rate: Learning rate for optimizer
+                - model_path: Path to save/load the model
+        """
+        # Default configuration
+        self.config = {
+            'sequence_length': 24,
+            'prediction_horizon': 12,
+            'feature_count': 5,
+            'architecture': 'gru',
+            'units': 16,
+            'filters': 16,
+            'kernel_size': 3,
+            'dilations': [1, 2, 4, 8],  # Receptive field 1 + 2 * 15 = 31 steps
+            'learning_rate': 0.003,
+            'model_path': 'models/saved_student_model.keras',
+        }
+
+        # Update with provided config if any
+        if config:
+            self.config.update(config)
+
+        if self.config['architecture'] not in ('gru', 'conv'):
+            raise ValueError(f"Unknown student architecture: {self.config['architecture']}")
+
+        # Initialize model
+        self.model = None
+        self.pretrained = False  # Whether the model was loaded from model_path
+
+        # Try to load pre-trained model if it exists
+        self._load_or_create_model()
+
+    def _load_or_create_model(self):
+        """Load existing model or create a new one if none exists."""
+        try:
+            if os.path.exists(self.config['model_path']):
+                self.model = load_model(self.config['model_path'])
+                self.pretrained = True
+                print(f"Loaded existing student model from {self.config['model_path']}")
+            else:
+                self._build_model()
+                print("Created new student model")
+        except Exception as e:
+            print(f"Error loading student model: {e}. Creating new model instead.")
+            self._build_model()
+
+    def _build_model(self):
+        """Build the student model architecture."""
+        sequence_length = self.config['sequence_length']
+        self.model = Sequential()
+        self.model.add(Input(shape=(sequence_length, self.config['feature_count'])))
+
+        if self.config['architecture'] == 'gru':
+            self.model.add(GRU(self.config['units']))
+        else:
+            for dilation in self.config['dilations']:
+                self.model.add(Conv1D(self.config['filters'], self.config['kernel_size'],
+                                      dilation_rate=dilation, padding='causal', activation='relu'))
+            # Causal padding makes the last step see the whole window
+            self.model.add(Cropping1D((sequence_length - 1, 0)))
+            self.model.add(Flatten())
+
+        self.model.add(Dense(self.config['prediction_horizon'] * self.config['feature_count']))
+
+        self.model.compile(
+            optimizer=Adam(learning_rate=self.config['learning_rate']),
+            loss='mean_squared_error'
+        )
+
+        self.model.summary()
+
+    def train(self, X_train, y_train, X_val=None, y_val=None, epochs=50, batch_size=32):
+        """
+        Train the student on (distillation) targets.
+
+        Args:
+            X_train (numpy.ndarray): Training input sequences, or a tf.data.Dataset
+                                    yielding (inputs, targets)
+            y_train (numpy.ndarray): Training targets (see teacher_targets), or None
+                                    when X_train yields batches
+            X_val (numpy.ndarray): Validation input sequences (or dataset)
+            y_val (numpy.ndarray): Validation targets
+            epochs (int): Number of training epochs
+            batch_size (int): Batch size for training
+
+        Returns:
+            History object with training metrics
+        """
+        callbacks = [
+            EarlyStopping(patience=10, restore_best_weights=True),
+            ModelCheckpoint(self.config['model_path'], save_best_only=True)
+        ]
+
+        if y_train is None:
+            history = self.model.fit(
+                X_train,
+                epochs=epochs,
+                validation_data=X_val,
+                callbacks=callbacks,
+                verbose=1
+            )
+        else:
+            validation_data = None
+            if X_val is not None and y_val is not None:
+                validation_data = (X_val, y_val)
+
+            history = self.model.fit(
+                X_train, y_train,
+                epochs=epochs,
+                batch_size=batch_size,
+                validation_data=validation_data,
+                callbacks=callbacks,
+                verbose=1
+            )
+
+        self.model.save(self.config['model_path'])
+        return history
+
+    def predict(self, input_sequence):
+        """
+        Generate predictions for the input sequence.
+
+        Args:
+            input_sequence (numpy.ndarray): Input sequences of shape
+                                          [samples, sequence_length, features]
+
+        Returns:
+            numpy.ndarray: Predictions with shape [samples, prediction_horizon, features]
+        """
+        if self.model is None:
+            raise ValueError("Model not initialized. Please train or load a model first.")
+
+        predictions = np.asarray(self.model.predict_on_batch(input_sequence))
+        return predictions.reshape((-1, self.config['prediction_horizon'], self.config['feature_count']))
+
+    def save(self, path=None):
+        """Save the model to a file."""
+        if path is None:
+            path = self.config['model_path']
+
+        if self.model is not None:
+            self.model.save(path)
+            print(f"Student model saved to {path}")
+        else:
+            print("No model to save")
+
+
+def teacher_targets(teacher, X, y=None, alpha=1.0, batch_size=1024):
+    """
+    Distillation targets for a set of input windows.
+
+    Args:
+        teacher (HealthcareLSTM): Trained teacher model
+        X (numpy.ndarray): Input windows [samples, sequence_length, features]
+        y (numpy.ndarray, optional): Ground-truth targets [samples, prediction_horizon * features]
+        alpha (float): Weight of the teacher's predictions; the rest goes to y
+        batch_size (int): Batch size of the teacher's inference
+
+    Returns:
+        numpy.ndarray: Targets with shape [samples, prediction_horizon * features]
+    """
+    soft = teacher.model.predict(X, batch_size=batch_size, verbose=0)
+    if y is None or alpha >= 1:
+        return soft
+    return alpha * soft + (1 - alpha) * y
+
+
+def distill(teacher, student, X_train, y_train=None, X_val=None, y_val=None, alpha=1.0,
+            epochs=50, batch_size=32):
+    """
+    Train a student on the predictions of a trained teacher.
+
+    Args:
+        teacher (HealthcareLSTM): Trained teacher model
+        student (StudentForecaster): Student to train
+        X_train (numpy.ndarray): Training input windows
+        y_train (numpy.ndarray, optional): Ground-truth training targets
+        X_val (numpy.ndarray, optional): Validation input windows
+        y_val (numpy.ndarray, optional): Ground-truth validation targets
+        alpha (float): Weight of the teacher's predictions; the rest goes to y
+        epochs (int): Number of training epochs
+        batch_size (int): Batch size for training
+
+    Returns:
+        History object with training metrics
+    """
+    train_targets = teacher_targets(teacher, X_train, y_train, alpha)
+    val_targets = None
+    if X_val is not None and len(X_val) > 0:
+        val_targets = teacher_targets(teacher, X_val, y_val, alpha)
+    else:
+        X_val = None
+    return student.train(X_train, train_targets, X_val, val_targets, epochs, batch_size)
+
+
+def distillation_dataset(teacher, batch_factory, sequence_length, prediction_horizon, feature_count,
+                         alpha=1.0, prefetch=4):
+    """
+    Prefetching tf.data pipeline that labels streamed batches with the teacher.
+
+    Args:
+        teacher (HealthcareLSTM): Trained teacher model
+        batch_factory (callable): Returns a fresh iterator of (X, y) batches,
+                                  e.g. TrainingCorpus.window_batches
+        sequence_length (int): Input window length
+        prediction_horizon (int): Number of time steps predicted
+        feature_count (int): Number of features
+        alpha (float): Weight of the teacher's predictions; the rest goes to y
+        prefetch (int): Number of batches to prefetch
+
+    Returns:
+        tf.data.Dataset: (inputs, targets) batches for StudentForecaster.train
+    """
+    def labelled_batches():
+        for X, y in batch_factory():
+            soft = np.asarray(teacher.model.predict_on_batch(X))
+            yield X, (alpha * soft + (1 - alpha) * y).astype(np.float32)
+
+    dataset = tf.data.Dataset.from_generator(
+        labelled_batches,
+        output_signature=(
+            tf.TensorSpec(shape=(None, sequence_length, feature_count), dtype=tf.float32),
+            tf.TensorSpec(shape=(None, prediction_horizon * feature_count), dtype=tf.float32)
+        )
+    )
+    return dataset.prefetch(prefetch)
@@ -7,6 +7,9 @@ import random
 
 # Import helper for serializing data
 from utils.helpers import make_json_serializable
+from models.clinical_rules import get_rule_engine
+from models.risk_calculator import RiskCalculator
+from models.risk_attribution import RiskAttributor
 
 # Create Blueprint for explainable AI routes
 explainable_ai_bp = Blueprint('explainable_ai', __name__)
@@ -93,136 +96,77 @@ def get_explanation_data():
     
     return jsonify(make_json_serializable(explanation_data))
 
-def generate_feature_attribution(risk_score, hr, sys_bp, dia_bp, resp, oxygen, temp):
-    """Generate feature attribution based on vital signs"""
-    # In a real system, this would use SHAP values or other attribution methods
-    # For demo, we'll create plausible attributions that sum to approximately 1
-    
-    # Base attribution - just distribute the risk based on how abnormal each value is
-    attributions = {}
-    
-    # Heart rate attribution
-    hr_normal_low, hr_normal_high = 60, 100
-    if hr < hr_normal_low:
-        hr_att = 0.2 * min(1, (hr_normal_low - hr) / 20)
-        hr_impact = 'positive'
-    elif hr > hr_normal_high:
-        hr_att = 0.2 * min(1, (hr - hr_normal_high) / 20)
-        hr_impact = 'positive'
-    else:
-        hr_att = 0.05
-        hr_impact = 'neutral'
-    
-    # Systolic BP attribution
-    sys_normal_low, sys_normal_high = 90, 140
-    if sys_bp < sys_normal_low:
-        sys_att = 0.15 * min(1, (sys_normal_low - sys_bp) / 20)
-        sys_impact = 'positive'
-    elif sys_bp > sys_normal_high:
-        sys_att = 0.15 * min(1, (sys_bp - sys_normal_high) / 20)
-        sys_impact = 'positive'
-    else:
-        sys_att = 0.05
-        sys_impact = 'neutral'
-    
-    # Diastolic BP attribution
-    dia_normal_low, dia_normal_high = 60, 90
-    if dia_bp < dia_normal_low:
-        dia_att = 0.1 * min(1, (dia_normal_low - dia_bp) / 15)
-        dia_impact = 'positive'
-    elif dia_bp > dia_normal_high:
-        dia_att = 0.1 * min(1, (dia_bp - dia_normal_high) / 15)
-        dia_impact = 'positive'
-    else:
-        dia_att = 0.05
-        dia_impact = 'neutral'
+# Attribution output names of the risk model inputs
+ATTRIBUTION_NAMES = {
+    'heart_rate': 'heartRate',
+    'blood_pressure_systolic': 'bloodPressureSystolic',
+    'blood_pressure_diastolic': 'bloodPressureDiastolic',
+    'respiratory_rate': 'respiratoryRate',
+    'oxygen_saturation': 'oxygenSaturation',
+    'temperature': 'temperature'
+}
+
+_default_attributor = None
+
+def get_risk_attributor():
+    """The attributor attached by the app, or one over a default RiskCalculator"""
+    global _default_attributor
+    attributor = getattr(explainable_ai_bp, 'risk_attributor', None)
+    if attributor is not None:
+        return attributor
+    if _default_attributor is None:
+        _default_attributor = RiskAttributor(RiskCalculator())
+    return _default_attributor
+
+def format_feature_attribution(attribution, values):
+    """
+    Shape a RiskAttributor result for the dashboard.
     
-    # Respiratory rate attribution
-    resp_normal_low, resp_normal_high = 12, 20
-    if resp < resp_normal_low:
-        resp_att = 0.15 * min(1, (resp_normal_low - resp) / 4)
-        resp_impact = 'positive'
-    elif resp > resp_normal_high:
-        resp_att = 0.15 * min(1, (resp - resp_normal_high) / 6)
-        resp_impact = 'positive'
-    else:
-        resp_att = 0.05
-        resp_impact = 'neutral'
+    'contribution' is the Shapley value in risk score units and 'attribution'
+    its share of the total absolute contribution, so the bars sum to 1.
+    """
+    rules = get_rule_engine()
+    contributions = attribution['contributions']
+    total = sum(abs(contribution) for contribution in contributions.values())
     
-    # Oxygen saturation attribution
-    oxygen_normal = 95
-    if oxygen < oxygen_normal:
-        oxygen_att = 0.3 * min(1, (oxygen_normal - oxygen) / 10)
-        oxygen_impact = 'positive'
-    else:
-        oxygen_att = 0.05
-        oxygen_impact = 'neutral'
-    
-    # Temperature attribution
-    temp_normal_low, temp_normal_high = 97, 99
-    if temp < temp_normal_low:
-        temp_att = 0.1 * min(1, (temp_normal_low - temp) / 3)
-        temp_impact = 'positive'
-    elif temp > temp_normal_high:
-        temp_att = 0.1 * min(1, (temp - temp_normal_high) / 3)
-        temp_impact = 'positive'
-    else:
-        temp_att = 0.05
-        temp_impact = 'neutral'
-    
-    # Total attribution
-    total_att = hr_att + sys_att + dia_att + resp_att + oxygen_att + temp_att
-    
-    # Normalize attributions to sum to 1
-    hr_att /= total_att
-    sys_att /= total_att
-    dia_att /= total_att
-    resp_att /= total_att
-    oxygen_att /= total_att
-    temp_att /= total_att
-    
-    # Create attribution data
-    attributions = {
-        'heartRate': {
-            'value': hr,
-            'normalRange': [hr_normal_low, hr_normal_high],
-            'attribution': hr_att,
-            'impact': hr_impact
-        },
-        'bloodPressureSystolic': {
-            'value': sys_bp,
-            'normalRange': [sys_normal_low, sys_normal_high],
-            'attribution': sys_att,
-            'impact': sys_impact
-        },
-        'bloodPressureDiastolic': {
-            'value': dia_bp,
-            'normalRange': [dia_normal_low, dia_normal_high],
-            'attribution': dia_att,
-            'impact': dia_impact
-        },
-        'respiratoryRate': {
-            'value': resp,
-            'normalRange': [resp_normal_low, resp_normal_high],
-            'attribution': resp_att,
-            'impact': resp_impact
-        },
-        'oxygenSaturation': {
-            'value': oxygen,
-            'normalRange': [oxygen_normal, 100],
-            'attribution': oxygen_att,
-            'impact': oxygen_impact
-        },
-        'temperature': {
-            'value': temp,
-            'normalRange': [temp_normal_low, temp_normal_high],
-            'attribution': temp_att,
-            'impact': temp_impact
+    attributions = {}
+    for feature, name in ATTRIBUTION_NAMES.items():
+        contribution = contributions[feature]
+        low, high = rules.normal_range(feature)
+        if contribution > 0:
+            impact = 'positive'
+        elif contribution < 0:
+            impact = 'negative'
+        else:
+            impact = 'neutral'
+        attributions[name] = {
+            'value': values[feature],
+            # SpO2 has no upper limit; the dashboard shows 100% as the top of its range
+            'normalRange': [low, high if np.isfinite(high) else 100],
+            'attribution': abs(contribution) / total if total > 0 else 0.0,
+            'contribution': contribution,
+            'impact': impact
         }
-    }
-    
     return attributions
 
+def generate_feature_attribution(risk_score, hr, sys_bp, dia_bp, resp, oxygen, temp):
+    """Shapley attribution of the risk model's vital-sign score (see RiskAttributor)"""
+    attribution = get_risk_attributor().attribute({
+        'heart_rate': hr,
+        'blood_pressure': [sys_bp, dia_bp],
+        'respiratory_rate': resp,
+        'oxygen_saturation': oxygen,
+        'temperature': temp
+    })
+    return format_feature_attribution(attribution, {
+        'heart_rate': hr,
+        'blood_pressure_systolic': sys_bp,
+        'blood_pressure_diastolic': dia_bp,
+        'respiratory_rate': resp,
+        'oxygen_saturation': oxygen,
+        'temperature': temp
+    })
+
 def generate_counterfactuals(risk_score, hr, sys_bp, dia_bp, resp, oxygen, temp):
     """Generate counterfactual explanations"""
     counterfactuals = []
@@ -382,11 +326,67 @@ def generate_confidence_intervals(risk_score):
         'confidence': confidence
     }
 
+def find_indexed_similar_cases(hr, sys_bp, dia_bp, resp, oxygen, temp, k=3):
+    """Retrieve the most similar stored readings from the latent case index"""
+    # The app attaches the index and the detector that produces latent vectors
+    case_index = getattr(explainable_ai_bp, 'case_index', None)
+    detector = getattr(explainable_ai_bp, 'anomaly_detector', None)
+    if case_index is None or detector is None or len(case_index) == 0:
+        return []
+    # Until the monitoring loop re-encodes it, an index of another encoder cannot be searched
+    if case_index.encoder_version != getattr(detector, 'latent_version', None):
+        return []
+    
+    latent = detector.get_latent_representation({
+        'heart_rate': hr,
+        'blood_pressure': [sys_bp, dia_bp],
+        'respiratory_rate': resp,
+        'oxygen_saturation': oxygen,
+        'temperature': temp
+    })
+    if latent is None:
+        return []
+    
+    # The reading being explained is usually the latest one indexed; identical
+    # earlier readings are genuine matches and are kept
+    own_case = case_index.latest()
+    similar_cases = []
+    for distance, case in case_index.query(latent, k + 1):
+        if case is None or (case is own_case and distance == 0):
+            continue
+        
+        vitals = case['vitals']
+        if case.get('risk_factors'):
+            name = case['risk_factors'][0]
+        elif case.get('risk_score') is not None:
+            name = 'Stable Reading'
+        else:
+            name = 'Historical Reading'
+        
+        description = (
+            f"Recorded {case['timestamp']}: HR {vitals['heart_rate']} BPM, "
+            f"BP {vitals['blood_pressure'][0]}/{vitals['blood_pressure'][1]} mmHg, "
+            f"RR {vitals['respiratory_rate']} breaths/min, SpO₂ {vitals['oxygen_saturation']}%"
+        )
+        if case.get('risk_score') is not None:
+            description += f", risk {int(case['risk_score'] * 100)}%"
+        
+        similar_cases.append({
+            'name': name,
+            'similarity': 1 / (1 + distance),
+            'description': description
+        })
+    
+    return similar_cases[:k]
+
 def generate_similar_cases(hr, sys_bp, dia_bp, resp, oxygen, temp):
     """Generate similar patient cases"""
-    # In a real system, this would use clustering or similarity metrics on a database of cases
-    # For demo, we'll use rule-based logic to identify relevant clinical patterns
+    # Prefer real historical cases from the latent-space index when available
+    similar_cases = find_indexed_similar_cases(hr, sys_bp, dia_bp, resp, oxygen, temp)
+    if similar_cases:
+        return similar_cases
     
+    # Otherwise use rule-based logic to identify relevant clinical patterns
     similar_cases = []
     
     # Check for respiratory distress pattern
@@ -434,14 +434,14 @@ def generate_similar_cases(hr, sys_bp, dia_bp, resp, oxygen, temp):
         })
     
     # Add general decompensation if several abnormal vitals
-    abnormal_count = sum([
-        hr < 60 or hr > 100,
-        sys_bp < 90 or sys_bp > 140,
-        dia_bp < 60 or dia_bp > 90,
-        resp < 12 or resp > 20,
-        oxygen < 95,
-        temp < 97 or temp > 99
-    ])
+    abnormal_count = int(get_rule_engine().abnormal_count({
+        'heart_rate': hr,
+        'blood_pressure_systolic': sys_bp,
+        'blood_pressure_diastolic': dia_bp,
+        'respiratory_rate': resp,
+        'oxygen_saturation': oxygen,
+        'temperature': temp
+    }))
     
     if abnormal_count >= 3:
         similar_cases.append({
@@ -464,6 +464,18 @@ def generate_similar_cases(hr, sys_bp, dia_bp, resp, oxygen, temp):
     # Return top 3 most similar cases
     return similar_cases[:3]
 
+# Decision path feature nodes: (node name, description, condition label, unit)
+DECISION_PATH_FEATURES = {
+    'oxygen_saturation': ('Oxygen Check', 'Oxygen saturation = {value}%', 'Oxygen', '%'),
+    'heart_rate': ('Heart Rate Check', 'Heart rate = {value} BPM', 'Heart Rate', ' BPM')
+}
+
+def _tier_condition(tier, value, label, unit):
+    """Condition text of the bound a value crosses in a rule tier, e.g. 'Oxygen < 90%'"""
+    if 'above' in tier and value > tier['above']:
+        return f'{label} > {tier["above"]:g}{unit}'
+    return f'{label} < {tier["below"]:g}{unit}'
+
 def generate_decision_path(risk_score, hr, sys_bp, dia_bp, resp, oxygen, temp):
     """Generate a decision path visualization"""
     # In a real system, this would extract the decision path from a trained model
@@ -480,102 +492,53 @@ def generate_decision_path(risk_score, hr, sys_bp, dia_bp, resp, oxygen, temp):
         }
     ]
     
-    # Decision nodes based on vital signs
-    if oxygen < 95:
+    # Decision nodes from the 'decision_path' tiers of the clinical rule table:
+    # a feature check, the tier's condition and a risk leaf per matched feature
+    rules = get_rule_engine()
+    values = {'oxygen_saturation': oxygen, 'heart_rate': hr}
+    for feature, (contribution, tier_index) in rules.evaluate_one('decision_path', values).items():
+        if tier_index < 0:
+            continue
+        tier = rules.tiers('decision_path', feature)[tier_index]
+        name, description, label, unit = DECISION_PATH_FEATURES[feature]
+        value = values[feature]
+        
+        # The feature check is the normal range that was left
+        low, high = rules.normal_range(feature)
+        if value > high:
+            check = f'{label} > {high:g}{unit}'
+        elif value < low:
+            check = f'{label} < {low:g}{unit}'
+        else:
+            check = _tier_condition(tier, value, label, unit)
         nodes.append({
             'id': len(nodes),
-            'name': 'Oxygen Check',
-            'description': f'Oxygen saturation = {oxygen}%',
-            'condition': f'Oxygen < 95%',
+            'name': name,
+            'description': description.format(value=value),
+            'condition': check,
             'type': 'feature',
             'parent': 0
         })
-        oxygen_node_id = len(nodes) - 1
+        feature_node_id = len(nodes) - 1
         
-        if oxygen < 90:
-            nodes.append({
-                'id': len(nodes),
-                'name': 'Severe Hypoxemia',
-                'description': 'Oxygen saturation severely decreased',
-                'condition': f'Oxygen < 90%',
-                'type': 'condition',
-                'parent': oxygen_node_id
-            })
-            
-            nodes.append({
-                'id': len(nodes),
-                'name': 'High Risk',
-                'description': 'Major risk factor detected',
-                'contribution': 0.3,
-                'type': 'leaf',
-                'parent': len(nodes) - 1
-            })
-        else:
-            nodes.append({
-                'id': len(nodes),
-                'name': 'Mild Hypoxemia',
-                'description': 'Oxygen saturation mildly decreased',
-                'condition': f'Oxygen < 95%',
-                'type': 'condition',
-                'parent': oxygen_node_id
-            })
-            
-            nodes.append({
-                'id': len(nodes),
-                'name': 'Moderate Risk',
-                'description': 'Significant risk factor detected',
-                'contribution': 0.2,
-                'type': 'leaf',
-                'parent': len(nodes) - 1
-            })
-    
-    if hr > 100 or hr < 60:
         nodes.append({
             'id': len(nodes),
-            'name': 'Heart Rate Check',
-            'description': f'Heart rate = {hr} BPM',
-            'condition': f'Heart Rate {">"    if hr > 100 else "60"} BPM',
-            'type': 'feature',
-            'parent': 0
+            'name': tier['name'],
+            'description': tier['description'],
+            'condition': _tier_condition(tier, value, label, unit),
+            'type': 'condition',
+            'parent': feature_node_id
         })
-        hr_node_id = len(nodes) - 1
         
-        if hr > 120 or hr < 50:
-            nodes.append({
-                'id': len(nodes),
-                'name': f'{"Tachycardia" if hr > 120 else "Bradycardia"}',
-                'description': f'Heart rate severely {"elevated" if hr > 120 else "decreased"}',
-                'condition': f'Heart Rate {">" if hr > 120 else "<"} {"120" if hr > 120 else "50"} BPM',
-                'type': 'condition',
-                'parent': hr_node_id
-            })
-            
-            nodes.append({
-                'id': len(nodes),
-                'name': 'High Risk',
-                'description': 'Major risk factor detected',
-                'contribution': 0.25,
-                'type': 'leaf',
-                'parent': len(nodes) - 1
-            })
-        else:
-            nodes.append({
-                'id': len(nodes),
-                'name': f'Mild {"Tachycardia" if hr > 100 else "Bradycardia"}',
-                'description': f'Heart rate mildly {"elevated" if hr > 100 else "decreased"}',
-                'condition': f'Heart Rate {">" if hr > 100 else "<"} {"100" if hr > 100 else "60"} BPM',
-                'type': 'condition',
-                'parent': hr_node_id
-            })
-            
-            nodes.append({
-                'id': len(nodes),
-                'name': 'Moderate Risk',
-                'description': 'Significant risk factor detected',
-                'contribution': 0.15,
-                'type': 'leaf',
-                'parent': len(nodes) - 1
-            })
+        severe = tier.get('severe', False)
+        nodes.append({
+            'id': len(nodes),
+            'name': 'High Risk' if severe else 'Moderate Risk',
+            'description': 'Major risk factor detected' if severe else 'Significant risk factor detected',
+            'contribution': contribution,
+            'type': 'leaf',
+            'parent': len(nodes) - 1
+        })
     
     # Connect the nodes with links
     links = []
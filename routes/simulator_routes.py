@@ -1,5 +1,7 @@
 from flask import render_template, Blueprint, jsonify, request
 
+from models.clinical_rules import get_rule_engine
+
 # Create a Blueprint for simulator routes
 simulator_bp = Blueprint('simulator', __name__)
 
@@ -54,62 +56,26 @@ def process_vitals():
     vitals = request.json
     
     # Calculate risk score based on the vitals
-    # This is a simplified version of what's in the JS file
+    # This is a simplified version of what's in the JS file; the thresholds
+    # are the 'simulator' tiers of the clinical rule table
+    rules = get_rule_engine()
+    blood_pressure = vitals.get('bloodPressure', [120, 80])
+    values = {
+        'heart_rate': vitals.get('heartRate', 75),
+        'blood_pressure_systolic': blood_pressure[0],
+        'blood_pressure_diastolic': blood_pressure[1],
+        'respiratory_rate': vitals.get('respiratoryRate', 16),
+        'oxygen_saturation': vitals.get('oxygenSaturation', 98),
+        'temperature': vitals.get('temperature', 98.6)
+    }
+    
     risk_score = 0.05
     risk_factors = []
-    
-    # Heart rate risk
-    heart_rate = vitals.get('heartRate', 75)
-    if heart_rate > 120:
-        risk_score += 0.15
-        risk_factors.append(f"Elevated heart rate: {heart_rate} BPM")
-    elif heart_rate > 100:
-        risk_score += 0.1
-    elif heart_rate < 50:
-        risk_score += 0.15
-        risk_factors.append(f"Low heart rate: {heart_rate} BPM")
-    
-    # Blood pressure risk
-    systolic = vitals.get('bloodPressure', [120, 80])[0]
-    diastolic = vitals.get('bloodPressure', [120, 80])[1]
-    if systolic > 180:
-        risk_score += 0.2
-        risk_factors.append(f"Hypertensive crisis: {systolic}/{diastolic} mmHg")
-    elif systolic > 140:
-        risk_score += 0.1
-    elif systolic < 90:
-        risk_score += 0.2
-        risk_factors.append(f"Hypotension: {systolic}/{diastolic} mmHg")
-    
-    # Respiratory rate risk
-    respiratory_rate = vitals.get('respiratoryRate', 16)
-    if respiratory_rate > 24:
-        risk_score += 0.15
-        risk_factors.append(f"Tachypnea: {respiratory_rate} breaths/min")
-    elif respiratory_rate < 10:
-        risk_score += 0.2
-        risk_factors.append(f"Bradypnea: {respiratory_rate} breaths/min")
-    
-    # Oxygen saturation risk
-    oxygen = vitals.get('oxygenSaturation', 98)
-    if oxygen < 90:
-        risk_score += 0.3
-        risk_factors.append(f"Severe hypoxemia: {oxygen}% O₂ saturation")
-    elif oxygen < 94:
-        risk_score += 0.15
-        risk_factors.append(f"Hypoxemia: {oxygen}% O₂ saturation")
-    
-    # Temperature risk
-    temperature = vitals.get('temperature', 98.6)
-    if temperature > 102:
-        risk_score += 0.15
-        risk_factors.append(f"High fever: {temperature}°F")
-    elif temperature > 100.4:
-        risk_score += 0.1
-        risk_factors.append(f"Fever: {temperature}°F")
-    elif temperature < 96:
-        risk_score += 0.15
-        risk_factors.append(f"Hypothermia: {temperature}°F")
+    for feature, (score, tier) in rules.evaluate_one('simulator', values).items():
+        risk_score += score
+        message = rules.message('simulator', feature, tier, values)
+        if message is not None:
+            risk_factors.append(message)
     
     # ECG pattern risk
     ecg_pattern = vitals.get('ecgPattern', 'normal')
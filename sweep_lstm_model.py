@@ -0,0 +1,78 @@
+"""
+Hyperparameter sweep for the LSTM model.
+
+Evaluates a grid of LSTM configurations with walk-forward cross-validation,
+training the (configuration, fold) pairs in parallel worker processes. The
+per-fold results are written to a CSV table and the configurations are
+printed ranked by mean test error; retrain the best one with
+train_lstm_model.py.
+"""
+
+import sys
+import os
+import argparse
+
+# Add parent directory to path to ensure imports work
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from train_lstm_model import load_patient_data, generate_synthetic_data
+from utils.hyperparameter_sweep import SweepRunner
+
+def parse_bool(value):
+    """Parse a true/false command line value."""
+    return value.lower() in ('1', 'true', 'yes')
+
+def main():
+    """Main function to run the sweep."""
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep for the healthcare LSTM model')
+    parser.add_argument('--data', type=str, help='Path to patient data JSON file')
+    parser.add_argument('--synthetic', action='store_true', help='Generate synthetic data for the sweep')
+    parser.add_argument('--synthetic-hours', type=int, default=72, help='Hours of synthetic data to generate')
+    parser.add_argument('--lstm-units', type=int, nargs='+', default=[32, 64], help='LSTM units to try')
+    parser.add_argument('--sequence-length', type=int, nargs='+', default=[24, 48], help='Sequence lengths to try')
+    parser.add_argument('--bidirectional', type=parse_bool, nargs='+', default=[True, False],
+                        help='Bidirectional settings to try (true/false)')
+    parser.add_argument('--dropout', type=float, nargs='+', default=[0.1, 0.2], help='Dropout rates to try')
+    parser.add_argument('--folds', type=int, default=3, help='Number of walk-forward folds')
+    parser.add_argument('--epochs', type=int, default=50, help='Training epochs per trial')
+    parser.add_argument('--batch-size', type=int, default=32, help='Batch size for training')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help='Parallel worker processes')
+    parser.add_argument('--threads-per-worker', type=int, default=2, help='TensorFlow threads per worker')
+    parser.add_argument('--cache-dir', type=str, default='cache/sweep_folds', help='Preprocessed fold cache')
+    parser.add_argument('--results', type=str, default='logs/lstm_sweep_results.csv', help='Results table path')
+
+    args = parser.parse_args()
+
+    if args.synthetic:
+        patient_data = generate_synthetic_data(hours=args.synthetic_hours)
+    elif args.data:
+        print(f"Loading patient data from {args.data}")
+        patient_data = load_patient_data(args.data)
+    else:
+        print("Error: No data source specified. Use --data or --synthetic option.")
+        sys.exit(1)
+
+    runner = SweepRunner({
+        'grid': {
+            'lstm_units': args.lstm_units,
+            'sequence_length': args.sequence_length,
+            'bidirectional': args.bidirectional,
+            'dropout_rate': args.dropout,
+        },
+        'n_folds': args.folds,
+        'epochs': args.epochs,
+        'batch_size': args.batch_size,
+        'workers': args.workers,
+        'threads_per_worker': args.threads_per_worker,
+        'cache_dir': args.cache_dir,
+        'results_path': args.results,
+    })
+
+    summary = runner.run(patient_data)
+
+    print("\nConfigurations ranked by mean test MSE:")
+    print(summary.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
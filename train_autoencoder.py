@@ -21,6 +21,16 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Import our modules
 from models.deep_autoencoder import DeepAutoencoder
 from models.autoencoder_anomaly_detector import AutoencoderAnomalyDetector
+from utils.training_corpus import TrainingCorpus
+
+# Vital signs used as autoencoder input features
+FEATURE_COLUMNS = [
+    'heart_rate',
+    'blood_pressure_systolic',
+    'blood_pressure_diastolic',
+    'respiratory_rate',
+    'oxygen_saturation'
+]
 
 def load_patient_data(data_path):
     """
@@ -256,20 +266,46 @@ def prepare_data_for_training(patient_data):
     Returns:
         numpy.ndarray: Training data array
     """
-    # Extract vital signs
-    training_data = []
-    
-    for i in range(len(patient_data['timestamps'])):
-        features = [
-            patient_data['heart_rate'][i],
-            patient_data['blood_pressure_systolic'][i],
-            patient_data['blood_pressure_diastolic'][i],
-            patient_data['respiratory_rate'][i],
-            patient_data['oxygen_saturation'][i]
-        ]
-        training_data.append(features)
+    # Extract vital signs, one column per feature
+    n_samples = len(patient_data['timestamps'])
+    
+    return np.column_stack([
+        np.asarray(patient_data[feature][:n_samples], dtype=float)
+        for feature in FEATURE_COLUMNS
+    ])
+
+def train_on_corpus(args):
+    """
+    Train the autoencoder by streaming readings from a sharded corpus.
+    
+    Standardization statistics come from the manifest and the last shards
+    are held out for validation.
+    
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+    """
+    corpus = TrainingCorpus(args.corpus)
+    print(f"Training corpus loaded: {corpus.manifest['patients']} patients, {len(corpus)} time points")
+    
+    autoencoder = DeepAutoencoder({
+        'input_dim': len(FEATURE_COLUMNS),
+        'encoding_dims': [32, 16, 8],
+        'model_path': args.model_path,
+        'threshold_multiplier': args.threshold_multiplier,
+        'standardize_input': True
+    })
+    
+    train_shards, validation_shards = corpus.split_shards(validation_fraction=0.1)
+    train_dataset = corpus.reading_dataset(FEATURE_COLUMNS, args.batch_size, train_shards, shuffle=True)
+    validation_dataset = None
+    if validation_shards:
+        validation_dataset = corpus.reading_dataset(FEATURE_COLUMNS, args.batch_size, validation_shards)
     
-    return np.array(training_data)
+    mean, std = corpus.mean_std(FEATURE_COLUMNS)
+    print(f"Training autoencoder with {args.epochs} epochs and batch size {args.batch_size}")
+    autoencoder.train_on_dataset(train_dataset, mean, std, validation_dataset, epochs=args.epochs)
+    
+    print(f"Deep Autoencoder training completed successfully (threshold: {autoencoder.threshold:.4f}).")
 
 def split_train_test(data, test_size=0.2):
     """
@@ -376,6 +412,7 @@ def main():
     """Main function to run the training process."""
     parser = argparse.ArgumentParser(description='Train Deep Autoencoder model for anomaly detection')
     parser.add_argument('--data', type=str, help='Path to patient data JSON file')
+    parser.add_argument('--corpus', type=str, help='Path to a sharded training corpus (see build_training_corpus.py)')
     parser.add_argument('--epochs', type=int, default=100, help='Number of training epochs')
     parser.add_argument('--batch-size', type=int, default=32, help='Batch size for training')
     parser.add_argument('--synthetic', action='store_true', help='Generate synthetic data for training')
@@ -394,6 +431,10 @@ def main():
     os.makedirs('logs', exist_ok=True)
     os.makedirs('plots', exist_ok=True)
     
+    if args.corpus:
+        train_on_corpus(args)
+        return
+    
     # Load or generate patient data
     if args.synthetic:
         patient_data = generate_synthetic_data(hours=args.synthetic_hours, include_anomalies=True)
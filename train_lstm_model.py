@@ -18,8 +18,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import our modules
 from models.lstm_model import HealthcareLSTM
-from utils.data_preprocessing import HealthcareDataPreprocessor
+from utils.data_preprocessing import HealthcareDataPreprocessor, scaler_path
 from utils.model_training import ModelTrainer
+from utils.training_corpus import TrainingCorpus
 
 def load_patient_data(data_path):
     """
@@ -141,10 +142,46 @@ def generate_synthetic_data(hours=24, interval_seconds=300):
     
     return patient_data
 
+def train_on_corpus(args):
+    """
+    Train the LSTM by streaming windows from a sharded corpus.
+    
+    Scalers come from the corpus-wide ranges in the manifest and the last
+    shards are held out for validation.
+    
+    Args:
+        args (argparse.Namespace): Parsed command line arguments
+    """
+    corpus = TrainingCorpus(args.corpus)
+    print(f"Training corpus loaded: {corpus.manifest['patients']} patients, {len(corpus)} time points")
+    
+    data_preprocessor = HealthcareDataPreprocessor(sequence_length=24, prediction_horizon=12)
+    data_preprocessor.set_scaler_ranges(corpus.scaler_ranges(data_preprocessor.feature_columns))
+    
+    lstm_model = HealthcareLSTM({
+        'sequence_length': 24,
+        'prediction_horizon': 12,
+        'feature_count': len(data_preprocessor.feature_columns),
+        'model_path': args.model_path
+    })
+    
+    train_shards, validation_shards = corpus.split_shards(validation_fraction=0.1)
+    train_dataset = corpus.window_dataset(data_preprocessor, args.batch_size, train_shards, shuffle=True)
+    validation_dataset = None
+    if validation_shards:
+        validation_dataset = corpus.window_dataset(data_preprocessor, args.batch_size, validation_shards)
+    
+    print(f"Training model with {args.epochs} epochs and batch size {args.batch_size}")
+    lstm_model.train(train_dataset, None, validation_dataset, None, args.epochs, args.batch_size)
+    
+    data_preprocessor.save_scalers(scaler_path(args.model_path))
+    print("LSTM model training completed successfully.")
+
 def main():
     """Main function to run the training process."""
     parser = argparse.ArgumentParser(description='Train LSTM model for healthcare monitoring')
     parser.add_argument('--data', type=str, help='Path to patient data JSON file')
+    parser.add_argument('--corpus', type=str, help='Path to a sharded training corpus (see build_training_corpus.py)')
     parser.add_argument('--epochs', type=int, default=50, help='Number of training epochs')
     parser.add_argument('--batch-size', type=int, default=32, help='Batch size for training')
     parser.add_argument('--synthetic', action='store_true', help='Generate synthetic data for training')
@@ -152,6 +189,8 @@ def main():
     parser.add_argument('--save-data', type=str, help='Path to save generated or processed data')
     parser.add_argument('--model-path', type=str, default='models/saved_lstm_model.keras', help='Path to save model')
     parser.add_argument('--visualize', action='store_true', help='Visualize training results')
+    parser.add_argument('--lazy-batches', action='store_true',
+                        help='Materialize training windows one batch at a time (for large datasets)')
     
     args = parser.parse_args()
     
@@ -160,6 +199,10 @@ def main():
     os.makedirs('logs', exist_ok=True)
     os.makedirs('plots', exist_ok=True)
     
+    if args.corpus:
+        train_on_corpus(args)
+        return
+    
     # Load or generate patient data
     if args.synthetic:
         patient_data = generate_synthetic_data(hours=args.synthetic_hours)
@@ -201,7 +244,8 @@ def main():
     
     # Prepare data
     X_train, y_train, X_val, y_val, X_test, y_test = trainer.prepare_data(
-        patient_data, test_size=0.15, validation_size=0.15
+        patient_data, test_size=0.15, validation_size=0.15,
+        lazy=args.lazy_batches, batch_size=args.batch_size
     )
     
     # Train model
@@ -219,8 +263,12 @@ def main():
         trainer.visualize_training_history('plots/training_history.png')
         
         # Visualize predictions on a test sample
-        sample_input = X_test[0:1]
-        sample_target = y_test[0]
+        if y_test is None:
+            X_batch, y_batch = X_test[0]
+            sample_input, sample_target = X_batch[0:1], y_batch[0]
+        else:
+            sample_input = X_test[0:1]
+            sample_target = y_test[0]
         trainer.visualize_predictions(sample_input, sample_target, 'plots/prediction_sample.png')
     
     print("LSTM model training completed successfully.")
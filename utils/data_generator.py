@@ -27,6 +27,7 @@ class VitalsGenerator:
         
         # ECG pattern generation
         self.ecg_pattern = self._generate_base_ecg_pattern()
+        self.ecg_phase = {}  # Samples since the last beat started, per ECG stream
     
     def _generate_base_ecg_pattern(self):
         """Generate a simplified base ECG pattern"""
@@ -113,35 +114,41 @@ class VitalsGenerator:
             vitals['respiratory_rate'] += random.randint(10, 20)
         return vitals
     
-    def _generate_ecg_data(self, heart_rate):
-        """Generate 250 points of ECG data (represents ~2 seconds at 125Hz)"""
+    def _generate_ecg_data(self, heart_rate, stream=None):
+        """
+        Generate 250 points of ECG data (represents ~2 seconds at 125Hz).
+
+        The position within the current beat is carried over per stream, so
+        consecutive strips of a stream join into one continuous signal instead
+        of each restarting with a beat at sample 0. Strips without a stream
+        always start with a beat.
+
+        Args:
+            heart_rate (float): Heart rate of the strip in BPM
+            stream (str, optional): Signal the strip continues (e.g. a patient ID)
+        """
         # Calculate RR interval in samples based on heart rate
         # At 125Hz, a heart rate of 60 BPM means 125 samples per beat
         rr_interval = int(125 * 60 / heart_rate)
-        
-        # How many complete beats can we fit?
         beat_length = len(self.ecg_pattern)
-        num_beats = 250 // rr_interval + 1
-        
-        # Generate the ECG signal
+
+        # Generate the ECG signal, resuming where the stream's previous strip stopped
+        position = self.ecg_phase.get(stream, 0)
         ecg_signal = []
-        for i in range(num_beats):
-            # Add one beat
-            for j in range(beat_length):
-                if len(ecg_signal) < 250:
-                    # Add some small random variation
-                    noise = np.random.normal(0, 0.03)
-                    ecg_signal.append(self.ecg_pattern[j] + noise)
-            
-            # Fill the rest of the RR interval with baseline
-            for j in range(rr_interval - beat_length):
-                if len(ecg_signal) < 250:
-                    # Add some baseline with small noise
-                    noise = np.random.normal(0, 0.01)
-                    ecg_signal.append(0.05 + noise)
-        
-        # Ensure we have exactly 250 points
-        ecg_signal = ecg_signal[:250]
+        for _ in range(250):
+            if position >= rr_interval:
+                position = 0
+            if position < beat_length:
+                # Beat with some small random variation
+                noise = np.random.normal(0, 0.03)
+                ecg_signal.append(self.ecg_pattern[position] + noise)
+            else:
+                # Baseline with small noise for the rest of the RR interval
+                noise = np.random.normal(0, 0.01)
+                ecg_signal.append(0.05 + noise)
+            position += 1
+        if stream is not None:
+            self.ecg_phase[stream] = position
         
         # If this is an abnormal period, add some ECG abnormalities
         if self.abnormal_period:
@@ -158,8 +165,15 @@ class VitalsGenerator:
         
         return ecg_signal
     
-    def generate_vitals(self, timestamp=None):
-        """Generate a set of vital signs data"""
+    def generate_vitals(self, timestamp=None, ecg_stream=None):
+        """
+        Generate a set of vital signs data.
+
+        Args:
+            timestamp (datetime, optional): Time of the reading
+            ecg_stream (str, optional): ECG signal the reading's strip continues;
+                                        strips of the same stream are contiguous
+        """
         # Get time-based variations
         if self.time_dependent_variation and timestamp is not None:
             variation = self._get_time_variation(timestamp)
@@ -211,7 +225,7 @@ class VitalsGenerator:
             vitals = self._apply_abnormality(vitals)
         
         # Generate ECG data
-        vitals['ecg_data'] = self._generate_ecg_data(vitals['heart_rate'])
+        vitals['ecg_data'] = self._generate_ecg_data(vitals['heart_rate'], ecg_stream)
         
         # Update last values for continuity
         self.last_values = {
@@ -1,5 +1,8 @@
+import json
+import os
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import MinMaxScaler
 from datetime import datetime
 
@@ -37,6 +40,69 @@ class HealthcareDataPreprocessor:
         # Initialize scalers for each feature
         self.scalers = {feature: MinMaxScaler(feature_range=(0, 1)) 
                         for feature in self.feature_columns}
+        
+        # Frozen affine transform (x * scale + offset) taken from the fitted scalers
+        self.scale = None
+        self.offset = None
+    
+    @property
+    def scalers_fitted(self):
+        """True once the scalers have been fitted or loaded."""
+        return self.scale is not None
+    
+    def _freeze_scalers(self):
+        """Collect the fitted scaler parameters into float32 vectors."""
+        self.scale = np.array([self.scalers[f].scale_[0] for f in self.feature_columns], dtype=np.float32)
+        self.offset = np.array([self.scalers[f].min_[0] for f in self.feature_columns], dtype=np.float32)
+    
+    def save_scalers(self, path):
+        """
+        Save the fitted scaler parameters so inference uses the training scale.
+        
+        Args:
+            path (str): Path of the JSON file to write
+        """
+        if not self.scalers_fitted:
+            raise ValueError("Scalers have not been fitted yet.")
+        
+        with open(path, 'w') as f:
+            json.dump({
+                feature: {
+                    'data_min': float(self.scalers[feature].data_min_[0]),
+                    'data_max': float(self.scalers[feature].data_max_[0])
+                }
+                for feature in self.feature_columns
+            }, f)
+    
+    def load_scalers(self, path):
+        """
+        Load scaler parameters saved at training time.
+        
+        Args:
+            path (str): Path of the JSON file written by save_scalers
+            
+        Returns:
+            bool: True if the scalers were loaded
+        """
+        if not os.path.exists(path):
+            return False
+        
+        with open(path, 'r') as f:
+            self.set_scaler_ranges(json.load(f))
+        return True
+    
+    def set_scaler_ranges(self, ranges):
+        """
+        Fit the scalers from known per-feature ranges instead of raw data.
+        
+        Args:
+            ranges (dict): {feature: {'data_min': ..., 'data_max': ...}}, as written
+                           by save_scalers or TrainingCorpus.scaler_ranges
+        """
+        for feature in self.feature_columns:
+            data_range = np.array([[ranges[feature]['data_min']], [ranges[feature]['data_max']]])
+            self.scalers[feature].fit(data_range)
+        self._freeze_scalers()
     
     def convert_to_dataframe(self, patient_data_history):
         """
@@ -67,12 +133,14 @@ class HealthcareDataPreprocessor:
         
         return df
     
-    def normalize_data(self, df):
+    def normalize_data(self, df, fit=True):
         """
         Normalize each feature to [0,1] range.
         
         Args:
             df (pd.DataFrame): DataFrame with features
+            fit (bool): Fit the scalers on this data (training) instead of
+                        reusing the frozen ones
             
         Returns:
             pd.DataFrame: DataFrame with normalized features
@@ -82,38 +150,65 @@ class HealthcareDataPreprocessor:
         # Normalize each feature separately
         for feature in self.feature_columns:
             feature_data = df[feature].values.reshape(-1, 1)
-            self.scalers[feature].fit(feature_data)
+            if fit:
+                self.scalers[feature].fit(feature_data)
             normalized_df[feature] = self.scalers[feature].transform(feature_data)
         
+        if fit:
+            self._freeze_scalers()
+        
         return normalized_df
     
-    def create_sequences(self, df):
+    def transform_window(self, window):
         """
-        Create sequences for LSTM training from normalized dataframe.
+        Apply the frozen scalers to raw feature values in one affine step.
         
         Args:
-            df (pd.DataFrame): DataFrame with normalized features
+            window (numpy.ndarray): Raw values with shape (..., features)
             
         Returns:
-            tuple: (X, y) where X is input sequences and y is target sequences
+            numpy.ndarray: Normalized float32 values with the same shape
         """
-        X = []
-        y = []
+        return window * self.scale + self.offset
+    
+    def sequence_windows(self, feature_data):
+        """
+        Build input and target windows as strided views (no data is copied).
+        
+        Args:
+            feature_data (numpy.ndarray): Feature values with shape (time, features)
+            
+        Returns:
+            tuple: (X, y) read-only views with shapes (samples, sequence_length, features)
+                   and (samples, prediction_horizon, features)
+        """
+        n_samples = max(0, len(feature_data) - self.sequence_length - self.prediction_horizon + 1)
         
-        # Extract feature arrays
-        feature_data = df[self.feature_columns].values
+        # sliding_window_view puts the window axis last: (windows, features, length)
+        X = sliding_window_view(feature_data, self.sequence_length, axis=0)[:n_samples]
+        y = sliding_window_view(feature_data[self.sequence_length:], self.prediction_horizon, axis=0)[:n_samples]
         
-        # Create sequences
-        for i in range(len(df) - self.sequence_length - self.prediction_horizon + 1):
-            # Input sequence
-            X.append(feature_data[i:i+self.sequence_length])
+        return X.transpose(0, 2, 1), y.transpose(0, 2, 1)
+    
+    def create_sequences(self, df, flatten_targets=True):
+        """
+        Create sequences for LSTM training from normalized dataframe.
+        
+        Args:
+            df (pd.DataFrame): DataFrame with normalized features
+            flatten_targets (bool): Flatten each target window for multi-output
+                                    prediction (this copies the targets)
             
-            # Target sequence (next prediction_horizon time steps for all features)
-            target_sequence = feature_data[i+self.sequence_length:i+self.sequence_length+self.prediction_horizon]
-            # Flatten the target sequence for multi-output prediction
-            y.append(target_sequence.flatten())
+        Returns:
+            tuple: (X, y) where X is a view of the input sequences and y holds
+                   the target sequences
+        """
+        X, y = self.sequence_windows(df[self.feature_columns].to_numpy())
+        
+        if flatten_targets:
+            y = y.reshape(len(y), -1)
         
-        return np.array(X), np.array(y)
+        return X, y
     
     def inverse_transform_predictions(self, predictions):
         """
@@ -147,39 +242,204 @@ class HealthcareDataPreprocessor:
             formatted_time = datetime.fromtimestamp(future_time).strftime("%Y-%m-%d %H:%M:%S")
             results['timestamps'].append(formatted_time)
         
-        # Denormalize each feature
+        # Denormalize all features at once with the frozen scalers
+        denormalized = (predictions_shaped[0] - self.offset) / self.scale
         for i, feature in enumerate(self.feature_columns):
-            # Extract predictions for this feature
-            feature_predictions = predictions_shaped[0, :, i].reshape(-1, 1)
-            
-            # Inverse transform to original scale
-            denormalized = self.scalers[feature].inverse_transform(feature_predictions).flatten()
-            
-            # Store in results dictionary
-            results[feature] = denormalized.tolist()
+            results[feature] = denormalized[:, i].tolist()
         
         return results
     
-    def preprocess_real_time_data(self, patient_data_history):
+    def preprocess_real_time_data(self, patient_data_history, window=None, appended=None):
         """
         Preprocess real-time data for prediction.
         
         Args:
             patient_data_history (dict): Dictionary with patient's history
+            window (VitalSignWindow, optional): Patient's rolling input window;
+                                                a temporary one is used if omitted
+            appended (int, optional): Number of readings ever appended to the
+                                      history (see VitalSignWindow.sync)
             
         Returns:
             numpy.ndarray: Preprocessed input for LSTM prediction
         """
-        # Convert to dataframe
-        df = self.convert_to_dataframe(patient_data_history)
+        if not self.scalers_fitted:
+            # No scalers from training: fit once on the available history and keep them
+            self.normalize_data(self.convert_to_dataframe(patient_data_history))
+        
+        if window is None:
+            window = VitalSignWindow(self.sequence_length, self.feature_columns)
+        window.sync(patient_data_history, appended)
         
-        # Normalize data
-        normalized_df = self.normalize_data(df)
+        if not window.is_full:
+            raise ValueError(f"Not enough data points. Need at least {self.sequence_length} time steps.")
         
-        # Use the last sequence_length time steps as input
-        if len(normalized_df) >= self.sequence_length:
-            input_data = normalized_df[self.feature_columns].values[-self.sequence_length:]
-            input_sequence = np.array([input_data])
-            return input_sequence
+        return self.transform_window(window.view())
+
+
+class WindowBatches:
+    """
+    Training windows from one or more patients, materialized a batch at a time.
+    
+    Holds zero-copy window views (see HealthcareDataPreprocessor.sequence_windows)
+    per patient and only copies the windows of the batch being requested, so
+    memory stays proportional to the raw series rather than to
+    samples * sequence_length.
+    """
+    
+    def __init__(self, inputs, targets, batch_size=32):
+        """
+        Initialize the batches.
+        
+        Args:
+            inputs (list): Input window views, one (samples, sequence_length, features) array per patient
+            targets (list): Matching (samples, prediction_horizon, features) target views
+            batch_size (int): Number of windows per batch
+        """
+        self.inputs = list(inputs)
+        self.targets = list(targets)
+        self.batch_size = batch_size
+        self._offsets = np.concatenate([[0], np.cumsum([len(x) for x in self.inputs])]).astype(int)
+    
+    @property
+    def sample_count(self):
+        return int(self._offsets[-1])
+    
+    def __len__(self):
+        return int(np.ceil(self.sample_count / self.batch_size))
+    
+    def _gather(self, start, stop):
+        """Copy windows start..stop (across patients) into contiguous arrays."""
+        inputs, targets = [], []
+        first = np.searchsorted(self._offsets, start, side='right') - 1
+        for patient in range(first, len(self.inputs)):
+            offset = self._offsets[patient]
+            if offset >= stop:
+                break
+            lo, hi = max(start, offset) - offset, min(stop, self._offsets[patient + 1]) - offset
+            inputs.append(self.inputs[patient][lo:hi])
+            targets.append(self.targets[patient][lo:hi])
+        
+        if not inputs:
+            raise ValueError("No training windows in the requested range.")
+        
+        X = np.concatenate(inputs).astype(np.float32)
+        y = np.concatenate(targets).astype(np.float32).reshape(len(X), -1)
+        return X, y
+    
+    def batch(self, index):
+        """
+        Get one batch.
+        
+        Args:
+            index (int): Batch number
+            
+        Returns:
+            tuple: (X, y) with shapes (batch, sequence_length, features) and
+                   (batch, prediction_horizon * features)
+        """
+        start = index * self.batch_size
+        return self._gather(start, min(start + self.batch_size, self.sample_count))
+    
+    def materialize(self):
+        """Copy all windows into arrays (only for small sets)."""
+        return self._gather(0, self.sample_count)
+
+
+class VitalSignWindow:
+    """
+    Rolling float32 window of the latest readings for one patient.
+    
+    Every value is written twice, sequence_length slots apart, so the last
+    sequence_length readings always form one contiguous slice and the LSTM
+    input can be returned as a (1, sequence_length, features) view without
+    copying or reordering.
+    """
+    
+    def __init__(self, sequence_length, feature_columns):
+        """
+        Initialize an empty window.
+        
+        Args:
+            sequence_length (int): Number of time steps kept
+            feature_columns (list): History keys of the features, in model order
+        """
+        self.sequence_length = sequence_length
+        self.feature_columns = list(feature_columns)
+        self._buffer = np.zeros((2 * sequence_length, len(self.feature_columns)), dtype=np.float32)
+        self._position = 0
+        self.count = 0
+        self.last_timestamp = None
+        self.appended = None  # History version (readings appended) at the last sync
+    
+    @property
+    def is_full(self):
+        return self.count >= self.sequence_length
+    
+    def append(self, values, timestamp=None):
+        """
+        Add one reading.
+        
+        Args:
+            values (array-like): Feature values in feature_columns order
+            timestamp (str, optional): Timestamp of the reading
+        """
+        self._buffer[self._position] = values
+        self._buffer[self._position + self.sequence_length] = values
+        self._position = (self._position + 1) % self.sequence_length
+        self.count += 1
+        self.last_timestamp = timestamp
+    
+    def sync(self, patient_data_history, appended=None):
+        """
+        Append the readings added to a history since the last sync.
+        
+        Normally only the newest reading is new. With appended, the count of
+        readings ever added to the history, the new readings are the
+        difference to the count at the last sync. Without it they are found
+        by the last seen timestamp, which cannot tell apart readings taken in
+        the same second. If the window fell more than sequence_length readings
+        behind it is refilled from the tail of the history.
+        
+        Args:
+            patient_data_history (dict): Dictionary with patient's history
+            appended (int, optional): Number of readings ever appended to the
+                                      history (the caller's history version)
+        """
+        timestamps = patient_data_history['timestamps']
+        n_samples = len(timestamps)
+        
+        start = max(0, n_samples - self.sequence_length)
+        if appended is not None and self.appended is not None:
+            new_readings = appended - self.appended
+            if 0 <= new_readings <= n_samples - start:
+                start = n_samples - new_readings
+            else:
+                self.count = 0
+        elif appended is None and self.last_timestamp is not None:
+            for i in range(n_samples - 1, start - 1, -1):
+                if timestamps[i] == self.last_timestamp:
+                    start = i + 1
+                    break
+            else:
+                self.count = 0
         else:
-            raise ValueError(f"Not enough data points. Need at least {self.sequence_length} time steps.")
\ No newline at end of file
+            self.count = 0
+        
+        for i in range(start, n_samples):
+            self.append([patient_data_history[f][i] for f in self.feature_columns], timestamps[i])
+        self.appended = appended
+    
+    def view(self):
+        """
+        Get the window in chronological order.
+        
+        Returns:
+            numpy.ndarray: View with shape (1, sequence_length, features)
+        """
+        return self._buffer[None, self._position:self._position + self.sequence_length]
+
+
+def scaler_path(model_path):
+    """Path of the scaler file saved alongside an LSTM model."""
+    return os.path.splitext(model_path)[0] + '_scalers.json'
\ No newline at end of file
@@ -0,0 +1,182 @@
+import time
+import threading
+import numpy as np
+
+class HistoryRescorer:
+    """
+    Batch job that re-evaluates stored vital sign history after models change.
+
+    History is streamed in large chunks through the autoencoder
+    (DeepAutoencoder.compute_anomaly_scores) and the traditional forest or
+    streaming scorer (AnomalyDetector.score_history). Each run writes its
+    results as a new score version, leaving earlier versions untouched, so
+    labels from different model generations can be compared side by side.
+
+    Score versions are kept apart from the history dictionaries themselves:
+    the monitoring loop appends to and trims those lists in place, which would
+    misalign any extra columns stored alongside them.
+    """
+
+    def __init__(self, anomaly_detector, config=None, history_lock=None):
+        """
+        Initialize the rescoring job.
+
+        Args:
+            anomaly_detector: AnomalyDetector or EnhancedAnomalyDetector whose
+                models are used for scoring
+            config (dict, optional): Configuration parameters:
+                - batch_size: Number of readings scored per chunk
+                - max_versions: Number of most recent score versions kept
+            history_lock (threading.Lock, optional): Lock the monitoring loop
+                holds while it changes the histories; held while they are copied
+        """
+        # Default configuration
+        self.config = {
+            'batch_size': 8192,
+            'max_versions': 5,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self.anomaly_detector = anomaly_detector
+
+        self.history_lock = history_lock or threading.Lock()
+
+        # Score columns per version: {version: {patient_id: columns}}
+        self.versions = {}
+        self._latest_version = 0
+
+    def _autoencoder(self):
+        """Return the detector's trained autoencoder wrapper, if any."""
+        autoencoder_detector = getattr(self.anomaly_detector, 'autoencoder_detector', None)
+        if autoencoder_detector is not None and autoencoder_detector.model_trained:
+            return autoencoder_detector
+        return None
+
+    def _rescore_patient(self, history):
+        """
+        Score one patient's history chunk by chunk.
+
+        Args:
+            history (dict): Patient history dictionary
+
+        Returns:
+            tuple: (columns, batch_count) where columns maps score names to arrays
+        """
+        n_samples = len(history['timestamps'])
+        batch_size = self.config['batch_size']
+        autoencoder_detector = self._autoencoder()
+        use_models = self.anomaly_detector.models_trained
+
+        columns = {'timestamps': history['timestamps']}
+        batch_count = 0
+
+        for start in range(0, n_samples, batch_size):
+            end = min(start + batch_size, n_samples)
+            chunk = {key: values[start:end] for key, values in history.items()}
+            chunk_results = {}
+
+            if use_models:
+                for name, result in self.anomaly_detector.score_history(chunk).items():
+                    chunk_results[f'{name}_score'] = result['score']
+                    chunk_results[f'{name}_is_anomaly'] = result['is_anomaly']
+
+            if autoencoder_detector is not None:
+                autoencoder = autoencoder_detector.autoencoder
+                features = autoencoder_detector._prepare_training_data(chunk)
+                overall, feature_scores = autoencoder.compute_anomaly_scores(features, batch_size=len(features))
+
+                chunk_results['autoencoder_score'] = overall
+                chunk_results['autoencoder_is_anomaly'] = overall > autoencoder.threshold
+                anomalous_features = feature_scores > autoencoder.feature_thresholds
+                for i, feature in enumerate(autoencoder_detector.config['feature_columns']):
+                    chunk_results[f'autoencoder_{feature}_score'] = feature_scores[:, i]
+                    chunk_results[f'autoencoder_{feature}_is_anomaly'] = anomalous_features[:, i]
+
+            # Preallocate output columns once their dtypes are known
+            for name, values in chunk_results.items():
+                if name not in columns:
+                    columns[name] = np.empty(n_samples, dtype=np.asarray(values).dtype)
+                columns[name][start:end] = values
+
+            batch_count += 1
+
+        return columns, batch_count
+
+    def rescore(self, histories, version=None):
+        """
+        Rescore the stored history of one or more patients.
+
+        Args:
+            histories (dict): Either a single patient history dictionary or a
+                mapping of patient_id -> history dictionary for the whole fleet
+            version (int, optional): Version number to write; defaults to the
+                next version after the latest one
+
+        Returns:
+            dict: Throughput report for the run
+        """
+        if 'timestamps' in histories:
+            histories = {'default': histories}
+
+        # Copy the histories so appends and trims during the run cannot misalign columns
+        with self.history_lock:
+            histories = {
+                patient_id: {key: list(values) for key, values in history.items() if key != 'ecg_data'}
+                for patient_id, history in list(histories.items())
+            }
+
+        if version is None:
+            version = self._latest_version + 1
+
+        start_time = time.perf_counter()
+        results = {}
+        total_rows = 0
+        total_batches = 0
+
+        for patient_id, history in histories.items():
+            columns, batch_count = self._rescore_patient(history)
+            results[patient_id] = columns
+            total_rows += len(columns['timestamps'])
+            total_batches += batch_count
+
+        elapsed = time.perf_counter() - start_time
+
+        # Publish the whole version at once and drop the oldest beyond max_versions
+        self.versions[version] = results
+        self._latest_version = max(self._latest_version, version)
+        for old_version in sorted(self.versions)[:-self.config['max_versions']]:
+            del self.versions[old_version]
+
+        report = {
+            'version': version,
+            'patients': len(results),
+            'rows': total_rows,
+            'batches': total_batches,
+            'seconds': elapsed,
+            # None rather than inf (not valid JSON) when the run was too short to time
+            'rows_per_second': total_rows / elapsed if elapsed > 0 else None
+        }
+
+        rate = f" ({report['rows_per_second']:.0f} rows/s)" if report['rows_per_second'] is not None else ""
+        print(f"Rescored {total_rows} readings for {len(results)} patient(s) as version {version} "
+              f"in {elapsed:.2f}s{rate}")
+
+        return report
+
+    def get_scores(self, patient_id='default', version=None):
+        """
+        Get stored score columns for a patient.
+
+        Args:
+            patient_id (str): Patient identifier
+            version (int, optional): Score version, defaults to the latest
+
+        Returns:
+            dict: Score columns, or None if the patient was not rescored
+        """
+        if version is None:
+            version = self._latest_version
+        return self.versions.get(version, {}).get(patient_id)
@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import itertools
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.data_preprocessing import HealthcareDataPreprocessor
+
+# Bumped whenever the fold layout changes, so stale cached folds are not reused
+FOLD_CACHE_VERSION = 2
+
+class SweepRunner:
+    """
+    Walk-forward cross-validation and grid search for the LSTM forecaster.
+
+    Every patient's series is cut into expanding-window folds: fold k trains
+    on everything before a cut point and is tested on the readings right
+    after it, so a model is never evaluated on data older than its training
+    set. A fold tests at least prediction_horizon readings, so it has at
+    least one full target window. Scalers are fitted on the training part
+    of each fold only, and folds left without training or test windows
+    are skipped.
+
+    Preprocessed folds are cached on disk as .npy files keyed by the data and
+    the preprocessing parameters, so trials that share a sequence length (and
+    later sweeps on the same data) reuse them. Trials run in a pool of worker
+    processes with a capped number of TensorFlow threads each, and every
+    (trial, fold) result is written to a results table.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the sweep runner.
+
+        Args:
+            config (dict, optional): Configuration parameters:
+                - grid: Hyperparameter name -> list of values (HealthcareLSTM config keys)
+                - n_folds: Number of walk-forward folds
+                - test_fraction: Share of each patient's series tested per fold
+                - validation_size: Share of each fold's training windows used for early stopping
+                - prediction_horizon: Number of time steps to predict ahead
+                - epochs: Training epochs per trial
+                - batch_size: Training batch size
+                - workers: Number of worker processes
+                - threads_per_worker: TensorFlow intra-op threads per worker
+                - cache_dir: Directory of the preprocessed fold cache
+                - results_path: CSV file the results table is written to
+        """
+        # Default configuration
+        self.config = {
+            'grid': {
+                'lstm_units': [32, 64],
+                'sequence_length': [24, 48],
+                'bidirectional': [True, False],
+                'dropout_rate': [0.1, 0.2],
+            },
+            'n_folds': 3,
+            'test_fraction': 0.1,
+            'validation_size': 0.15,
+            'prediction_horizon': 12,
+            'epochs': 50,
+            'batch_size': 32,
+            'workers': max(1, (os.cpu_count() or 1) // 2),
+            'threads_per_worker': 2,
+            'cache_dir': 'cache/sweep_folds',
+            'results_path': 'logs/lstm_sweep_results.csv',
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+    def trials(self):
+        """All hyperparameter combinations of the grid, as config dicts."""
+        grid = self.config['grid']
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+    def _fold_bounds(self, n_rows):
+        """Row cut points (train end, test end) of each walk-forward fold."""
+        # Fewer test rows than the horizon would leave no complete target window
+        test_rows = max(self.config['prediction_horizon'], int(n_rows * self.config['test_fraction']))
+        n_folds = self.config['n_folds']
+        first_cut = n_rows - n_folds * test_rows
+        return [(first_cut + k * test_rows, first_cut + (k + 1) * test_rows) for k in range(n_folds)]
+
+    def _prepare_folds(self, series, sequence_length):
+        """
+        Build (or load from the cache) the folds for one sequence length.
+
+        Args:
+            series (list): Raw (time, features) arrays, one per patient
+            sequence_length (int): Input window length
+
+        Returns:
+            list: (fold, directory) pairs of the usable folds, each directory
+                  holding X/y arrays for train, val and test
+        """
+        horizon = self.config['prediction_horizon']
+        preprocessor = HealthcareDataPreprocessor(sequence_length=sequence_length, prediction_horizon=horizon)
+
+        digest = hashlib.sha1()
+        for rows in series:
+            digest.update(np.ascontiguousarray(rows).tobytes())
+        digest.update(json.dumps([FOLD_CACHE_VERSION, sequence_length, horizon, self.config['n_folds'],
+                                  self.config['test_fraction'], self.config['validation_size']]).encode())
+        key = digest.hexdigest()[:16]
+
+        fold_dirs = []
+        for fold in range(self.config['n_folds']):
+            fold_dir = os.path.join(self.config['cache_dir'], f'{key}-fold{fold}')
+            if (not os.path.exists(os.path.join(fold_dir, 'y_test.npy'))
+                    and not self._build_fold(fold_dir, fold, series, sequence_length, preprocessor)):
+                print(f"Skipping fold {fold} (sequence length {sequence_length}): every series is too short")
+                continue
+
+            n_train = len(np.load(os.path.join(fold_dir, 'y_train.npy'), mmap_mode='r'))
+            n_test = len(np.load(os.path.join(fold_dir, 'y_test.npy'), mmap_mode='r'))
+            if n_train == 0 or n_test == 0:
+                print(f"Skipping fold {fold} (sequence length {sequence_length}): "
+                      f"{n_train} training and {n_test} test windows")
+                continue
+            fold_dirs.append((fold, fold_dir))
+
+        return fold_dirs
+
+    def _build_fold(self, fold_dir, fold, series, sequence_length, preprocessor):
+        """
+        Window one fold of every patient's series and save it to fold_dir.
+
+        Returns:
+            bool: False if no series is long enough to take part in the fold
+        """
+        horizon = self.config['prediction_horizon']
+        bounds = [self._fold_bounds(len(rows))[fold] for rows in series]
+
+        # Series without an input window before the cut take no part in the fold
+        usable = [(rows, (cut, end)) for rows, (cut, end) in zip(series, bounds) if cut >= sequence_length]
+        if not usable:
+            return False
+
+        # Fit the scalers on training rows only
+        train_rows = np.concatenate([rows[:cut] for rows, (cut, _) in usable])
+        preprocessor.set_scaler_ranges({
+            feature: {'data_min': float(train_rows[:, i].min()), 'data_max': float(train_rows[:, i].max())}
+            for i, feature in enumerate(preprocessor.feature_columns)
+        })
+
+        parts = {name: ([], []) for name in ('train', 'val', 'test')}
+        for rows, (cut, end) in usable:
+            X, y = preprocessor.sequence_windows(preprocessor.transform_window(rows[:end]))
+            # Training windows end before the cut; test targets start at or after it
+            n_train_val = max(0, cut - sequence_length - horizon + 1)
+            n_train = n_train_val - int(np.ceil(n_train_val * self.config['validation_size']))
+            test_start = cut - sequence_length
+            for name, part in (('train', slice(0, n_train)), ('val', slice(n_train, n_train_val)),
+                               ('test', slice(test_start, len(X)))):
+                parts[name][0].append(X[part])
+                parts[name][1].append(y[part].reshape(len(y[part]), horizon * y.shape[2]))
+
+        staging_dir = fold_dir + '.tmp'
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        for name, (inputs, targets) in parts.items():
+            np.save(os.path.join(staging_dir, f'X_{name}.npy'), np.concatenate(inputs))
+            np.save(os.path.join(staging_dir, f'y_{name}.npy'), np.concatenate(targets))
+        shutil.rmtree(fold_dir, ignore_errors=True)
+        os.replace(staging_dir, fold_dir)
+        return True
+
+    def run(self, patient_data_history):
+        """
+        Run every trial on every fold.
+
+        Args:
+            patient_data_history (dict): Patient history dictionary, or a mapping
+                                         of patient_id -> history dictionary
+
+        Returns:
+            pd.DataFrame: Trials ranked by mean test MSE over the folds
+        """
+        if 'timestamps' in patient_data_history:
+            patient_data_history = {'default': patient_data_history}
+
+        feature_columns = HealthcareDataPreprocessor().feature_columns
+        series = [
+            np.column_stack([np.asarray(history[feature], dtype=np.float32) for feature in feature_columns])
+            for history in patient_data_history.values()
+        ]
+
+        os.makedirs(self.config['cache_dir'], exist_ok=True)
+        trials = self.trials()
+        folds = {
+            length: self._prepare_folds(series, length)
+            for length in sorted({trial.get('sequence_length', 24) for trial in trials})
+        }
+
+        jobs = [
+            (trial_id, fold, trial, fold_dir)
+            for trial_id, trial in enumerate(trials)
+            for fold, fold_dir in folds[trial.get('sequence_length', 24)]
+        ]
+        if not jobs:
+            raise ValueError("No fold has training and test windows; the series are too short")
+        print(f"Running {len(jobs)} (trial, fold) jobs of {len(trials)} trials on {self.config['workers']} workers")
+
+        start = time.perf_counter()
+        rows = []
+        with ProcessPoolExecutor(
+            max_workers=self.config['workers'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_sweep_worker,
+            initargs=(self.config['threads_per_worker'],)
+        ) as executor:
+            futures = [
+                executor.submit(run_trial, trial, fold_dir, self.config['prediction_horizon'],
+                                self.config['epochs'], self.config['batch_size'])
+                for _, _, trial, fold_dir in jobs
+            ]
+            for (trial_id, fold, trial, _), future in zip(jobs, futures):
+                metrics = future.result()
+                rows.append({'trial': trial_id, 'fold': fold, **trial, **metrics})
+                print(f"Trial {trial_id} fold {fold}: test MSE {metrics['test_mse']:.6f}")
+
+        results = pd.DataFrame(rows)
+        os.makedirs(os.path.dirname(self.config['results_path']) or '.', exist_ok=True)
+        results.to_csv(self.config['results_path'], index=False)
+
+        summary = (results.groupby(['trial'] + list(self.config['grid']), dropna=False)
+                   .agg(test_mse=('test_mse', 'mean'), test_mse_std=('test_mse', 'std'),
+                        train_seconds=('train_seconds', 'sum'))
+                   .reset_index()
+                   .sort_values('test_mse'))
+
+        print(f"Sweep finished in {time.perf_counter() - start:.0f}s; results written to {self.config['results_path']}")
+        return summary
+
+
+def _init_sweep_worker(threads):
+    """Cap TensorFlow's thread pools before it is imported in a sweep worker."""
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_trial(trial, fold_dir, prediction_horizon, epochs, batch_size):
+    """
+    Train and evaluate one hyperparameter setting on one cached fold.
+
+    Args:
+        trial (dict): HealthcareLSTM configuration overrides
+        fold_dir (str): Directory with the fold's X/y arrays
+        prediction_horizon (int): Number of time steps predicted
+        epochs (int): Number of training epochs
+        batch_size (int): Batch size for training
+
+    Returns:
+        dict: Metrics of the trial on this fold
+    """
+    from models.lstm_model import HealthcareLSTM
+
+    arrays = {
+        name: np.load(os.path.join(fold_dir, f'{name}.npy'), mmap_mode='r')
+        for name in ('X_train', 'y_train', 'X_val', 'y_val', 'X_test', 'y_test')
+    }
+    feature_count = arrays['X_train'].shape[2]
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        lstm_model = HealthcareLSTM({
+            'prediction_horizon': prediction_horizon,
+            'feature_count': feature_count,
+            'model_path': os.path.join(model_dir, 'trial_model.keras'),
+            **trial
+        })
+
+        # Short series can leave a fold without validation windows
+        X_val, y_val = (arrays['X_val'], arrays['y_val']) if len(arrays['y_val']) else (None, None)
+
+        start = time.perf_counter()
+        history = lstm_model.train(arrays['X_train'], arrays['y_train'], X_val, y_val, epochs, batch_size)
+        train_seconds = time.perf_counter() - start
+
+        y_pred = lstm_model.predict(arrays['X_test']).reshape(len(arrays['y_test']), -1)
+
+    squared_error = np.square(np.asarray(arrays['y_test']) - y_pred)
+    return {
+        'test_mse': float(squared_error.mean()),
+        'test_mse_per_feature': json.dumps(
+            squared_error.reshape(-1, prediction_horizon, feature_count).mean(axis=(0, 1)).tolist()
+        ),
+        'best_val_loss': float(min(history.history.get('val_loss', [np.nan]))),
+        'epochs_run': len(history.history['loss']),
+        'train_seconds': train_seconds,
+    }
@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class MicroBatchQueue:
+    """
+    In-process queue that groups concurrent inference requests into batches.
+
+    Callers submit one input at a time and get a future back. A single worker
+    thread collects requests until max_batch_size inputs are waiting or the
+    first one has waited max_wait_ms, runs batch_fn once on the whole group,
+    and resolves every caller's future with its own output. Under concurrent
+    load this replaces many single-row model calls, each paying the full
+    per-call framework overhead, with a few batched calls. A request that
+    finds the queue empty after a single-request batch is run at once, so
+    a lone sequential caller does not wait max_wait_ms for company that
+    never comes; callers with many inputs should submit them all before
+    collecting the results.
+    """
+
+    def __init__(self, batch_fn, config=None):
+        """
+        Initialize the queue.
+
+        Args:
+            batch_fn (callable): Called with a list of inputs; must return a
+                sequence with one output per input, in the same order
+            config (dict, optional): Configuration parameters:
+                - max_batch_size: Maximum number of inputs per batch
+                - max_wait_ms: Longest time the oldest request waits for others
+        """
+        # Default configuration
+        self.config = {
+            'max_batch_size': 64,
+            'max_wait_ms': 5,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self.batch_fn = batch_fn
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+        # Counters for monitoring the effective batch size
+        self.stats = {'requests': 0, 'batches': 0}
+        self._last_batch_size = 1
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def submit(self, item):
+        """
+        Queue an input for the next batch.
+
+        Args:
+            item: Input accepted by batch_fn
+
+        Returns:
+            concurrent.futures.Future: Resolved with the output for this input
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        """Submit an input and wait for its output."""
+        return self.submit(item).result(timeout)
+
+    def _collect(self, first):
+        """Gather requests after the first one until the batch is full or the wait expires."""
+        batch = [first]
+        deadline = time.monotonic() + self.config['max_wait_ms'] / 1000
+        if self._queue.empty() and self._last_batch_size == 1:
+            # No sign of concurrent callers: take only what is already queued
+            deadline = 0
+
+        while len(batch) < self.config['max_batch_size']:
+            remaining = deadline - time.monotonic()
+            try:
+                # Anything already queued is taken without waiting
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Shutdown requested; finish this batch first
+                self._queue.put(None)
+                break
+            batch.append(request)
+
+        return batch
+
+    def _run(self):
+        """Worker loop."""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            futures = [future for _, future in batch]
+
+            self._last_batch_size = len(batch)
+
+            try:
+                outputs = self.batch_fn([item for item, _ in batch])
+                if len(outputs) != len(batch):
+                    raise ValueError(f"batch_fn returned {len(outputs)} outputs for {len(batch)} inputs")
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+
+    def shutdown(self):
+        """Stop the worker after the queued requests have been served."""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                self._queue.put(None)
+                self._worker.join()
+            self._worker = None
@@ -1,10 +1,24 @@
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 import matplotlib.pyplot as plt
 import os
 import json
 from datetime import datetime
+from tensorflow.keras.utils import Sequence
+from utils.data_preprocessing import WindowBatches
+
+class WindowSequence(Sequence):
+    """Keras adapter that feeds WindowBatches to fit/evaluate batch by batch."""
+    
+    def __init__(self, windows):
+        super().__init__()
+        self.windows = windows
+    
+    def __len__(self):
+        return len(self.windows)
+    
+    def __getitem__(self, index):
+        return self.windows.batch(index)
 
 class ModelTrainer:
     """
@@ -26,39 +40,71 @@ class ModelTrainer:
         self.training_history = None
         self.metrics = {}
     
-    def prepare_data(self, patient_data_history, test_size=0.2, validation_size=0.2):
+    def prepare_data(self, patient_data_history, test_size=0.2, validation_size=0.2, lazy=False, batch_size=32,
+                     fit_scalers=True):
         """
         Prepare the data for training by creating sequences and splitting into sets.
         
+        Each patient's windows are split chronologically (no shuffling, to
+        preserve time series order). Windows are strided views of the
+        normalized series, so nothing is copied until arrays or batches are
+        requested.
+        
         Args:
-            patient_data_history (dict): Dictionary with patient history data
+            patient_data_history (dict): Dictionary with patient history data, or a
+                                         mapping of patient_id -> history dictionary
             test_size (float): Proportion of data to use for testing
             validation_size (float): Proportion of training data to use for validation
+            lazy (bool): Return Keras sequences that materialize one batch at a time
+                         instead of arrays; targets are then returned as None, and
+                         so is the validation sequence when it has no windows
+            batch_size (int): Batch size of the lazy sequences
+            fit_scalers (bool): Fit the scalers on this data; when False the preprocessor's
+                                loaded scalers are used (e.g. those of an existing model)
             
         Returns:
             tuple: (X_train, y_train, X_val, y_val, X_test, y_test)
         """
-        # Convert to dataframe and normalize
-        df = self.data_preprocessor.convert_to_dataframe(patient_data_history)
-        normalized_df = self.data_preprocessor.normalize_data(df)
-        
-        # Create sequences
-        X, y = self.data_preprocessor.create_sequences(normalized_df)
-        
-        # First split: training+validation and test
-        X_train_val, X_test, y_train_val, y_test = train_test_split(
-            X, y, test_size=test_size, shuffle=False  # No shuffle to preserve time series order
-        )
-        
-        # Second split: training and validation
-        X_train, X_val, y_train, y_val = train_test_split(
-            X_train_val, y_train_val, test_size=validation_size, shuffle=False
-        )
-        
-        print(f"Training set: {X_train.shape[0]} samples")
-        print(f"Validation set: {X_val.shape[0]} samples")
-        print(f"Test set: {X_test.shape[0]} samples")
-        
+        if 'timestamps' in patient_data_history:
+            patient_data_history = {'default': patient_data_history}
+        
+        # Fit the scalers on all patients together
+        frames = [self.data_preprocessor.convert_to_dataframe(history) for history in patient_data_history.values()]
+        if fit_scalers:
+            self.data_preprocessor.normalize_data(pd.concat(frames, ignore_index=True))
+        
+        splits = {name: ([], []) for name in ('train', 'val', 'test')}
+        for df in frames:
+            normalized = self.data_preprocessor.normalize_data(df, fit=False)
+            X, y = self.data_preprocessor.sequence_windows(
+                normalized[self.data_preprocessor.feature_columns].to_numpy(dtype=np.float32)
+            )
+            
+            # Same split sizes as sklearn's train_test_split
+            n_test = int(np.ceil(len(X) * test_size))
+            n_train_val = len(X) - n_test
+            n_train = n_train_val - int(np.ceil(n_train_val * validation_size))
+            
+            for name, part in (('train', slice(0, n_train)), ('val', slice(n_train, n_train_val)),
+                               ('test', slice(n_train_val, len(X)))):
+                splits[name][0].append(X[part])
+                splits[name][1].append(y[part])
+        
+        sets = {name: WindowBatches(inputs, targets, batch_size) for name, (inputs, targets) in splits.items()}
+        
+        print(f"Training set: {sets['train'].sample_count} samples")
+        print(f"Validation set: {sets['val'].sample_count} samples")
+        print(f"Test set: {sets['test'].sample_count} samples")
+        
+        if lazy:
+            # Keras cannot validate on a sequence without batches
+            val_sequence = WindowSequence(sets['val']) if len(sets['val']) else None
+            return (WindowSequence(sets['train']), None, val_sequence, None,
+                    WindowSequence(sets['test']), None)
+        
+        X_train, y_train = sets['train'].materialize()
+        X_val, y_val = sets['val'].materialize()
+        X_test, y_test = sets['test'].materialize()
         return X_train, y_train, X_val, y_val, X_test, y_test
     
     def train_model(self, X_train, y_train, X_val, y_val, epochs=50, batch_size=32):
@@ -95,28 +141,36 @@ class ModelTrainer:
             dict: Evaluation metrics
         """
         print("Evaluating model on test data...")
-        test_loss = self.lstm_model.model.evaluate(X_test, y_test, verbose=1)
-        
-        # Make predictions on test data
-        y_pred = self.lstm_model.model.predict(X_test)
-        
-        # Calculate MSE for each feature and time step
         prediction_horizon = self.data_preprocessor.prediction_horizon
         feature_count = len(self.data_preprocessor.feature_columns)
         
-        # Reshape predictions and targets
-        y_test_reshaped = y_test.reshape(-1, prediction_horizon, feature_count)
-        y_pred_reshaped = y_pred.reshape(-1, prediction_horizon, feature_count)
+        if y_test is None:
+            # Lazily batched windows: accumulate squared errors batch by batch
+            test_loss = self.lstm_model.model.evaluate(X_test, verbose=1)
+            squared_error = np.zeros((prediction_horizon, feature_count))
+            sample_count = 0
+            for index in range(len(X_test)):
+                X_batch, y_batch = X_test[index]
+                y_pred = np.asarray(self.lstm_model.model.predict_on_batch(X_batch))
+                squared_error += ((y_batch - y_pred).reshape(-1, prediction_horizon, feature_count) ** 2).sum(axis=0)
+                sample_count += len(X_batch)
+            mse = squared_error / sample_count
+        else:
+            test_loss = self.lstm_model.model.evaluate(X_test, y_test, verbose=1)
+            
+            # Make predictions on test data
+            y_pred = self.lstm_model.model.predict(X_test)
+            
+            # Reshape predictions and targets, then average over samples
+            y_test_reshaped = y_test.reshape(-1, prediction_horizon, feature_count)
+            y_pred_reshaped = y_pred.reshape(-1, prediction_horizon, feature_count)
+            mse = np.mean((y_test_reshaped - y_pred_reshaped) ** 2, axis=0)
         
         # Calculate errors per feature and time step
         feature_errors = {}
         for i, feature in enumerate(self.data_preprocessor.feature_columns):
-            # Get predictions and actual values for this feature
-            y_true_feature = y_test_reshaped[:, :, i]
-            y_pred_feature = y_pred_reshaped[:, :, i]
-            
-            # Calculate mean squared error per time step
-            mse_per_step = np.mean((y_true_feature - y_pred_feature) ** 2, axis=0)
+            # Mean squared error per time step for this feature
+            mse_per_step = mse[:, i]
             
             # Store in dictionary
             feature_errors[feature] = {
@@ -0,0 +1,135 @@
+import numpy as np
+
+class KLLSketch:
+    """
+    Mergeable streaming quantile sketch (Karnin, Lang & Liberty, 2016).
+
+    Values are kept in a hierarchy of compactors. When a level fills up it is
+    sorted and every other item is promoted to the next level, where each
+    item stands for twice as many original values. Memory stays around
+    O(k log(n / k)) items while rank error is about 1.65 / k, and two sketches
+    built on different shards can be merged into one without the raw data.
+    """
+
+    def __init__(self, k=200, seed=None):
+        """
+        Initialize an empty sketch.
+
+        Args:
+            k (int): Size of the top compactor; larger is more accurate
+            seed (int, optional): Seed for the compaction coin flips
+        """
+        self.k = k
+        self.count = 0
+        self.compactors = [np.empty(0)]
+        self._rng = np.random.RandomState(seed)
+
+    def _capacity(self, level):
+        """Capacity of a compactor; lower levels shrink geometrically."""
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _size(self):
+        return sum(len(items) for items in self.compactors)
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self):
+        """Compact levels until the sketch is back within its size budget."""
+        while self._size() >= self._max_size():
+            for level, items in enumerate(self.compactors):
+                if len(items) < self._capacity(level):
+                    continue
+
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+
+                items = np.sort(items)
+                # An odd item out stays at this level
+                if len(items) % 2:
+                    leftover, items = items[-1:], items[:-1]
+                else:
+                    leftover = np.empty(0)
+
+                promoted = items[self._rng.randint(2)::2]
+                self.compactors[level + 1] = np.concatenate((self.compactors[level + 1], promoted))
+                self.compactors[level] = leftover
+                break
+
+    def update(self, value):
+        """Add a single value."""
+        self.update_many([value])
+
+    def update_many(self, values):
+        """
+        Add a batch of values.
+
+        Args:
+            values (array-like): Values to add
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        if len(values) == 0:
+            return
+        self.compactors[0] = np.concatenate((self.compactors[0], values))
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+
+        Args:
+            other (KLLSketch): Sketch built on a different part of the stream
+
+        Returns:
+            KLLSketch: self
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate((self.compactors[level], items))
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile of all values seen so far.
+
+        Args:
+            q (float or array-like): Quantile(s) in [0, 1]
+
+        Returns:
+            float or numpy.ndarray: Estimated quantile value(s), NaN if empty
+        """
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float('nan')
+
+        values = np.concatenate(self.compactors)
+        weights = np.concatenate([
+            np.full(len(items), 2.0 ** level) for level, items in enumerate(self.compactors)
+        ])
+        order = np.argsort(values)
+        cumulative = np.cumsum(weights[order])
+
+        ranks = np.asarray(q, dtype=float) * cumulative[-1]
+        index = np.minimum(np.searchsorted(cumulative, ranks), len(values) - 1)
+        result = values[order][index]
+        return result if np.ndim(q) else float(result)
+
+    def to_dict(self):
+        """Serialize the sketch so it can be shipped between shards."""
+        return {
+            'k': self.k,
+            'count': self.count,
+            'compactors': [items.tolist() for items in self.compactors]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a sketch from to_dict output."""
+        sketch = cls(k=data['k'])
+        sketch.count = data['count']
+        sketch.compactors = [np.asarray(items, dtype=float) for items in data['compactors']]
+        return sketch
@@ -0,0 +1,388 @@
+import os
+import json
+import shutil
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Vital sign columns stored in every shard (float32), in this order
+CORPUS_COLUMNS = [
+    'heart_rate',
+    'blood_pressure_systolic',
+    'blood_pressure_diastolic',
+    'respiratory_rate',
+    'oxygen_saturation',
+    'temperature'
+]
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def _history_items(path):
+    """
+    Read one source JSON file.
+
+    The file holds either a single patient history (as written by
+    save_patient_data) or a mapping of patient_id -> history.
+
+    Returns:
+        list: (patient_id, history) tuples
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if 'timestamps' in data:
+        return [(os.path.splitext(os.path.basename(path))[0], data)]
+    return list(data.items())
+
+
+def write_shard(shard_dir, source_paths):
+    """
+    Convert a group of patient history files into one columnar shard.
+
+    Each column is stored as its own .npy file so it can be memory-mapped,
+    with the rows of all patients concatenated and patient boundaries kept
+    in offsets.npy. The shard is written under a temporary name and renamed
+    when complete.
+
+    Args:
+        shard_dir (str): Directory of the shard to create
+        source_paths (list): Patient history JSON files to include
+
+    Returns:
+        dict: Shard entry for the manifest (name, patients, rows, column statistics)
+    """
+    patient_ids = []
+    columns = {column: [] for column in CORPUS_COLUMNS}
+    timestamps = []
+    offsets = [0]
+
+    for path in source_paths:
+        for patient_id, history in _history_items(path):
+            n_rows = len(history['timestamps'])
+            if n_rows == 0:
+                continue
+            patient_ids.append(str(patient_id))
+            for column in CORPUS_COLUMNS:
+                columns[column].append(np.asarray(history[column], dtype=np.float32))
+            timestamps.append(np.array(history['timestamps'], dtype='datetime64[s]').astype(np.int64))
+            offsets.append(offsets[-1] + n_rows)
+
+    staging_dir = shard_dir + '.tmp'
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    statistics = {}
+    for column in CORPUS_COLUMNS:
+        values = np.concatenate(columns[column]) if columns[column] else np.empty(0, dtype=np.float32)
+        np.save(os.path.join(staging_dir, f'{column}.npy'), values)
+        values = values.astype(np.float64)
+        statistics[column] = {
+            'min': float(values.min()) if len(values) else None,
+            'max': float(values.max()) if len(values) else None,
+            'sum': float(values.sum()),
+            'sum_sq': float(np.square(values).sum())
+        }
+    np.save(os.path.join(staging_dir, 'timestamps.npy'),
+            np.concatenate(timestamps) if timestamps else np.empty(0, dtype=np.int64))
+    np.save(os.path.join(staging_dir, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(staging_dir, 'patient_ids.json'), 'w') as f:
+        json.dump(patient_ids, f)
+
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.replace(staging_dir, shard_dir)
+
+    return {
+        'name': os.path.basename(shard_dir),
+        'patients': len(patient_ids),
+        'rows': offsets[-1],
+        'statistics': statistics
+    }
+
+
+def build_corpus(source_paths, output_dir, files_per_shard=64, workers=4):
+    """
+    Build a sharded training corpus from patient history JSON files.
+
+    Shards are written in parallel worker processes; the manifest is written
+    last, so a partially built corpus is never picked up by a loader.
+
+    Args:
+        source_paths (list): Patient history JSON files
+        output_dir (str): Corpus directory
+        files_per_shard (int): Number of source files per shard
+        workers (int): Number of worker processes
+
+    Returns:
+        dict: The corpus manifest
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    source_paths = sorted(source_paths)
+    groups = [source_paths[i:i + files_per_shard] for i in range(0, len(source_paths), files_per_shard)]
+    shard_dirs = [os.path.join(output_dir, f'shard-{i:05d}') for i in range(len(groups))]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        shards = list(executor.map(write_shard, shard_dirs, groups))
+
+    # Combine shard statistics into corpus-wide ones
+    statistics = {}
+    for column in CORPUS_COLUMNS:
+        parts = [shard['statistics'][column] for shard in shards if shard['rows'] > 0]
+        statistics[column] = {
+            'min': min(part['min'] for part in parts) if parts else None,
+            'max': max(part['max'] for part in parts) if parts else None,
+            'sum': sum(part['sum'] for part in parts),
+            'sum_sq': sum(part['sum_sq'] for part in parts)
+        }
+
+    manifest = {
+        'version': 1,
+        'columns': CORPUS_COLUMNS,
+        'patients': sum(shard['patients'] for shard in shards),
+        'rows': sum(shard['rows'] for shard in shards),
+        'statistics': statistics,
+        'shards': shards
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    return manifest
+
+
+class TrainingCorpus:
+    """
+    Read-only access to a sharded columnar training corpus.
+
+    Columns are opened as memory maps, so only the rows being read are
+    paged in. Training data is produced by generators that hold one
+    patient's rows and one batch at a time, and can be wrapped in a
+    prefetching tf.data pipeline for HealthcareLSTM.train and
+    DeepAutoencoder.train_on_dataset.
+    """
+
+    def __init__(self, path):
+        """
+        Open a corpus.
+
+        Args:
+            path (str): Corpus directory containing manifest.json
+        """
+        self.path = path
+        with open(os.path.join(path, MANIFEST_NAME), 'r') as f:
+            self.manifest = json.load(f)
+        self.shards = self.manifest['shards']
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    def scaler_ranges(self, columns):
+        """Corpus-wide min/max per column, in the format of HealthcareDataPreprocessor.load_scalers."""
+        statistics = self.manifest['statistics']
+        return {
+            column: {'data_min': statistics[column]['min'], 'data_max': statistics[column]['max']}
+            for column in columns
+        }
+
+    def mean_std(self, columns):
+        """Corpus-wide mean and standard deviation per column."""
+        statistics = self.manifest['statistics']
+        count = self.manifest['rows']
+        mean = np.array([statistics[column]['sum'] / count for column in columns])
+        mean_sq = np.array([statistics[column]['sum_sq'] / count for column in columns])
+        return mean, np.sqrt(np.maximum(mean_sq - mean ** 2, 0))
+
+    def split_shards(self, validation_fraction=0.1):
+        """
+        Split shard indices into training and validation sets.
+
+        Returns:
+            tuple: (train_shards, validation_shards) lists of shard indices
+        """
+        n_validation = int(round(len(self.shards) * validation_fraction))
+        if len(self.shards) > 1:
+            n_validation = max(1, n_validation)
+        n_train = len(self.shards) - n_validation
+        return list(range(n_train)), list(range(n_train, len(self.shards)))
+
+    def open_shard(self, index):
+        """
+        Memory-map the columns of one shard.
+
+        Returns:
+            dict: Column arrays plus 'timestamps', 'offsets' and 'patient_ids'
+        """
+        shard_dir = os.path.join(self.path, self.shards[index]['name'])
+        shard = {
+            name: np.load(os.path.join(shard_dir, f'{name}.npy'), mmap_mode='r')
+            for name in CORPUS_COLUMNS + ['timestamps']
+        }
+        shard['offsets'] = np.load(os.path.join(shard_dir, 'offsets.npy'))
+        with open(os.path.join(shard_dir, 'patient_ids.json'), 'r') as f:
+            shard['patient_ids'] = json.load(f)
+        return shard
+
+    def iter_patients(self, columns, shards=None, shuffle=False, seed=None):
+        """
+        Yield each patient's rows as a (time, features) float32 array.
+
+        Args:
+            columns (list): Columns to read, in order
+            shards (list, optional): Shard indices to read (default: all)
+            shuffle (bool): Visit shards and patients in random order
+            seed (int, optional): Seed for the shuffling
+
+        Yields:
+            tuple: (patient_id, array)
+        """
+        rng = np.random.RandomState(seed)
+        shards = list(range(len(self.shards))) if shards is None else list(shards)
+        if shuffle:
+            rng.shuffle(shards)
+
+        for index in shards:
+            shard = self.open_shard(index)
+            offsets = shard['offsets']
+            order = np.arange(len(shard['patient_ids']))
+            if shuffle:
+                rng.shuffle(order)
+            for p in order:
+                start, stop = offsets[p], offsets[p + 1]
+                yield shard['patient_ids'][p], np.column_stack([shard[column][start:stop] for column in columns])
+
+    def reading_batches(self, columns, batch_size=1024, shards=None, shuffle=False, seed=None):
+        """
+        Yield batches of single readings (e.g. for the autoencoder).
+
+        Yields:
+            numpy.ndarray: Batch with shape (batch_size, features); the last may be smaller
+        """
+        buffer = np.empty((batch_size, len(columns)), dtype=np.float32)
+        filled = 0
+        for _, rows in self.iter_patients(columns, shards, shuffle, seed):
+            position = 0
+            while position < len(rows):
+                take = min(batch_size - filled, len(rows) - position)
+                buffer[filled:filled + take] = rows[position:position + take]
+                filled += take
+                position += take
+                if filled == batch_size:
+                    yield buffer.copy()
+                    filled = 0
+        if filled:
+            yield buffer[:filled].copy()
+
+    def _window_chunks(self, preprocessor, shards, shuffle, seed, shuffle_buffer):
+        """
+        Yield each patient's windows as (X, y) view chunks, mixed through a
+        bounded shuffle buffer when shuffling.
+
+        Consecutive windows of a patient overlap in all but one reading, so
+        shuffling only the order of patients would still fill every batch with
+        near-identical windows. With shuffle, windows pass through a buffer of
+        shuffle_buffer windows drawn from many patients: each incoming window
+        replaces, and releases, a random buffered one.
+        """
+        columns = preprocessor.feature_columns
+        patients = self.iter_patients(columns, shards, shuffle, seed)
+        windows = (preprocessor.sequence_windows(preprocessor.transform_window(rows)) for _, rows in patients)
+        if not shuffle or shuffle_buffer <= 1:
+            yield from windows
+            return
+
+        rng = np.random.RandomState(seed)
+        X_pool = np.empty((shuffle_buffer, preprocessor.sequence_length, len(columns)), dtype=np.float32)
+        y_pool = np.empty((shuffle_buffer, preprocessor.prediction_horizon, len(columns)), dtype=np.float32)
+        pooled = 0
+        for X, y in windows:
+            position = 0
+            # Fill the buffer first
+            take = min(shuffle_buffer - pooled, len(X))
+            X_pool[pooled:pooled + take] = X[:take]
+            y_pool[pooled:pooled + take] = y[:take]
+            pooled += take
+            position += take
+            # Then every incoming window swaps with a random buffered one (distinct slots per chunk)
+            while position < len(X):
+                take = min(shuffle_buffer, len(X) - position)
+                slots = rng.choice(shuffle_buffer, size=take, replace=False)
+                yield X_pool[slots], y_pool[slots]
+                X_pool[slots] = X[position:position + take]
+                y_pool[slots] = y[position:position + take]
+                position += take
+
+        order = rng.permutation(pooled)
+        yield X_pool[order], y_pool[order]
+
+    def window_batches(self, preprocessor, batch_size=32, shards=None, shuffle=False, seed=None,
+                       shuffle_buffer=10000):
+        """
+        Yield normalized LSTM training windows in batches.
+
+        Windows never cross patient boundaries. The preprocessor's frozen
+        scalers are applied to each patient's rows and windows are strided
+        views until they are copied into a batch.
+
+        Args:
+            preprocessor (HealthcareDataPreprocessor): Preprocessor with fitted scalers
+            batch_size (int): Windows per batch
+            shards (list, optional): Shard indices to read (default: all)
+            shuffle (bool): Visit shards and patients in random order and mix
+                            windows through a shuffle buffer
+            seed (int, optional): Seed for the shuffling
+            shuffle_buffer (int): Windows held by the shuffle buffer
+
+        Yields:
+            tuple: (X, y) with shapes (batch, sequence_length, features) and
+                   (batch, prediction_horizon * features)
+        """
+        columns = preprocessor.feature_columns
+        X_buffer = np.empty((batch_size, preprocessor.sequence_length, len(columns)), dtype=np.float32)
+        y_buffer = np.empty((batch_size, preprocessor.prediction_horizon, len(columns)), dtype=np.float32)
+        filled = 0
+
+        for X, y in self._window_chunks(preprocessor, shards, shuffle, seed, shuffle_buffer):
+            position = 0
+            while position < len(X):
+                take = min(batch_size - filled, len(X) - position)
+                X_buffer[filled:filled + take] = X[position:position + take]
+                y_buffer[filled:filled + take] = y[position:position + take]
+                filled += take
+                position += take
+                if filled == batch_size:
+                    yield X_buffer.copy(), y_buffer.reshape(batch_size, -1).copy()
+                    filled = 0
+        if filled:
+            yield X_buffer[:filled].copy(), y_buffer[:filled].reshape(filled, -1).copy()
+
+    def reading_dataset(self, columns, batch_size=1024, shards=None, shuffle=False, seed=None, prefetch=4):
+        """
+        Prefetching tf.data pipeline over reading_batches.
+
+        Returns:
+            tf.data.Dataset: Batches with shape (None, features)
+        """
+        import tensorflow as tf
+
+        dataset = tf.data.Dataset.from_generator(
+            lambda: self.reading_batches(columns, batch_size, shards, shuffle, seed),
+            output_signature=tf.TensorSpec(shape=(None, len(columns)), dtype=tf.float32)
+        )
+        return dataset.prefetch(prefetch)
+
+    def window_dataset(self, preprocessor, batch_size=32, shards=None, shuffle=False, seed=None, prefetch=4,
+                       shuffle_buffer=10000):
+        """
+        Prefetching tf.data pipeline over window_batches.
+
+        Returns:
+            tf.data.Dataset: (inputs, targets) batches for HealthcareLSTM.train
+        """
+        import tensorflow as tf
+
+        n_features = len(preprocessor.feature_columns)
+        dataset = tf.data.Dataset.from_generator(
+            lambda: self.window_batches(preprocessor, batch_size, shards, shuffle, seed, shuffle_buffer),
+            output_signature=(
+                tf.TensorSpec(shape=(None, preprocessor.sequence_length, n_features), dtype=tf.float32),
+                tf.TensorSpec(shape=(None, preprocessor.prediction_horizon * n_features), dtype=tf.float32)
+            )
+        )
+        return dataset.prefetch(prefetch)
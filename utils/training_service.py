@@ -0,0 +1,294 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+class TrainingService:
+    """
+    Background service that trains models outside the monitoring loop.
+
+    Jobs run in a pool of separate worker processes started with a lowered
+    CPU priority, so training never stalls the real-time tick. Each job is
+    identified by a key; submitting a key that is already queued or running
+    returns the existing job instead of starting a second one. A key whose
+    job failed is not resubmitted until an exponentially growing retry delay
+    has passed, so a job that keeps failing does not restart every tick.
+
+    Workers write models to a staging path and publish them with an atomic
+    rename (see publish_model). The on_complete callback then swaps the new
+    model into the live object, and until that happens callers keep using
+    the previous model or their range-based fallbacks.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the training service.
+
+        Args:
+            config (dict, optional): Configuration parameters:
+                - max_workers: Maximum number of concurrent training jobs
+                - nice_level: Niceness increment applied to worker processes
+                - retry_delay: Seconds before a failed job may be resubmitted;
+                  doubled after every further failure of the same key
+                - max_retry_delay: Upper bound of the retry delay in seconds
+        """
+        # Default configuration
+        self.config = {
+            'max_workers': 1,
+            'nice_level': 10,
+            'retry_delay': 60,
+            'max_retry_delay': 3600,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self._executor = None
+        self._jobs = {}
+        self._failures = {}  # key -> (consecutive failures, monotonic time of the next allowed retry)
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        """Start the worker pool on first use."""
+        if self._executor is None:
+            # Spawned workers do not inherit the parent's TensorFlow state. They
+            # re-import the entry script as __mp_main__, so scripts using this
+            # service must build their models under an `if __name__ == '__main__'`
+            # guard (see init_services in app.py)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.config['max_workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.config['nice_level'],)
+            )
+        return self._executor
+
+    def submit(self, key, fn, *args, on_complete=None):
+        """
+        Queue a training job unless one with the same key is already pending
+        or the key is waiting out its retry delay after a failure.
+
+        Args:
+            key (str): Identifier used to deduplicate jobs
+            fn (callable): Module-level function executed in a worker process
+            *args: Picklable arguments for fn
+            on_complete (callable, optional): Called in the parent process with
+                the job's return value once it finishes successfully
+
+        Returns:
+            concurrent.futures.Future: Future for the queued or running job, or
+                None if the key is still waiting to be retried
+        """
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None and not future.done():
+                return future
+            failure = self._failures.get(key)
+            if failure is not None and time.monotonic() < failure[1]:
+                return None
+
+            future = self._get_executor().submit(fn, *args)
+            self._jobs[key] = future
+
+        def _done(completed):
+            with self._lock:
+                if self._jobs.get(key) is completed:
+                    del self._jobs[key]
+
+            if completed.cancelled():
+                return
+            error = completed.exception()
+            if error is not None:
+                with self._lock:
+                    failures = self._failures.get(key, (0, 0))[0] + 1
+                    delay = min(self.config['retry_delay'] * 2 ** (failures - 1),
+                                self.config['max_retry_delay'])
+                    self._failures[key] = (failures, time.monotonic() + delay)
+                print(f"Background training job '{key}' failed: {error} (retrying in {delay:.0f}s)")
+                return
+            with self._lock:
+                self._failures.pop(key, None)
+            if on_complete is not None:
+                try:
+                    on_complete(completed.result())
+                except Exception as e:
+                    print(f"Error publishing result of training job '{key}': {e}")
+
+        future.add_done_callback(_done)
+        print(f"Queued background training job '{key}'")
+        return future
+
+    def is_pending(self, key):
+        """Return True if a job with this key is queued or running."""
+        with self._lock:
+            future = self._jobs.get(key)
+            return future is not None and not future.done()
+
+    def shutdown(self, wait=True):
+        """Stop the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def _init_worker(nice_level):
+    """Lower the CPU priority of a training worker process."""
+    if nice_level and hasattr(os, 'nice'):
+        os.nice(nice_level)
+
+
+def staging_path(final_path):
+    """
+    Build a unique staging path next to the final model path.
+
+    Keeping it in the same directory guarantees the publishing rename
+    does not cross filesystems.
+    """
+    directory, name = os.path.split(final_path)
+    return os.path.join(directory, f".staging-{uuid.uuid4().hex[:8]}-{name}")
+
+
+def publish_model(staged_path, final_path):
+    """
+    Atomically move a trained model (and its sidecar files) into place.
+
+    Args:
+        staged_path (str): Path the worker saved the model to
+        final_path (str): Path that live detectors and predictors load from
+    """
+    # Sidecar data first, so a newly published model never meets stale thresholds or scalers
+    for suffix in ('_threshold.json', '_scalers.json', '_streaming.npz'):
+        staged_sidecar = os.path.splitext(staged_path)[0] + suffix
+        if os.path.exists(staged_sidecar):
+            os.replace(staged_sidecar, os.path.splitext(final_path)[0] + suffix)
+
+    if os.path.isdir(staged_path):
+        # SavedModel directories cannot replace a non-empty directory in one rename
+        retired_path = staging_path(final_path)
+        if os.path.exists(final_path):
+            os.replace(final_path, retired_path)
+        os.replace(staged_path, final_path)
+        shutil.rmtree(retired_path, ignore_errors=True)
+    else:
+        os.replace(staged_path, final_path)
+
+
+# === Training jobs (executed inside worker processes) ===
+
+def fit_isolation_forests(forests, training_data):
+    """
+    Fit a set of IsolationForests.
+
+    Args:
+        forests (dict): Unfitted IsolationForest estimators keyed by vital sign
+        training_data (dict): Training arrays keyed by vital sign
+
+    Returns:
+        dict: The fitted estimators
+    """
+    for name, forest in forests.items():
+        forest.fit(training_data[name])
+    return forests
+
+
+def train_autoencoder(autoencoder_config, training_data, epochs, batch_size):
+    """
+    Train a DeepAutoencoder and publish it to its configured model path.
+
+    Args:
+        autoencoder_config (dict): Configuration for DeepAutoencoder
+        training_data (numpy.ndarray): Training data with shape (samples, features)
+        epochs (int): Number of training epochs
+        batch_size (int): Batch size for training
+
+    Returns:
+        str: Path of the published model
+    """
+    from models.deep_autoencoder import DeepAutoencoder
+
+    final_path = autoencoder_config['model_path']
+    staged_path = staging_path(final_path)
+
+    autoencoder = DeepAutoencoder(autoencoder_config)
+    autoencoder.train(training_data, epochs=epochs, batch_size=batch_size, save_path=staged_path)
+    publish_model(staged_path, final_path)
+
+    return final_path
+
+
+def train_lstm(predictor_config, patient_data_history, epochs, batch_size):
+    """
+    Train the HealthcareLSTM used by LSTMPredictor and publish it.
+
+    When the predictor serves the distilled student, a new student is
+    distilled from the freshly trained teacher and published with it.
+
+    Args:
+        predictor_config (dict): LSTMPredictor configuration
+        patient_data_history (dict): Historical patient data
+        epochs (int): Number of training epochs
+        batch_size (int): Batch size for training
+
+    Returns:
+        dict: Evaluation metrics of the trained model
+    """
+    from models.lstm_model import HealthcareLSTM
+    from utils.data_preprocessing import HealthcareDataPreprocessor, scaler_path
+    from utils.model_training import ModelTrainer
+
+    final_path = predictor_config['model_path']
+    staged_path = staging_path(final_path)
+
+    preprocessor = HealthcareDataPreprocessor(
+        sequence_length=predictor_config['sequence_length'],
+        prediction_horizon=predictor_config['prediction_horizon'],
+        feature_columns=predictor_config['feature_columns']
+    )
+    lstm_model = HealthcareLSTM({
+        'sequence_length': predictor_config['sequence_length'],
+        'prediction_horizon': predictor_config['prediction_horizon'],
+        'feature_count': len(predictor_config['feature_columns']),
+        'model_path': final_path,
+        'bidirectional': not predictor_config['streaming']
+    })
+
+    # Continue from the live weights but write checkpoints to the staging path
+    lstm_model.config['model_path'] = staged_path
+
+    trainer = ModelTrainer(lstm_model, preprocessor)
+    X_train, y_train, X_val, y_val, X_test, y_test = trainer.prepare_data(
+        patient_data_history, test_size=0.15, validation_size=0.15
+    )
+    trainer.train_model(X_train, y_train, X_val, y_val, epochs, batch_size)
+    metrics = trainer.evaluate_model(X_test, y_test)
+    preprocessor.save_scalers(scaler_path(staged_path))
+
+    os.makedirs('logs', exist_ok=True)
+    trainer.save_metrics('logs/lstm_metrics.json')
+
+    student_staged_path = None
+    if predictor_config['serving_model'] == 'student':
+        from models.student_forecaster import StudentForecaster, distill
+
+        student_final_path = predictor_config['student_model_path']
+        student_staged_path = staging_path(student_final_path)
+        student = StudentForecaster({
+            'sequence_length': predictor_config['sequence_length'],
+            'prediction_horizon': predictor_config['prediction_horizon'],
+            'feature_count': len(predictor_config['feature_columns']),
+            'model_path': student_final_path
+        })
+        student.config['model_path'] = student_staged_path
+        distill(lstm_model, student, X_train, y_train, X_val, y_val,
+                predictor_config['distillation_alpha'], epochs, batch_size)
+        # The student is served with the teacher's scalers
+        preprocessor.save_scalers(scaler_path(student_staged_path))
+
+    publish_model(staged_path, final_path)
+    if student_staged_path is not None:
+        publish_model(student_staged_path, student_final_path)
+    return metrics
@@ -0,0 +1,243 @@
+import zlib
+import bisect
+import threading
+import numpy as np
+from datetime import datetime
+
+# Approximate size of one sample kept in a Python list (float object + pointer)
+PYTHON_FLOAT_BYTES = 32
+
+
+def _to_seconds(timestamp):
+    """Convert a datetime, "%Y-%m-%d %H:%M:%S" string or epoch seconds to epoch seconds."""
+    if timestamp is None:
+        return datetime.now().timestamp()
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    if isinstance(timestamp, str):
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+    return float(timestamp)
+
+
+def encode_block(samples):
+    """
+    Compress a block of samples.
+
+    Samples are quantized to int16 with one scale per block, delta-encoded
+    (with int16 wrap-around, which cumsum undoes exactly), split into
+    high and low byte planes and deflated.
+
+    Args:
+        samples (numpy.ndarray): Samples of the block
+
+    Returns:
+        tuple: (payload bytes, scale)
+    """
+    peak = float(np.max(np.abs(samples))) if len(samples) else 0.0
+    scale = peak / 32767 if peak > 0 else 1.0
+    quantized = np.round(samples / scale).astype(np.int16)
+    deltas = np.diff(quantized, prepend=np.int16(0))
+    planes = deltas.view(np.uint8).reshape(-1, 2).T
+    return zlib.compress(planes.tobytes(), 1), scale
+
+
+def decode_block(payload, scale):
+    """Decompress a block written by encode_block into float32 samples."""
+    planes = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(2, -1)
+    deltas = np.ascontiguousarray(planes.T).view(np.int16).ravel()
+    return np.cumsum(deltas, dtype=np.int16).astype(np.float32) * np.float32(scale)
+
+
+class WaveformStore:
+    """
+    Compressed full-resolution storage of ECG waveforms per patient.
+
+    Incoming strips are buffered per patient and sealed into blocks of
+    block_samples samples, each stored as a compressed int16 delta payload
+    (see encode_block). Every strip keeps its own start time, so gaps
+    between strips are preserved, and blocks are indexed by time for random
+    access: a read only decompresses the blocks overlapping the requested
+    range.
+    """
+
+    def __init__(self, config=None):
+        """
+        Initialize the store.
+
+        Args:
+            config (dict, optional): Configuration parameters:
+                - sampling_rate: Samples per second of the stored waveforms
+                - block_samples: Samples per compressed block
+                - retention_seconds: Age after which blocks are dropped (None keeps all)
+        """
+        # Default configuration
+        self.config = {
+            'sampling_rate': 125,
+            'block_samples': 7500,          # One minute at 125 Hz
+            'retention_seconds': 24 * 3600,
+        }
+
+        # Update config if provided
+        if config:
+            self.config.update(config)
+
+        self.patients = {}
+        self._lock = threading.Lock()
+
+    def _patient(self, patient_id):
+        """Get or create the storage of a patient."""
+        patient = self.patients.get(patient_id)
+        if patient is None:
+            patient = self.patients[patient_id] = {
+                'blocks': [],
+                'block_starts': [],
+                'buffer': [],
+                'buffer_times': [],
+                'buffered': 0
+            }
+        return patient
+
+    def append(self, patient_id, samples, timestamp=None):
+        """
+        Store a strip of samples.
+
+        Args:
+            patient_id (str): Patient the waveform belongs to
+            samples (array-like): Consecutive samples
+            timestamp: Time of the first sample (datetime, "%Y-%m-%d %H:%M:%S"
+                       string or epoch seconds; default: now)
+        """
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        if len(samples) == 0:
+            return
+        start = _to_seconds(timestamp)
+
+        with self._lock:
+            patient = self._patient(patient_id)
+            patient['buffer'].append(samples)
+            patient['buffer_times'].append(start)
+            patient['buffered'] += len(samples)
+            if patient['buffered'] >= self.config['block_samples']:
+                self._seal(patient)
+                self._expire(patient, start)
+
+    def _seal(self, patient):
+        """Compress the buffered strips of a patient into one block."""
+        strips = patient['buffer']
+        samples = np.concatenate(strips)
+        payload, scale = encode_block(samples)
+        offsets = np.cumsum([0] + [len(strip) for strip in strips[:-1]]).astype(np.int32)
+        times = np.asarray(patient['buffer_times'])
+
+        block = {
+            'start': float(times[0]),
+            'end': float(times[-1] + len(strips[-1]) / self.config['sampling_rate']),
+            'samples': len(samples),
+            'scale': scale,
+            'payload': payload,
+            'strip_offsets': offsets,
+            'strip_times': times
+        }
+        patient['blocks'].append(block)
+        patient['block_starts'].append(block['start'])
+        patient['buffer'], patient['buffer_times'], patient['buffered'] = [], [], 0
+
+    def _expire(self, patient, now):
+        """Drop blocks that ended before the retention period."""
+        retention = self.config['retention_seconds']
+        if retention is None:
+            return
+        expired = 0
+        while expired < len(patient['blocks']) and patient['blocks'][expired]['end'] < now - retention:
+            expired += 1
+        if expired:
+            del patient['blocks'][:expired]
+            del patient['block_starts'][:expired]
+
+    def flush(self, patient_id=None):
+        """Seal buffered strips into blocks (all patients by default)."""
+        with self._lock:
+            patients = self.patients.values() if patient_id is None else [self.patients.get(patient_id)]
+            for patient in patients:
+                if patient is not None and patient['buffered']:
+                    self._seal(patient)
+
+    def _sample_times(self, strip_offsets, strip_times, n_samples):
+        """Time of every sample of a block from its strip start times."""
+        counts = np.diff(np.append(strip_offsets, n_samples))
+        index = np.arange(n_samples) - np.repeat(strip_offsets, counts)
+        return np.repeat(strip_times, counts) + index / self.config['sampling_rate']
+
+    def read(self, patient_id, start=None, end=None):
+        """
+        Read the stored waveform of a patient in a time range.
+
+        Args:
+            patient_id (str): Patient to read
+            start: Earliest sample time (any format accepted by append; default: oldest)
+            end: Latest sample time (default: newest)
+
+        Returns:
+            tuple: (times, samples) arrays; times are epoch seconds
+        """
+        start = -np.inf if start is None else _to_seconds(start)
+        end = np.inf if end is None else _to_seconds(end)
+
+        with self._lock:
+            patient = self.patients.get(patient_id)
+            if patient is None:
+                return np.empty(0), np.empty(0, dtype=np.float32)
+
+            # Blocks are in time order; skip those that end before the range
+            first = max(0, bisect.bisect_right(patient['block_starts'], start) - 1)
+            last = bisect.bisect_right(patient['block_starts'], end)
+            blocks = [block for block in patient['blocks'][first:last] if block['end'] >= start]
+            buffer = list(patient['buffer'])
+            buffer_times = list(patient['buffer_times'])
+
+        parts_times, parts_samples = [], []
+        for block in blocks:
+            parts_samples.append(decode_block(block['payload'], block['scale']))
+            parts_times.append(self._sample_times(block['strip_offsets'], block['strip_times'], block['samples']))
+        if buffer:
+            samples = np.concatenate(buffer)
+            offsets = np.cumsum([0] + [len(strip) for strip in buffer[:-1]])
+            parts_samples.append(samples)
+            parts_times.append(self._sample_times(offsets, np.asarray(buffer_times), len(samples)))
+
+        if not parts_samples:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+
+        times = np.concatenate(parts_times)
+        samples = np.concatenate(parts_samples)
+        selected = (times >= start) & (times <= end)
+        return times[selected], samples[selected]
+
+    def memory_usage(self, patient_id=None):
+        """
+        Memory used by the stored waveforms.
+
+        Returns:
+            dict: Stored samples, compressed and buffered bytes, the size the
+                  same samples would take as Python float lists, and the ratio
+        """
+        with self._lock:
+            patients = list(self.patients.values()) if patient_id is None else [self.patients.get(patient_id)]
+            patients = [patient for patient in patients if patient is not None]
+            compressed = sum(
+                len(block['payload']) + block['strip_offsets'].nbytes + block['strip_times'].nbytes
+                for patient in patients for block in patient['blocks']
+            )
+            stored = sum(block['samples'] for patient in patients for block in patient['blocks'])
+            buffered = sum(patient['buffered'] for patient in patients)
+
+        total_samples = stored + buffered
+        total_bytes = compressed + buffered * 4
+        list_bytes = total_samples * PYTHON_FLOAT_BYTES
+        return {
+            'samples': total_samples,
+            'compressed_bytes': compressed,
+            'buffered_bytes': buffered * 4,
+            'python_list_bytes': list_bytes,
+            'ratio': total_bytes / list_bytes if list_bytes else 0.0
+        }